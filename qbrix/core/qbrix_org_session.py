@@ -0,0 +1,180 @@
+import os
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from qbrix.tools.shared.qbrix_console_utils import init_logger
+
+log = init_logger()
+
+DEFAULT_TIMEOUT = 120
+DEFAULT_POOL_SIZE = 10
+SFDX_INSTANCE_URL_VARIABLES = ("SFDX_INSTANCE_URL", "SF_ORG_INSTANCE_URL")
+
+_org_sessions = {}
+_org_sessions_lock = threading.Lock()
+
+
+class OrgSession:
+
+    """
+    Authenticated, connection pooled client for the Salesforce REST API of a single org.
+    Sessions are shared across tasks through get_org_session, and expired access tokens are refreshed in one place.
+    """
+
+    def __init__(self, org_config, api_version=None, access_token=None, instance_url=None, pool_size=DEFAULT_POOL_SIZE):
+        self.org_config = org_config
+        self.instance_url = (instance_url or org_config.instance_url).rstrip("/")
+        self.api_version = str(api_version or org_config.latest_api_version).lstrip("v")
+
+        # A token passed in directly cannot be refreshed through the keychain
+        self._can_refresh = access_token is None or access_token == org_config.access_token
+        self._refresh_lock = threading.Lock()
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self._set_access_token(access_token or org_config.access_token)
+
+    def _set_access_token(self, access_token):
+        self.access_token = access_token
+        self.session.headers.update({
+            "Authorization": f"Bearer {access_token}",
+            "Content-Type": "application/json"
+        })
+
+    def refresh_token(self):
+        """
+        Refreshes the org access token through the CumulusCI keychain and updates the session.
+
+        Returns:
+            bool: True if the token was refreshed
+        """
+
+        if not self._can_refresh:
+            return False
+
+        with self._refresh_lock:
+            try:
+                self.org_config.refresh_oauth_token(getattr(self.org_config, "keychain", None))
+            except Exception as e:
+                log.error(f"Org Session: Unable to refresh the access token. {e}")
+                return False
+            self._set_access_token(self.org_config.access_token)
+            return True
+
+    def url(self, path):
+        """
+        Builds the full URL for a REST API path.
+
+        Args:
+            path (str): Full URL, a path starting with /services/, or a path relative to the versioned data API e.g. query/
+
+        Returns:
+            str: Full URL
+        """
+
+        if path.startswith("http://") or path.startswith("https://"):
+            return path
+        if path.startswith("/services/"):
+            return f"{self.instance_url}{path}"
+        return f"{self.instance_url}/services/data/v{self.api_version}/{path.lstrip('/')}"
+
+    def request(self, method, path, **kwargs):
+        """
+        Sends a request over the pooled session, refreshing the access token and retrying once when it has expired.
+
+        Args:
+            method (str): HTTP method
+            path (str): Path as accepted by url()
+            **kwargs: Passed through to requests
+
+        Returns:
+            requests.Response: The response
+        """
+
+        kwargs.setdefault("timeout", DEFAULT_TIMEOUT)
+        response = self.session.request(method, self.url(path), **kwargs)
+        if response.status_code == 401 and self.refresh_token():
+            response = self.session.request(method, self.url(path), **kwargs)
+        return response
+
+    def get(self, path, **kwargs):
+        return self.request("GET", path, **kwargs)
+
+    def post(self, path, **kwargs):
+        return self.request("POST", path, **kwargs)
+
+    def query(self, soql, tooling=False):
+        """
+        Runs a SOQL query against the org.
+
+        Args:
+            soql (str): Query to run
+            tooling (bool): Set to True to run the query against the Tooling API
+
+        Returns:
+            dict: Query result, including totalSize and records
+
+        Raises:
+            requests.exceptions.HTTPError: When the query fails. The message holds the Salesforce error body
+        """
+
+        response = self.get("tooling/query/" if tooling else "query/", params={"q": soql})
+        if not response.ok:
+            raise requests.exceptions.HTTPError(f"Query failed with status {response.status_code}: {response.text}. Query: {soql}", response=response)
+        return response.json()
+
+
+def get_org_session(org_config, api_version=None, access_token=None, instance_url=None):
+    """
+    Returns the shared session for an org, creating it on first use.
+
+    Args:
+        org_config (OrgConfig): Target org
+        api_version (str): API version to use. Defaults to the latest version the org supports
+        access_token (str): Optional access token which overrides the one held in the org config
+        instance_url (str): Optional instance url which overrides the one held in the org config
+
+    Returns:
+        OrgSession: Session for the org
+    """
+
+    instance_url = (instance_url or org_config.instance_url).rstrip("/")
+    token_override = access_token if access_token and access_token != org_config.access_token else None
+    session_key = (getattr(org_config, "name", None) or getattr(org_config, "username", None), instance_url, token_override, str(api_version or ""))
+
+    with _org_sessions_lock:
+        if session_key not in _org_sessions:
+            _org_sessions[session_key] = OrgSession(org_config, api_version=api_version, access_token=token_override, instance_url=instance_url)
+        return _org_sessions[session_key]
+
+
+def clear_org_sessions():
+    """ Closes and removes every shared org session """
+
+    with _org_sessions_lock:
+        for org_session in _org_sessions.values():
+            org_session.session.close()
+        _org_sessions.clear()
+
+
+def get_sfdx_env(instance_url, env=None):
+    """
+    Builds the environment for Salesforce CLI commands which target the given instance. The environment of this process is left unchanged, so the instance never leaks into commands run for other orgs.
+
+    Args:
+        instance_url (str): Instance url of the target org
+        env (dict): Environment to start from. Defaults to the environment of this process
+
+    Returns:
+        dict: Environment to pass to subprocess
+    """
+
+    sfdx_env = dict(os.environ if env is None else env)
+    if instance_url:
+        for variable in SFDX_INSTANCE_URL_VARIABLES:
+            sfdx_env[variable] = instance_url
+    return sfdx_env
@@ -1,46 +1,194 @@
-      
+
 import os,sys,re,json
+import subprocess
+import time
+from concurrent.futures import ThreadPoolExecutor
 
 from cumulusci.tasks.sfdx import SFDXBaseTask
 
+IGNORE_DIRS=['./cci','./.cci','./config','./.config/sfdx','./.git','./.git/objects','./.qbrix','./qbrix','./.vscode','./.sfdx']
+IGNORE_FILES=['.DS_Store','.forceignore','.lock','.prettierignore']
+GOOGLE_API_KEY_PATTERN = re.compile(rb"AIza[0-9A-Za-z-_]{35}")
+GOOGLE_API_KEY_LENGTH = 39
+READ_CHUNK_SIZE = 1024 * 1024
+
+
+def is_ignored_path(filepath):
+    """
+    Checks a path against the ignored directories and file names.
+
+    Args:
+        filepath (str): Path relative to the project root, starting with ./
+
+    Returns:
+        bool: True if the path should not be scanned
+    """
+
+    if any(filepath.startswith(ign) for ign in IGNORE_DIRS):
+        return True
+    filename = os.path.basename(filepath)
+    return any(ign in filename for ign in IGNORE_FILES)
+
+
+def contains_google_api_key(stream):
+    """
+    Scans a binary stream for Google API keys in large chunks. The tail of each chunk is carried over so keys split across chunks are still found.
+    Content with a NUL byte in the first chunk is treated as binary and skipped.
+
+    Args:
+        stream: Binary file like object
+
+    Returns:
+        bool: True if a key was found
+    """
+
+    carry = b""
+    first_chunk = True
+    while True:
+        chunk = stream.read(READ_CHUNK_SIZE)
+        if not chunk:
+            return False
+        if first_chunk and b"\0" in chunk:
+            return False
+        first_chunk = False
+
+        buffer = carry + chunk
+        if GOOGLE_API_KEY_PATTERN.search(buffer):
+            return True
+        carry = buffer[-(GOOGLE_API_KEY_LENGTH - 1):]
+
+
+def scan_file(filepath):
+    try:
+        with open(filepath, "rb") as f:
+            return contains_google_api_key(f)
+    except OSError:
+        return False
+
+
+def list_project_files(rootdir="."):
+    """
+    Lists every file under the project root, pruning ignored directories during the walk.
+
+    Returns:
+        list: File paths starting with ./
+    """
+
+    filepaths=[]
+    for subdir, dirs, files in os.walk(rootdir):
+        dirs[:] = [d for d in dirs if not any((subdir + os.sep + d).startswith(ign) for ign in IGNORE_DIRS)]
+        for file in files:
+            filepath = subdir + os.sep + file
+            if not is_ignored_path(filepath):
+                filepaths.append(filepath)
+    return filepaths
+
+
+def _run_git(args):
+    result = subprocess.run(["git"] + args, capture_output=True)
+    if result.returncode != 0:
+        return None
+    return [p.decode("utf-8") for p in result.stdout.split(b"\0") if p]
+
+
+def list_changed_files():
+    """
+    Lists files which are staged, modified or untracked, using git.
+
+    Returns:
+        list: File paths starting with ./, or None when git is not available
+    """
+
+    staged = _run_git(["diff", "--cached", "--name-only", "--diff-filter=ACMR", "-z"])
+    modified = _run_git(["diff", "--name-only", "--diff-filter=ACMR", "-z"])
+    untracked = _run_git(["ls-files", "--others", "--exclude-standard", "-z"])
+    if staged is None or modified is None or untracked is None:
+        return None
+
+    filepaths = ["./" + p for p in dict.fromkeys(staged + modified + untracked)]
+    return [p for p in filepaths if os.path.isfile(p) and not is_ignored_path(p)]
+
+
+def scan_staged_files():
+    """
+    Scans the staged content of each added or changed file, streamed from the git index through a single git cat-file process.
+
+    Returns:
+        list: Paths of files with a possible key, or None when git is not available
+    """
+
+    staged = _run_git(["diff", "--cached", "--name-only", "--diff-filter=ACMR", "-z"])
+    if staged is None:
+        return None
+
+    filepaths = [p for p in staged if not is_ignored_path("./" + p) and "\n" not in p]
+    if not filepaths:
+        return []
+
+    results=[]
+    with subprocess.Popen(["git", "cat-file", "--batch"], stdin=subprocess.PIPE, stdout=subprocess.PIPE) as p:
+        # Feed the requests from a thread so a large batch never blocks on a full pipe
+        def write_requests():
+            for filepath in filepaths:
+                p.stdin.write(f":{filepath}\n".encode("utf-8"))
+            p.stdin.close()
+
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            executor.submit(write_requests)
+            for filepath in filepaths:
+                header = p.stdout.readline().split()
+                if len(header) < 3 or header[1] != b"blob":
+                    continue
+                size = int(header[2])
+                content = p.stdout.read(size)
+                p.stdout.read(1)
+                if b"\0" not in content[:READ_CHUNK_SIZE] and GOOGLE_API_KEY_PATTERN.search(content):
+                    results.append("./" + filepath)
+    return results
+
+
 class PreCommit(SFDXBaseTask):
     task_options = {
+        "scope": {
+            "description": "Files to scan: staged (default) scans the staged content, changed scans staged, modified and untracked files, all scans the whole project",
+            "required": False
+        },
+        "maxworkers": {
+            "description": "Number of files to scan at the same time when scanning files on disk. Default is 8",
+            "required": False
+        }
     }
-    
+
     def _init_options(self, kwargs):
         super(PreCommit, self)._init_options(kwargs)
-        
+        self.scope = str(self.options.get("scope") or "staged").lower()
+        self.maxworkers = max(int(self.options.get("maxworkers") or 8), 1)
+
+    def _scan_files(self, filepaths):
+        with ThreadPoolExecutor(max_workers=self.maxworkers) as executor:
+            return [filepath for filepath, found in zip(filepaths, executor.map(scan_file, filepaths)) if found]
+
     def _run_task(self):
-        ignoredirs=['./cci','./.cci','./config','./.config/sfdx','./.git','./.git/objects','./.qbrix','./qbrix','./.vscode','./.sfdx']
-        ignorefiles=['.DS_Store','.forceignore','.lock','.prettierignore']
-        rootdir = "."
-        pattern = re.compile("AIza[0-9A-Za-z-_]{35}")
-        results=[]
-        for subdir, dirs, files in os.walk(rootdir):
-            for file in files:
-                continuepprocessing=True
-                for ign in ignoredirs:
-                    if ign in subdir:
-                        continuepprocessing=False
-                        
-                for ign in ignorefiles:
-                    if ign in file:
-                        continuepprocessing=False
-                
-                if(continuepprocessing):        
-                    filepath = subdir + os.sep + file
-                    #print(subdir)
-                    try:
-                        for i, line in enumerate(open(filepath)):
-                            for match in re.finditer(pattern, line):
-                                results.append(filepath)
-                    except UnicodeDecodeError:
-                        pass
-                        
+        start_time = time.time()
+        results=None
+
+        if self.scope == "staged":
+            results = scan_staged_files()
+        elif self.scope == "changed":
+            filepaths = list_changed_files()
+            if filepaths is not None:
+                results = self._scan_files(filepaths)
+
+        if results is None:
+            # Not in a git repository, or the whole project was requested
+            results = self._scan_files(list_project_files())
+
+        self.logger.info(f"Pre-Commit: Secret scan ({self.scope}) completed in {time.time() - start_time:.2f} seconds")
+
         if(len(results)>0):
             self.logger.error(f'*********************************************************************************')
             self.logger.error(f'*****COMMIT BLOCKED Possible Key(s) Google API Keys found in these files:********')
             self.logger.error(f'*********************************************************************************')
             for file in results:
                 self.logger.error(file)
-            sys.exit(os.EX_DATAERR)
\ No newline at end of file
+            sys.exit(os.EX_DATAERR)
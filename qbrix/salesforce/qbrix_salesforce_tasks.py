@@ -19,6 +19,7 @@ from cumulusci.tasks.salesforce.sourcetracking import RetrieveChanges
 from cumulusci.tasks.salesforce.update_dependencies import UpdateDependencies
 from cumulusci.tasks.sfdx import SFDXOrgTask
 
+from qbrix.core.qbrix_org_session import get_sfdx_env
 from qbrix.tools.health.qbrix_project_checks import (
     run_crm_analytics_checks, run_einstein_checks, run_experience_cloud_checks)
 from qbrix.tools.shared.qbrix_cci_tasks import run_cci_task
@@ -35,19 +36,12 @@ def salesforce_query(soql, org_config, raw_return=False):
     if soql != "" and org_config is not None:
         dx_command = f'sfdx force:data:soql:query -q "{soql}" --json '
 
-        subprocess.run(
-            f"sfdx config:set instanceUrl={org_config.instance_url}",
-            shell=True,
-            capture_output=True,
-        )
-
         if isinstance(org_config, ScratchOrgConfig):
             dx_command += " -u {username}".format(username=org_config.username)
         else:
             dx_command += " -u {username}".format(username=org_config.access_token)
 
-        result = subprocess.run(dx_command, shell=True, capture_output=True)
-        subprocess.run("sfdx config:unset instanceUrl", shell=True, capture_output=True)
+        result = subprocess.run(dx_command, shell=True, capture_output=True, env=get_sfdx_env(org_config.instance_url))
 
         if result.returncode > 0:
             if result.stderr:
@@ -78,12 +72,6 @@ def QbrixInstallCheck(qbrix_name, org_config):
     
     log.info("Checking for Qbrix: %s", qbrix_name)
     
-    subprocess.run(
-        f"sfdx config:set instanceUrl={org_config.instance_url}",
-        shell=True,
-        capture_output=True,
-    )
-
     dx_soql = f"SELECT Id from xDO_Base_QBrix_Register__mdt WHERE xDO_Repository_URL__c LIKE '%{qbrix_name}%'"
     dx_command = f'sfdx force:data:soql:query -q "{dx_soql}" --json '
 
@@ -92,8 +80,7 @@ def QbrixInstallCheck(qbrix_name, org_config):
     else:
         dx_command += " -u {username}".format(username=org_config.access_token)
 
-    result = subprocess.run(dx_command, shell=True, capture_output=True)
-    subprocess.run("sfdx config:unset instanceUrl", shell=True, capture_output=True)
+    result = subprocess.run(dx_command, shell=True, capture_output=True, env=get_sfdx_env(org_config.instance_url))
 
     if result is None:
         log.error(
@@ -115,6 +102,44 @@ def QbrixInstallCheck(qbrix_name, org_config):
         return False
 
 
+def get_installed_qbrix(org_config):
+    """
+    Reads every Q Brix registered in the target org in a single API query, so several install checks can share one result.
+
+    Args:
+        org_config (OrgConfig): Target org
+
+    Returns:
+        list: Lowercase repository URLs of the registered Q Brix, or an empty list if none are registered
+    """
+
+    try:
+        result = org_config.salesforce_client.query_all("SELECT xDO_Repository_URL__c FROM xDO_Base_QBrix_Register__mdt")
+    except Exception as e:
+        # The register object does not exist until the Q Brix Register has been deployed
+        log.info(f"No Q Brix installed: {e}")
+        return []
+
+    return [(record.get("xDO_Repository_URL__c") or "").lower() for record in result.get("records", [])]
+
+
+def is_qbrix_installed(qbrix_name, installed_qbrix):
+    """
+    Checks a Q Brix against the result of get_installed_qbrix, matching the same way as QbrixInstallCheck.
+
+    Args:
+        qbrix_name (str): Name of the Q Brix, as found in its repository URL
+        installed_qbrix (list): Lowercase repository URLs returned by get_installed_qbrix
+
+    Returns:
+        bool: True if the Q Brix is installed
+    """
+
+    installed = any(qbrix_name.lower() in repository_url for repository_url in installed_qbrix)
+    log.info(f"{qbrix_name} is {'installed' if installed else 'NOT installed'}.")
+    return installed
+
+
 def _time_since_modified(path):
     """
     Returns the time since the target file was last modified
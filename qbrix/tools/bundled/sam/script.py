@@ -12,6 +12,9 @@ import re
 import csv
 import random
 import string
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
 
 
 def initiate():
@@ -174,71 +177,72 @@ def get_dashboard_list(username):
     return dashboard, db_list
 
 
-def check_dependency(dashboard, instance_url, auth_header, final_db_list, checked_dependency, db_dump):
-    dashboard_list = []
-    for db in dashboard:
-        dashboard_list.append(db["name"])
-    for db in dashboard_list:
-        dependency_db = []
-        if db in db_dump.keys():
-            pass
-        else:
-            db_dump[db] = get_dashboard_json(db, instance_url, auth_header)
-        db_json = db_dump[db]
-        dependency_db.append(db)
-        for widget in db_json["asset"]["state"]["widgets"]:
+DEPENDENCY_CRAWL_WORKERS = 8
+_http_sessions = {}
+
+
+def get_http_session(auth_header):
+    # Reuse one keep-alive session per auth header, the header is stored in the same format curl used
+    if auth_header not in _http_sessions:
+        header_name, header_value = auth_header.strip("'").split(":", 1)
+        session = requests.Session()
+        session.headers.update({header_name.strip(): header_value.strip()})
+        adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=DEPENDENCY_CRAWL_WORKERS)
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        _http_sessions[auth_header] = session
+    return _http_sessions[auth_header]
+
+
+def get_linked_dashboards(db_json):
+    linked_dashboards = []
+    widget_groups = [db_json["asset"]["state"]["widgets"]]
+    try:
+        for comp in db_json["components"]:
+            widget_groups.append(db_json["components"][comp]["state"]["widgets"])
+    except KeyError:
+        pass
+    for widgets in widget_groups:
+        for widget in widgets.values():
             try:
-                if db_json["asset"]["state"]["widgets"][widget]["type"] == "link" and \
-                        db_json["asset"]["state"]["widgets"][widget]["parameters"]["destinationType"] == "dashboard":
-                    a = {}
-                    a["name"] = db_json["asset"]["state"]["widgets"][widget]["parameters"]["destinationLink"]["name"]
-                    if a["name"] not in dependency_db:
-                        dependency_db.append(a["name"])
-                else:
-                    pass
+                if widget["type"] == "link" and widget["parameters"]["destinationType"] == "dashboard":
+                    name = widget["parameters"]["destinationLink"]["name"]
+                    if name not in linked_dashboards:
+                        linked_dashboards.append(name)
             except KeyError:
                 pass
-        try:
-            components = db_json["components"]
-        except KeyError:
-            components = []
-        for comp in components:
-            for widget in db_json["components"][comp]["state"]["widgets"]:
-                if db_json["components"][comp]["state"]["widgets"][widget]["type"] == "link" and \
-                        db_json["components"][comp]["state"]["widgets"][widget]["parameters"][
-                            "destinationType"] == "dashboard":
-                    a = {}
-                    a["name"] = db_json["components"][comp]["state"]["widgets"][widget]["parameters"]["destinationLink"]["name"]
-                    if a["name"] not in dependency_db:
-                        dependency_db.append(a)
-                else:
-                    pass
+    return linked_dashboards
 
-        checked_dependency.append(db)
-        final_db_list.append(db)
-        for x in checked_dependency:
-            if x in dependency_db:
-                dependency_db.remove(x)
-        for db in dependency_db:
-            a = {}
-            a["name"] = db
-            b = []
-            b.append(a)
-            check_dependency(b, instance_url, auth_header, final_db_list, checked_dependency, db_dump)
+
+def check_dependency(dashboard, instance_url, auth_header, final_db_list, checked_dependency, db_dump):
+    # Breadth first crawl of linked dashboards, each level is fetched concurrently and each dashboard only once
+    to_check = []
+    for db in dashboard:
+        if db["name"] not in checked_dependency and db["name"] not in to_check:
+            to_check.append(db["name"])
+
+    with ThreadPoolExecutor(max_workers=DEPENDENCY_CRAWL_WORKERS) as executor:
+        while len(to_check) > 0:
+            to_fetch = [db for db in to_check if db not in db_dump.keys()]
+            for db, db_json in zip(to_fetch, executor.map(lambda x: get_dashboard_json(x, instance_url, auth_header), to_fetch)):
+                db_dump[db] = db_json
+
+            next_check = []
+            for db in to_check:
+                checked_dependency.append(db)
+                final_db_list.append(db)
+                for linked_db in get_linked_dashboards(db_dump[db]):
+                    if linked_db not in checked_dependency and linked_db not in to_check and linked_db not in next_check:
+                        next_check.append(linked_db)
+            to_check = next_check
 
     return(final_db_list)
 
 
 def get_dashboard_json(dashboardId, instance_url, auth_header):
-    std_out_string = ""
-    print("\t\tObtaining Dashboard JSON...")
-    get_dashboard_curl_cmd = ["curl", "-X", "GET", instance_url + "/services/data/v56.0/wave/dashboards/" + dashboardId + "/bundle", "-H", auth_header]
-    print("\t\t\t" + " ".join(get_dashboard_curl_cmd))
-    std_out_string = ""
-    get_dashboard_curl_proc = subprocess.Popen(" ".join(get_dashboard_curl_cmd), shell=True, stdout=subprocess.PIPE)
-    for line in io.TextIOWrapper(get_dashboard_curl_proc.stdout, encoding="utf-8"):
-        std_out_string += line
-    get_dashboard_curl_proc.wait()
+    print("\t\tObtaining Dashboard JSON for " + dashboardId + " ...")
+    response = get_http_session(auth_header).get(instance_url + "/services/data/v56.0/wave/dashboards/" + dashboardId + "/bundle", timeout=300)
+    std_out_string = response.text
     std_out_string = std_out_string.replace("&quot;", "\\\"")
     std_out_string = std_out_string.replace("&#92;", "\\\\")
     std_out_string = html.unescape(std_out_string)
@@ -246,6 +250,25 @@ def get_dashboard_json(dashboardId, instance_url, auth_header):
     return dashboard_json_bundle
 
 
+_date_configs = {}
+
+
+def get_date_config(path):
+    # Date formats are loaded once per run
+    path = os.path.abspath(path)
+    if path not in _date_configs:
+        with open(path, "r") as f:
+            _date_configs[path] = json.load(f)
+    return _date_configs[path]
+
+
+def index_xmd_fields(xmd_items, get_field_name):
+    index = {}
+    for item in xmd_items:
+        index.setdefault(get_field_name(item).replace(".", "_"), []).append(item)
+    return index
+
+
 def get_dataset_external_files(datasetId, datasetName, xmds_json,datasets,fields,username, suffix, limit):
     swd = os.getcwd()
     os.chdir(swd+'/external_files')
@@ -266,8 +289,9 @@ def get_dataset_external_files(datasetId, datasetName, xmds_json,datasets,fields
                 std_err_string += line
         dataset_fetch_proc.wait()
 
-    # Change column header periods to underscores in CSV file
+    # Change column header periods to underscores in CSV file and sample the first 100 rows in the same pass
     dataset_fieldnames_list = []
+    dataset_first100rows_list = []
     with open(datasetName + suffix + ".csv") as csv_in_file, open(datasetName + suffix + ".out", "w") as csv_out_file:
         reader = csv.reader(csv_in_file)
         writer = csv.writer(csv_out_file)
@@ -275,15 +299,11 @@ def get_dataset_external_files(datasetId, datasetName, xmds_json,datasets,fields
         dataset_fieldnames_list = [h.replace(".", "_") for h in dataset_fieldnames_list]
         writer.writerow(dataset_fieldnames_list)
         for row in reader:
+            if row and len(dataset_first100rows_list) < 100:
+                dataset_first100rows_list.append({name: row[i] if i < len(row) else None for i, name in enumerate(dataset_fieldnames_list)})
             writer.writerow(row)
     os.rename(datasetName + suffix + ".out", datasetName + suffix + ".csv")
-    with open(datasetName + suffix + ".csv") as csvfile:
-        csvreader = csv.DictReader(csvfile)
-        dataset_first100rows_list = list(csvreader)[0:100]
-    with open(datasetName + suffix + ".csv") as csvfile:
-        csvreader = csv.DictReader(csvfile)
-        dataset_csv_fields_dict = dict(list(csvreader)[0])
-        dataset_csv_fields = list(dataset_csv_fields_dict.keys())
+    dataset_csv_fields = dataset_fieldnames_list
     # print("\t\t\tDataset Id: " + dataset_id)
     # print("\t\tObtaining Main XMD for Dataset...")
     std_out_string = ""
@@ -387,6 +407,12 @@ def get_dataset_external_files(datasetId, datasetName, xmds_json,datasets,fields
     ds_mainxmd_derived_dimensions = ds_mainxmd_file_obj["derivedDimensions"]
     ds_mainxmd_all_dimensions = ds_mainxmd_dimensions + ds_mainxmd_derived_dimensions
 
+    # Index XMD fields by their CSV column name
+    ds_mainxmd_measures_by_field = index_xmd_fields(ds_mainxmd_all_measures, lambda x: x["field"])
+    ds_mainxmd_dates_by_field = index_xmd_fields(ds_mainxmd_dates, lambda x: x["fields"]["fullField"])
+    ds_mainxmd_dimensions_by_field = index_xmd_fields(ds_mainxmd_all_dimensions, lambda x: x["field"])
+
+    datearray = get_date_config("../../../../../../../../config/date_config.json")
 
     for idx, field in enumerate(dataset_csv_fields):
         # print("Searching for matches in XMD for field: " + field)
@@ -397,73 +423,65 @@ def get_dataset_external_files(datasetId, datasetName, xmds_json,datasets,fields
         matches_dimension_in_xmd = False
 
         # MEASURES : Does the field have a match in MAIN XMD - Measures or Derived Measures?
-        for measure in ds_mainxmd_all_measures:
+        for measure in ds_mainxmd_measures_by_field.get(field, []):
             # if match, add appropriate field boilerplate to fields section of schema
-            if field == measure["field"].replace(".", "_"):
-                matches_measure_in_xmd = True
-                # Check if decimal?
-                if ("decimalDigits" in measure["format"]) and (measure["format"]["decimalDigits"] > 0):
-                    this_measure_decimal = copy.deepcopy(
-                        ds_schema_file_obj["objects"][0]["fields_boilerplate"]["measure_decimal"])
-                    this_measure_decimal["fullyQualifiedName"] = field
-                    this_measure_decimal["name"] = field
-                    this_measure_decimal["label"] = measure["label"]
-                    this_measure_decimal["scale"] = measure["format"]["decimalDigits"]
-                    this_measure_decimal["format"] = "0." + "#" * measure["format"]["decimalDigits"]
-                    ds_schema_file_obj["objects"][0]["fields"].append(this_measure_decimal)
-                # Else its integer
-                else:
-                    this_measure_integer = copy.deepcopy(
-                        ds_schema_file_obj["objects"][0]["fields_boilerplate"]["measure_integer"])
-                    this_measure_integer["fullyQualifiedName"] = field
-                    this_measure_integer["name"] = field
-                    try:
-                        this_measure_integer["label"] = measure["label"]
-                    except KeyError:
-                        this_measure_integer["label"] = field
-                    # print(this_measure_integer)
-                    ds_schema_file_obj["objects"][0]["fields"].append(this_measure_integer)
+            matches_measure_in_xmd = True
+            # Check if decimal?
+            if ("decimalDigits" in measure["format"]) and (measure["format"]["decimalDigits"] > 0):
+                this_measure_decimal = copy.deepcopy(
+                    ds_schema_file_obj["objects"][0]["fields_boilerplate"]["measure_decimal"])
+                this_measure_decimal["fullyQualifiedName"] = field
+                this_measure_decimal["name"] = field
+                this_measure_decimal["label"] = measure["label"]
+                this_measure_decimal["scale"] = measure["format"]["decimalDigits"]
+                this_measure_decimal["format"] = "0." + "#" * measure["format"]["decimalDigits"]
+                ds_schema_file_obj["objects"][0]["fields"].append(this_measure_decimal)
+            # Else its integer
+            else:
+                this_measure_integer = copy.deepcopy(
+                    ds_schema_file_obj["objects"][0]["fields_boilerplate"]["measure_integer"])
+                this_measure_integer["fullyQualifiedName"] = field
+                this_measure_integer["name"] = field
+                try:
+                    this_measure_integer["label"] = measure["label"]
+                except KeyError:
+                    this_measure_integer["label"] = field
+                # print(this_measure_integer)
+                ds_schema_file_obj["objects"][0]["fields"].append(this_measure_integer)
 
         # DATES : Does the field have a match in MAIN XMD - Dates?
-        with open("../../../../../../../../config/date_config.json", "r") as f:
-            datearray = json.load(f)
-
         if not matches_measure_in_xmd:
-            for date in ds_mainxmd_dates:
-                if field == date["fields"]["fullField"].replace(".", "_"):
-                    matches_date_in_xmd = True
-                    this_date = copy.deepcopy(ds_schema_file_obj["objects"][0]["fields_boilerplate"]["date_timestamp"])
-                    # this_date["fullyQualifiedName"] = date["fullyQualifiedName"].replace(".","_")
-                    this_date["fullyQualifiedName"] = field
-                    this_date["name"] = field
-                    this_date["label"] = date["label"]
-                    sample_successful = False
-                    for row in dataset_first100rows_list:
-                        if row[field] != '':
-                            sample_successful = True
-                            sampled_date_value = row[field]
-                            for dateformat in datearray:
-                                try:
-                                    datetime.strptime(sampled_date_value, dateformat["python"])
-                                    this_date["format"] = dateformat["crma"]
-                                except ValueError:
-                                    pass
-                    try:
-                        this_date["format"]
-                    except KeyError:
-                        this_date["format"] = "yyyy-MM-dd'T'HH:mm:ss.SSS'Z'"
-                    ds_schema_file_obj["objects"][0]["fields"].append(this_date)
+            for date in ds_mainxmd_dates_by_field.get(field, []):
+                matches_date_in_xmd = True
+                this_date = copy.deepcopy(ds_schema_file_obj["objects"][0]["fields_boilerplate"]["date_timestamp"])
+                # this_date["fullyQualifiedName"] = date["fullyQualifiedName"].replace(".","_")
+                this_date["fullyQualifiedName"] = field
+                this_date["name"] = field
+                this_date["label"] = date["label"]
+                for row in dataset_first100rows_list:
+                    if row[field]:
+                        sampled_date_value = row[field]
+                        for dateformat in datearray:
+                            try:
+                                datetime.strptime(sampled_date_value, dateformat["python"])
+                                this_date["format"] = dateformat["crma"]
+                            except ValueError:
+                                pass
+                try:
+                    this_date["format"]
+                except KeyError:
+                    this_date["format"] = "yyyy-MM-dd'T'HH:mm:ss.SSS'Z'"
+                ds_schema_file_obj["objects"][0]["fields"].append(this_date)
 
         # DIMENSIONS : Does the field have a match in MAIN XMD - Dimensions or Derived Dimensions?
         if not matches_measure_in_xmd and not matches_date_in_xmd:
-            for dimension in ds_mainxmd_all_dimensions:
-                if field == dimension["field"].replace(".", "_"):
-                    matches_dimension_in_xmd = True
-                    this_dimension = copy.deepcopy(ds_schema_file_obj["objects"][0]["fields_boilerplate"]["dimension"])
-                    this_dimension["fullyQualifiedName"] = field
-                    this_dimension["name"] = field
-                    this_dimension["label"] = dimension["label"]
-                    ds_schema_file_obj["objects"][0]["fields"].append(this_dimension)
+            for dimension in ds_mainxmd_dimensions_by_field.get(field, []):
+                matches_dimension_in_xmd = True
+                this_dimension = copy.deepcopy(ds_schema_file_obj["objects"][0]["fields_boilerplate"]["dimension"])
+                this_dimension["fullyQualifiedName"] = field
+                this_dimension["name"] = field
+                this_dimension["label"] = dimension["label"]
+                ds_schema_file_obj["objects"][0]["fields"].append(this_dimension)
 
 
         # Field had no match in Main XMD -- assume it's a Dimension
@@ -639,6 +657,70 @@ def get_template_info(name, api_name, suffix, datasets, dashboards, components):
     return info_json
 
 
+FIELD_TOKEN_PATTERN = re.compile(r"(?<![\w.])[\w.]*\.[\w.]*")
+_field_replacers = {}
+
+
+def get_field_replacer(filtered_fields):
+    # Applies every field name replacement in one scan. The result is the same as calling str.replace for each field in order.
+    replacements = tuple((field["name"], field["name_after_replace"]) for field in filtered_fields)
+    if replacements in _field_replacers:
+        return _field_replacers[replacements]
+
+    if any(re.search(r"[^\w.]", name) for name, after in replacements):
+        # Names outside of word characters and periods can span tokens, so apply them one at a time
+        def replace_fields(text):
+            for name, after in replacements:
+                text = text.replace(name, after)
+            return text
+        _field_replacers[replacements] = replace_fields
+        return replace_fields
+
+    # Field names only contain word characters and periods, so a match always sits inside one dotted token.
+    # Replacements only turn periods into underscores, so a "_" in a name can also match a "." in the original token.
+    trie = {}
+    for order, (name, after) in enumerate(replacements):
+        node = trie
+        for ch in name:
+            node = node.setdefault(ch, {})
+        node.setdefault(None, []).append(order)
+
+    def find_candidates(token):
+        found = set()
+        for start in range(len(token)):
+            nodes = [trie]
+            for ch in token[start:]:
+                next_nodes = []
+                for node in nodes:
+                    if ch in node:
+                        next_nodes.append(node[ch])
+                    if ch == "." and "_" in node:
+                        next_nodes.append(node["_"])
+                nodes = next_nodes
+                if not nodes:
+                    break
+                for node in nodes:
+                    found.update(node.get(None, ()))
+        return sorted(found)
+
+    token_cache = {}
+
+    def replace_token(match):
+        token = match.group(0)
+        if token not in token_cache:
+            new_token = token
+            for order in find_candidates(token):
+                new_token = new_token.replace(replacements[order][0], replacements[order][1])
+            token_cache[token] = new_token
+        return token_cache[token]
+
+    def replace_fields(text):
+        return FIELD_TOKEN_PATTERN.sub(replace_token, text)
+
+    _field_replacers[replacements] = replace_fields
+    return replace_fields
+
+
 def modify_json(suffix, asset_json, asset_xmd_json, components, dashboards, columns):
     type = asset_json["type"]
     os.chdir(type+"s")
@@ -647,8 +729,7 @@ def modify_json(suffix, asset_json, asset_xmd_json, components, dashboards, colu
     datasets = dashboard_json["datasets"]
     dashboard_string = json.dumps(dashboard_json)
     filtered_fields = [d for d in columns if d["name"] != d["name_after_replace"]]
-    for field in filtered_fields:
-        dashboard_string = dashboard_string.replace(field["name"], field["name_after_replace"])
+    dashboard_string = get_field_replacer(filtered_fields)(dashboard_string)
     dashboard_json = json.loads(dashboard_string)
 
     if type == "dashboard":
@@ -15,14 +15,20 @@ from dateutil.parser import parse
 from abc import ABC
 from pathlib import Path
 import shlex
+import time
 from time import sleep
+from concurrent.futures import ThreadPoolExecutor
 from cumulusci.tasks.salesforce.BaseSalesforceApiTask import BaseSalesforceApiTask
 
+from qbrix.core.qbrix_org_session import get_org_session
 from qbrix.tools.shared.qbrix_console_utils import init_logger
 from qbrix.tools.shared.qbrix_project_tasks import replace_file_text
 
 log = init_logger()
 
+FOLDER_QUERY_BATCH_SIZE = 200
+DATASET_PAGE_SIZE = 200
+
 
 def cleanup_null_values(file_location: str = None):
 
@@ -167,6 +173,14 @@ class AnalyticsActionRunner(BaseSalesforceApiTask, ABC):
             "description": "API Method for the Action. Defaults to POST",
             "required": False
         },
+        "max_concurrent_jobs": {
+            "description": "Maximum number of jobs to run at the same time. Defaults to 0, which starts every job up front and lets the org queue them",
+            "required": False
+        },
+        "sequential": {
+            "description": "When True, each job is started only after the previous job has completed. Defaults to False",
+            "required": False
+        },
     }
 
     def _init_options(self, kwargs):
@@ -177,6 +191,10 @@ class AnalyticsActionRunner(BaseSalesforceApiTask, ABC):
         self.action_api_method = str(self.options["action_api_method"]).upper() if "action_api_method" in self.options else "POST"
         self.bulk_mode = True if self.action_records_query and self.action_records_query.lower().startswith("select") else False
         self.action = str(self.options["action"]).upper() if "action" in self.options else "CUSTOM"
+        self.sequential = str(self.options.get("sequential") or False).lower() == "true"
+        self.max_concurrent_jobs = 1 if self.sequential else max(int(self.options.get("max_concurrent_jobs") or 0), 0)
+        self.min_poll_seconds = 2
+        self.max_poll_seconds = 30
 
     def _refresh_active_dataflows(self):
         self.logger.info(" -> Refreshing active Dataflows in the target org...")
@@ -187,7 +205,7 @@ class AnalyticsActionRunner(BaseSalesforceApiTask, ABC):
             "command": "start"
         })
         self.action_category = "dataflowjobs"
-        self._prepare_request(ACTIVE_DATAFLOWS_SOQL)
+        return self._prepare_request(ACTIVE_DATAFLOWS_SOQL)
 
     def _refresh_active_recipes(self):
         self.logger.info(" -> Refreshing active Recipes in the target org...")
@@ -198,15 +216,20 @@ class AnalyticsActionRunner(BaseSalesforceApiTask, ABC):
             "command": "start"
         })
         self.action_category = "dataflowjobs"
-        self._prepare_request(ACTIVE_RECIPES_SOQL)
+        return self._prepare_request(ACTIVE_RECIPES_SOQL)
 
     def _refresh_all(self):
+
+        """ Refreshes the Dataflows, then the Recipes once every Dataflow has finished, as Recipes usually read the datasets which the Dataflows produce """
+
         self.logger.info(" -> Refreshing all Dataflows and Recipes in the target org...")
-        self._refresh_active_dataflows()
-        self._refresh_active_recipes()
+        self._run_requests(self._refresh_active_dataflows())
+        self._run_requests(self._refresh_active_recipes())
 
     def _prepare_request(self, records_query):
 
+        """ Builds a request for each record returned by the records query, or a single request when bulk mode is not enabled """
+
         if self.bulk_mode:
             self.logger.info(" -> Bulk Record Mode Enabled")
 
@@ -214,62 +237,142 @@ class AnalyticsActionRunner(BaseSalesforceApiTask, ABC):
 
             if bulk_records_lookup and bulk_records_lookup.get("totalSize") > 0:
                 self.logger.info(f" -> Processing {bulk_records_lookup.get('totalSize')} records...")
+                return [self._build_request(record["Id"]) for record in bulk_records_lookup.get("records")]
 
-                for record in bulk_records_lookup.get("records"):
-                    self._run_request(record["Id"])
-            else:
-                self.logger.info("No records found to process.")
-        else:
-            self._run_request()
+            self.logger.info("No records found to process.")
+            return []
 
-    def _run_request(self, record_id=None):
+        return [self._build_request()]
 
-        if self.bulk_mode:
-            
-            for key, value in self.action_request.items():
+    def _build_request(self, record_id=None):
+
+        """ Builds the request for a single record. The request template is copied, so each record gets its own Id """
+
+        action_request = dict(self.action_request) if self.action_request is not None else None
+
+        if self.bulk_mode and action_request:
+            for key, value in action_request.items():
                 if isinstance(value, str) and "___RECORD_ID___" in value:
                     self.logger.info(f" -> Replacing ___RECORD_ID___ in key {key}")
-                    updated_value = value.replace("___RECORD_ID___", record_id)
-                    self.action_request[key] = updated_value
+                    action_request[key] = value.replace("___RECORD_ID___", record_id)
+
+        return {
+            "category": self.action_category,
+            "method": self.action_api_method.upper(),
+            "body": action_request,
+            "record_id": record_id
+        }
+
+    def _start_job(self, job_request):
+
+        """ Sends the request and returns the job to track, or None when the request does not start a job """
 
         request_response = self.sf.restful(
-            f"wave/{self.action_category}",
-            data=json.dumps(self.action_request),
-            method=self.action_api_method.upper(),
+            f"wave/{job_request['category']}",
+            data=json.dumps(job_request["body"]),
+            method=job_request["method"],
         )
 
-        if request_response.get('id'):
-            while True:
+        if not request_response or not request_response.get('id'):
+            return None
+
+        self.logger.info(f" -> Started Job ID: {request_response.get('id')} | Status: {request_response.get('status')}")
+        return {
+            "id": request_response.get('id'),
+            "category": job_request["category"],
+            "label": request_response.get('label') or job_request["record_id"],
+            "status": request_response.get('status'),
+            "started_at": time.time(),
+            "running_at": None
+        }
+
+    def _log_job_times(self, job, job_check):
+
+        """ Logs the time a job spent queued and running. The times reported by the org are used when available """
+
+        finished_at = time.time()
+        running_at = job["running_at"] or finished_at
+        queue_seconds = job_check.get('waitTime') if job_check.get('waitTime') is not None else running_at - job["started_at"]
+        run_seconds = job_check.get('duration') if job_check.get('duration') is not None else finished_at - running_at
+        self.logger.info(f" -> Job ID: {job['id']} ({job['label']}) | {job_check.get('status')} | Queued: {float(queue_seconds):.0f}s | Run: {float(run_seconds):.0f}s")
+
+    def _run_requests(self, job_requests):
+
+        """ Starts the jobs for the given requests, up to the concurrency limit, and tracks every outstanding job in a single polling loop """
+
+        run_start_time = time.time()
+        pending = list(job_requests)
+        active_jobs = {}
+        succeeded = 0
+        failed = 0
+        poll_seconds = self.min_poll_seconds
+
+        while pending or active_jobs:
+
+            # Start as many jobs as the concurrency limit allows
+            to_start = pending if not self.max_concurrent_jobs else pending[:self.max_concurrent_jobs - len(active_jobs)]
+            pending = pending[len(to_start):]
+            for job_request in to_start:
+                job = self._start_job(job_request)
+                if job:
+                    active_jobs[job["id"]] = job
+
+            if not active_jobs:
+                continue
+
+            sleep(poll_seconds)
+
+            # Check every outstanding job in one pass
+            finished = False
+            for job_id, job in list(active_jobs.items()):
                 job_check = self.sf.restful(
-                    f"wave/{self.action_category}/{request_response.get('id')}",
+                    f"wave/{job['category']}/{job_id}",
                     method="GET"
                 )
+                status = job_check.get('status')
 
-                self.logger.info(f" -> Job ID: {job_check.get('id')} | Status: {job_check.get('status')}")
+                if status != job["status"]:
+                    self.logger.info(f" -> Job ID: {job_id} | Status: {status}")
+                    job["status"] = status
 
-                if job_check.get('status') == "Success":
-                    self.logger.info(" -> Job Complete!")
-                    break
+                if status == "Running" and job["running_at"] is None:
+                    job["running_at"] = time.time()
 
-                if job_check.get('status') not in ('Running', 'Queued', 'Success'):
-                    self.logger.error(f"Job ID: {job_check.get('id')} | FAILED\n{job_check}")
-                    break
+                if status in ('Running', 'Queued'):
+                    continue
+
+                del active_jobs[job_id]
+                finished = True
+                self._log_job_times(job, job_check)
+
+                if status == "Success":
+                    succeeded += 1
+                else:
+                    failed += 1
+                    self.logger.error(f"Job ID: {job_id} | FAILED\n{job_check}")
+
+            # Poll quickly again after a job finishes, otherwise back off
+            poll_seconds = self.min_poll_seconds if finished else min(poll_seconds * 2, self.max_poll_seconds)
+
+        if succeeded or failed:
+            self.logger.info(f" -> {succeeded} job(s) succeeded, {failed} failed. Total Time: " + time.strftime("%H:%M:%S", time.gmtime(time.time() - run_start_time)))
 
-                sleep(5)
-       
     def _run_task(self):
         
         self.logger.info(f"\nRunning Analytics Action Runner\nMode: {self.action}")
 
+        job_requests = []
         if self.action == "CUSTOM":
-            self._prepare_request(self.action_records_query)
+            job_requests = self._prepare_request(self.action_records_query)
         elif self.action == "REFRESH_ACTIVE_DATAFLOWS":
-            self._refresh_active_dataflows()
+            job_requests = self._refresh_active_dataflows()
         elif self.action == "REFRESH_ACTIVE_RECIPES":
-            self._refresh_active_recipes()
+            job_requests = self._refresh_active_recipes()
         elif self.action == "REFRESH_ALL":
             self._refresh_all()
 
+        self._run_requests(job_requests)
+
         self.logger.info("Jobs Completed!")
         
 
@@ -401,17 +504,19 @@ class AnalyticsManager(BaseSalesforceApiTask, ABC):
 
         org_datasets = self.get_datasets_from_org()
 
-        for file in wave_dataset_files:
-            dataset_name = Path(file).stem.replace(".wds-meta", "")
+        dataset_names = [Path(file).stem.replace(".wds-meta", "") for file in wave_dataset_files]
+        dataset_names = [dataset_name for dataset_name in dataset_names if self.dataset.find(dataset_name) >= 0 or self.dataset == 'all']
 
-            
-            if self.dataset.find(dataset_name) >= 0 or self.dataset == 'all':
-                if dataset_name in org_datasets:
-                    dataset_details = org_datasets.get(dataset_name)
-                    self.generate_csv_from_wave_dataset_version(dataset_details["id"], 'datasets/analytics', dataset_name, dataset_details["version"])
-                    self.logger.info(f"Dataset {dataset_name} has been downloaded to {self.dataset_folder}")
-                else:
-                    self.logger.info(f"{dataset_name} is not present in the target org. Skipping.")
+        # Fetch the version details for the datasets being downloaded up front, rather than one at a time
+        self.get_dataset_version_details({dataset_name: org_datasets[dataset_name] for dataset_name in dataset_names if dataset_name in org_datasets})
+
+        for dataset_name in dataset_names:
+            if dataset_name in org_datasets:
+                dataset_details = org_datasets.get(dataset_name)
+                self.generate_csv_from_wave_dataset_version(dataset_details["id"], 'datasets/analytics', dataset_name, dataset_details["version"], dataset_details.get("version_details"))
+                self.logger.info(f"Dataset {dataset_name} has been downloaded to {self.dataset_folder}")
+            else:
+                self.logger.info(f"{dataset_name} is not present in the target org. Skipping.")
                 
     def upload_dataset_data(self):
         if not os.path.exists("force-app/main/default/wave"):
@@ -626,67 +731,107 @@ class AnalyticsManager(BaseSalesforceApiTask, ABC):
     def remove_unused_keys(self, folder_shares):
         return [{key: share[key] for key in ("accessType", "shareType")} for share in folder_shares]
 
-    def update_folder_sharing(self, folder_name):
-
-        if not self.share_to_all_internal_users or not self.share_to_all_portal_users:
-            self.logger.info("Running as Sharing Mode although no sharing specified. Check the options for the task.")
-            return
-        
-        self.logger.info(f"Checking sharing settings for Analytics App: {folder_name}")
-
-        # Query for the folder's ID based on its name
-        folder_query = f"SELECT Id FROM Folder WHERE Name = '{folder_name}' and Type = 'Insights'"
-        folder_id = self.sf.query(folder_query)["records"][0]["Id"]
+    def get_folder_shares(self, folder_name, current_shares):
 
-        # Retrieve the metadata for the folder
-        headers = {
-            "Content-Type": "application/json; charset=UTF-8",
-            "Accept": "application/json"
-        }
-        endpoint = f"wave/folders/{folder_id}"
-        response = self.sf.restful(endpoint, headers=headers, method="GET")
+        """ Builds the shares an Analytics App folder should have, based on its current shares and the sharing options """
 
-        folder_metadata = dict(response)
         folder_shares = []
 
-        if response["shares"]:
-            folder_shares = self.remove_user_shares(response["shares"])
+        if current_shares:
+            folder_shares = self.remove_user_shares(current_shares)
             folder_shares = self.remove_unused_keys(folder_shares)
             
             if self.share_to_all_internal_users:
                 if len([share for share in folder_shares if share.get("shareType") == "organization"]) < 1:
                     folder_shares.append({'accessType': 'manage', 'shareType': 'organization'})
                 else:
-                    self.logger.info("Application Already Shared with Organization")
+                    self.logger.info(f"{folder_name}: Application Already Shared with Organization")
 
             if self.share_to_all_portal_users:
                 # Share to community users
                 if len([share for share in folder_shares if share.get("shareType") == "allcspusers"]) < 1:
                     folder_shares.append({'accessType': 'view', 'shareType': 'allcspusers'})
                 else:
-                    self.logger.info("Application Already Shared with Community Users")
+                    self.logger.info(f"{folder_name}: Application Already Shared with Community Users")
 
                 # Share to Partner Community Users
                 if len([share for share in folder_shares if share.get("shareType") == "allprmusers"]) < 1:
                     folder_shares.append({'accessType': 'view', 'shareType': 'allprmusers'})
                 else:
-                    self.logger.info("Application Already Shared with Partner Community Users")
+                    self.logger.info(f"{folder_name}: Application Already Shared with Partner Community Users")
+
+        return folder_shares
+
+    def get_folder_ids(self, folder_names):
+
+        """ Looks up the Ids of the Analytics App folders with the given names, querying in batches. Returns the folder Ids by name and the number of queries run """
+
+        folder_ids = {}
+        query_count = 0
+        for i in range(0, len(folder_names), FOLDER_QUERY_BATCH_SIZE):
+            names = ", ".join("'" + name.replace("\\", "\\\\").replace("'", "\\'") + "'" for name in folder_names[i:i + FOLDER_QUERY_BATCH_SIZE])
+            folder_query = f"SELECT Id, Name FROM Folder WHERE Name IN ({names}) and Type = 'Insights'"
+            query_count += 1
+            for record in self.sf.query_all(folder_query)["records"]:
+                folder_ids.setdefault(record["Name"], record["Id"])
+        return folder_ids, query_count
+
+    def update_sharing_for_folders(self, folder_names):
+
+        """ Updates sharing for the given Analytics App folders. The folders are fetched concurrently and only those whose shares would change are updated """
+
+        if not self.share_to_all_internal_users or not self.share_to_all_portal_users:
+            self.logger.info("Running as Sharing Mode although no sharing specified. Check the options for the task.")
+            return
+
+        self.logger.info(f"Checking sharing settings for {len(folder_names)} Analytics App(s)")
 
-        folder_metadata.update({"shares": folder_shares})
+        # Query for the folder Ids based on their names
+        folder_ids, api_calls = self.get_folder_ids(folder_names)
+        for folder_name in folder_names:
+            if folder_name not in folder_ids:
+                self.logger.error(f"Unable to find the Analytics App folder for {folder_name}. Skipping.")
 
-        body = {
-            "shares": folder_shares,
+        session = get_org_session(self.org_config, self.project_config.project__package__api_version)
+        headers = {
+            "Content-Type": "application/json; charset=UTF-8",
+            "Accept": "application/json"
         }
 
-        self.sf.restful(
-            endpoint,
-            data=json.dumps({
-              "shares": folder_shares
-            }),
-            method="PATCH",
-        )
+        def get_folder(folder_name):
+            response = session.get(f"wave/folders/{folder_ids[folder_name]}", headers=headers)
+            response.raise_for_status()
+            return folder_name, response.json()
+
+        def update_folder(folder_update):
+            folder_name, folder_shares = folder_update
+            response = session.request("PATCH", f"wave/folders/{folder_ids[folder_name]}", data=json.dumps({"shares": folder_shares}))
+            response.raise_for_status()
+            self.logger.info(f"Sharing Updated for {folder_name}")
+
+        found_folders = [folder_name for folder_name in folder_names if folder_name in folder_ids]
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            folders = list(executor.map(get_folder, found_folders))
+            api_calls += len(folders)
+
+            # Only update folders where the shares would change. User shares are removed by an update, so they count as a change
+            folder_updates = []
+            for folder_name, folder_metadata in folders:
+                current_shares = folder_metadata.get("shares") or []
+                folder_shares = self.get_folder_shares(folder_name, current_shares)
+                current_keys = sorted((share.get("accessType"), share.get("shareType")) for share in current_shares)
+                if current_keys != sorted((share["accessType"], share["shareType"]) for share in folder_shares):
+                    folder_updates.append((folder_name, folder_shares))
+                else:
+                    self.logger.info(f"Sharing already up to date for {folder_name}")
+
+            list(executor.map(update_folder, folder_updates))
+            api_calls += len(folder_updates)
 
-        self.logger.info(f"Sharing Updated for {folder_name}")
+        self.logger.info(f"Sharing: Checked {len(folders)} app(s), updated {len(folder_updates)}. API calls: {api_calls}")
+
+    def update_folder_sharing(self, folder_name):
+        self.update_sharing_for_folders([folder_name])
 
     def update_sharing_for_applications(self):
         if not os.path.exists("force-app/main/default/wave"):
@@ -699,10 +844,8 @@ class AnalyticsManager(BaseSalesforceApiTask, ABC):
             self.logger.info("No Wave Application Files found. Skipping.")
             return
 
-        for app in wave_app_files:
-            filename = os.path.basename(app)
-            app_name = filename[:-len(".wapp-meta.xml")]
-            self.update_folder_sharing(app_name)
+        app_names = [os.path.basename(app)[:-len(".wapp-meta.xml")] for app in wave_app_files]
+        self.update_sharing_for_folders(app_names)
 
     def get_field_type(self, column):
         """
@@ -965,14 +1108,15 @@ class AnalyticsManager(BaseSalesforceApiTask, ABC):
             else:
                 self.logger.error(f"Unrecognised Input Format Passed to method: {input_format}")
 
-    def generate_csv_from_wave_dataset_version(self, dataset_id, target_folder, target_filename, version_id=''):
+    def generate_csv_from_wave_dataset_version(self, dataset_id, target_folder, target_filename, version_id='', dataset_version=None):
         """
-        Generates a local csv file from a dataset version
+        Generates a local csv file from a dataset version. Version details which have already been fetched can be passed in as dataset_version
         """
 
         # Get the Current Dataset Version Data
-        self.logger.info(f"Getting information for {target_filename} Dataset ID [{dataset_id}] version [{version_id}] (Note Version can be blank)")
-        dataset_version = self.sf.restful(f'wave/datasets/{dataset_id}/versions/{version_id}', method="GET")
+        if not dataset_version:
+            self.logger.info(f"Getting information for {target_filename} Dataset ID [{dataset_id}] version [{version_id}] (Note Version can be blank)")
+            dataset_version = self.sf.restful(f'wave/datasets/{dataset_id}/versions/{version_id}', method="GET")
 
         if not dataset_version:
             raise Exception(f"No data was returned for dataset id {dataset_id}")
@@ -1326,36 +1470,61 @@ class AnalyticsManager(BaseSalesforceApiTask, ABC):
                     print(f' -> Skipping {filename}. File size is {file_size / 1000000:.2f} MB.')
 
                     
-    def get_datasets_from_org(self, endpoint = f"wave/datasets?pageSize=25", org_dataset_dict = {}):
+    def get_datasets_from_org(self, include_version_details=False):
 
-        # Retrieve the list of datasets
+        """ Lists the datasets in the org, following each page of results. Returns the dataset Id and current version Id by dataset name, plus the version details when requested """
+
+        start_time = time.time()
         headers = {
             "Content-Type": "application/json; charset=UTF-8",
             "Accept": "application/json"
         }
 
-        response = self.sf.restful(endpoint, method="GET", headers=headers)
+        org_dataset_dict = {}
+        api_calls = 0
+        endpoint = f"wave/datasets?pageSize={DATASET_PAGE_SIZE}"
+        while endpoint:
+            response = self.sf.restful(endpoint, method="GET", headers=headers)
+            api_calls += 1
 
-        if response and response.get("datasets"):
-            for dataset_dict in list(response["datasets"]):
-                
-                dataset = dict(dataset_dict)
-                dataset_version = dataset.get("currentVersionId")
+            if not response or not response.get("datasets"):
+                break
+
+            for dataset in response["datasets"]:
                 dataset_name = dataset.get("name")
                 dataset_id = dataset.get("id")
 
-                if not dataset_version:
-                    dataset_version = ''
-
                 if not dataset_name or not dataset_id:
                     continue
-                
-                org_dataset_dict.update({dataset["name"]: {"id": dataset["id"], "version": dataset_version}})
 
-            if response["nextPageUrl"]:
-                org_dataset_dict = self.get_datasets_from_org(response['nextPageUrl'].replace(f'/services/data/v{self.project_config.project__package__api_version}/', ''), org_dataset_dict)
+                org_dataset_dict[dataset_name] = {"id": dataset_id, "version": dataset.get("currentVersionId") or ''}
+
+            # nextPageUrl is a full path, e.g. /services/data/v58.0/wave/datasets?page=...
+            endpoint = re.sub(r"^/services/data/v[0-9.]+/", "", response.get("nextPageUrl") or "")
+
+        if include_version_details:
+            api_calls += self.get_dataset_version_details(org_dataset_dict)
+
+        self.logger.info(f"Listed {len(org_dataset_dict)} dataset(s) in {time.time() - start_time:.2f} seconds. API calls: {api_calls}")
+        return org_dataset_dict
+
+    def get_dataset_version_details(self, datasets):
+
+        """ Fetches the current version details for the given datasets concurrently and stores them under version_details. Returns the number of API calls made """
+
+        session = get_org_session(self.org_config, self.project_config.project__package__api_version)
+
+        def get_version(dataset_details):
+            response = session.get(f"wave/datasets/{dataset_details['id']}/versions/{dataset_details['version']}")
+            response.raise_for_status()
+            dataset_details["version_details"] = response.json()
+
+        # Datasets without a current version have no details to fetch
+        versioned_datasets = [dataset_details for dataset_details in datasets.values() if dataset_details["version"]]
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            list(executor.map(get_version, versioned_datasets))
 
-        return org_dataset_dict      
+        return len(versioned_datasets)
 
 
     def _run_task(self):
@@ -1,16 +1,70 @@
 import json
 import os
+import re
 import subprocess
+import time
 from abc import abstractmethod
+from datetime import datetime, timedelta
 
 from cumulusci.core.config import ScratchOrgConfig
 from cumulusci.tasks.sfdx import SFDXBaseTask
 from cumulusci.core.exceptions import CommandException
 from cumulusci.core.keychain import BaseProjectKeychain
+from qbrix.core.qbrix_org_session import get_sfdx_env
 
 LOAD_COMMAND = "sfdx sfdmu:run --sourceusername CSVFILE --targetusername {targetusername} -p {pathtoexportjson} --canmodify {instanceurl} --noprompt --verbose"
 SCRATCHORG_LOAD_COMMAND = "sfdx sfdmu:run --sourceusername CSVFILE --targetusername {targetusername} -p {pathtoexportjson} --noprompt --verbose"
 
+# SFDMU log lines look like "[10:15:02.123] {Account} Data retrieval has started."
+SFDMU_LOG_LINE_PATTERN = re.compile(r"^\[(\d{2}:\d{2}:\d{2}(?:\.\d+)?)\]\s*\{([^}]+)\}")
+
+
+def _write_if_changed(file_path, contents):
+    """
+    Writes the file only when the contents differ from what is already on disk.
+
+    Args:
+        file_path (str): Path to the file
+        contents (str): Contents to write
+
+    Returns:
+        bool: True when the file was written
+    """
+
+    if os.path.isfile(file_path):
+        with open(file_path, "r") as tmpFile:
+            if tmpFile.read() == contents:
+                return False
+
+    with open(file_path, "w") as tmpFile:
+        tmpFile.write(contents)
+    return True
+
+
+def update_object_timings(object_timings, line):
+    """
+    Records the first and last time an object is mentioned in an SFDMU log line.
+
+    Args:
+        object_timings (dict): Object name to a dict of first and last timestamps and line count. Updated in place
+        line (str): Line of SFDMU output
+    """
+
+    match = SFDMU_LOG_LINE_PATTERN.match(line)
+    if not match:
+        return
+
+    timestamp = datetime.strptime(match.group(1).split(".")[0], "%H:%M:%S")
+    if "." in match.group(1):
+        timestamp += timedelta(milliseconds=int(match.group(1).split(".")[1][:3].ljust(3, "0")))
+
+    timing = object_timings.setdefault(match.group(2), {"first": timestamp, "last": timestamp, "lines": 0})
+    if timestamp < timing["last"]:
+        # The log clock rolled over midnight
+        timestamp += timedelta(days=1)
+    timing["last"] = timestamp
+    timing["lines"] += 1
+
 
 class SFDMULoad(SFDXBaseTask):
     task_docs = """
@@ -51,40 +105,41 @@ class SFDMULoad(SFDXBaseTask):
 
         with open(f"{self.pathtoexportjson}/export.json", "r") as tmpFile:
             defcontents = tmpFile.read()
-            tmpFile.close()
 
-            exportjson = json.loads(defcontents)
+        exportjson = json.loads(defcontents)
+
+        # Keep the original text when it has no orgs, so cleanup leaves the file exactly as it was found
+        if exportjson.get("orgs"):
+            self.cleanexportjson = json.dumps(dict(exportjson, orgs=[]))
+        else:
+            self.cleanexportjson = defcontents
 
-            # build the org data
-            orgdata = {'name': self.targetusername, 'accessToken': self.accesstoken, 'instanceUrl': self.instanceurl}
+        # build the org data
+        orgdata = {'name': self.targetusername, 'accessToken': self.accesstoken, 'instanceUrl': self.instanceurl}
 
-            exportjson["orgs"] = []
-            exportjson["orgs"].append(orgdata)
+        exportjson["orgs"] = []
+        exportjson["orgs"].append(orgdata)
 
-            tmpdata = json.dumps(exportjson)
+        tmpdata = json.dumps(exportjson)
 
-            self.logger.info('Formatted EXPORT.JSON:' + tmpdata)
+        self.logger.info('Formatted EXPORT.JSON:' + tmpdata)
 
-        with open(f"{self.pathtoexportjson}/export.json", "w") as tmpFile:
-            tmpFile.write(tmpdata)
-            tmpFile.close()
+        if not _write_if_changed(f"{self.pathtoexportjson}/export.json", tmpdata):
+            self.logger.info('export.json is unchanged')
 
     def _cleanupexportjsonfile(self):
         if os.path.isdir(self.pathtoexportjson):
             if os.path.isfile(f"{self.pathtoexportjson}/export.json"):
-                with open(f"{self.pathtoexportjson}/export.json", "r") as tmpFile:
-                    defcontents = tmpFile.read()
-                    tmpFile.close()
-                    exportjson = json.loads(defcontents)
+                if not hasattr(self, "cleanexportjson"):
+                    with open(f"{self.pathtoexportjson}/export.json", "r") as tmpFile:
+                        exportjson = json.loads(tmpFile.read())
                     exportjson["orgs"] = []
-                    tmpdata = json.dumps(exportjson)
+                    self.cleanexportjson = json.dumps(exportjson)
 
-                    with open(f"{self.pathtoexportjson}/export.json", "w") as tmpFile:
-                        tmpFile.write(tmpdata)
-                        tmpFile.close()
+                _write_if_changed(f"{self.pathtoexportjson}/export.json", self.cleanexportjson)
 
     def _setprojectdefaults(self, instanceurl):
-        subprocess.run([f"sfdx config:set instanceUrl={instanceurl}"], shell=True, capture_output=True)
+        self.sfdx_env = get_sfdx_env(instanceurl)
 
     def _init_options(self, kwargs):
         super(SFDMULoad, self)._init_options(kwargs)
@@ -161,18 +216,34 @@ class SFDMULoad(SFDXBaseTask):
         self.logger.info('Target Path:' + self.pathtoexportjson)
         self.logger.info('Current Working Directory:' + self.options.get("dir"))
         self.options["command"] = self._get_command()
-        output = []
 
         cmdtorun = self._get_command()
-        resp = subprocess.run([f"{cmdtorun}"], shell=True, capture_output=True, cwd=self.options.get("dir"))
-
-        # resp = output[0].decode("utf-8")
-        stdoutres = resp.stdout.splitlines()
-        [self.logger.info(i) for i in stdoutres]
-        # self.logger.info(resp.stdout)
-
-        self.logger.info('cleaning up export.json..')
-        self._cleanupexportjsonfile()
+        object_timings = {}
+        start_time = time.time()
+
+        # Stream the plugin output as it is written, so progress is visible and large migrations are not held in memory
+        try:
+            with subprocess.Popen([f"{cmdtorun}"], shell=True, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                                  bufsize=1, universal_newlines=True, cwd=self.options.get("dir"), env=self.sfdx_env) as p:
+                for line in p.stdout:
+                    line = line.rstrip()
+                    if line:
+                        self.logger.info(line)
+                        update_object_timings(object_timings, line)
+
+            if p.returncode != 0:
+                self.logger.error(f"SFDMU exited with return code {p.returncode}")
+        finally:
+            self.logger.info('cleaning up export.json..')
+            self._cleanupexportjsonfile()
+
+        self._logtimingsummary(object_timings, time.time() - start_time)
+
+    def _logtimingsummary(self, object_timings, total_seconds):
+        self.logger.info(f"SFDMU completed in {total_seconds:.2f}s")
+        for object_name, timing in object_timings.items():
+            seconds = (timing["last"] - timing["first"]).total_seconds()
+            self.logger.info(f" - {object_name}: {seconds:.2f}s ({timing['lines']} log lines)")
 
     def _get_command(self):
         command = ""
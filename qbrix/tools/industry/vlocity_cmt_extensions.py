@@ -14,6 +14,7 @@ from cumulusci.tasks.sfdx import SFDXBaseTask
 from cumulusci.core.exceptions import TaskOptionsError
 from cumulusci.core.exceptions import CommandException
 from cumulusci.core.keychain import BaseProjectKeychain
+from qbrix.core.qbrix_org_session import get_sfdx_env
 
 LOAD_COMMAND = "sfdx force:apex:execute "
 
@@ -28,7 +29,7 @@ class CMTDeployDefaultLayouts(SFDXBaseTask):
     }
 
     def _setprojectdefaults(self, instanceurl):
-        subprocess.run([f"sfdx config:set instanceUrl={instanceurl}"], shell=True, capture_output=True)
+        self.sfdx_env = get_sfdx_env(instanceurl)
 
     def _init_options(self, kwargs):
         super(CMTDeployDefaultLayouts, self)._init_options(kwargs)
@@ -94,7 +95,7 @@ class CMTDeployDefaultLayouts(SFDXBaseTask):
     def deploy_default_layout(self):
         
         #env setup for sfdx 
-        subprocess.run([f"sfdx config:set instanceUrl={self.instanceurl}"], shell=True, capture_output=True)
+        self._setprojectdefaults(self.instanceurl)
         
         MAX_CYCLES = 60
         
@@ -105,14 +106,14 @@ class CMTDeployDefaultLayouts(SFDXBaseTask):
         
         #Run the intial delete
         deletecmd=f"sfdx force:apex:execute -f {deleteapex} -u {self.accesstoken} --json"
-        resp = subprocess.run([deletecmd], shell=True, capture_output=True)
+        resp = subprocess.run([deletecmd], shell=True, capture_output=True, env=self.sfdx_env)
         self.logger.info("Delete Executed")
         #wait a minute - let jobs spin up server side
         sleep(60)
         
         #Run the intitial loadta - to seed the server side dp state
         initdeploycmd=f"sfdx force:apex:execute -f {initialRedeployApex} -u {self.accesstoken} --json"
-        resp = subprocess.run([initdeploycmd], shell=True, capture_output=True)
+        resp = subprocess.run([initdeploycmd], shell=True, capture_output=True, env=self.sfdx_env)
         self.logger.info("Running Initial Load")
         sleep(60)
         
@@ -122,7 +123,7 @@ class CMTDeployDefaultLayouts(SFDXBaseTask):
         if(isclassdatapackload):
             cmd = f"sfdx force:data:soql:query -u {self.accesstoken} -q \"select id,vlocity_cmt__Status__c from vlocity_cmt__VlocityDataPack__c where Name='QBrixDeploy' and vlocity_cmt__Status__c in ('Ready') ORDER BY CREATEDDATE DESC LIMIT 1\" --json"
             
-        result = subprocess.run([cmd], shell=True, capture_output=True)
+        result = subprocess.run([cmd], shell=True, capture_output=True, env=self.sfdx_env)
 
         if result is None:
             return None
@@ -149,7 +150,7 @@ class CMTDeployDefaultLayouts(SFDXBaseTask):
                     pollcmd=f"sfdx force:apex:execute -f {pollRedeployApex} -u {self.accesstoken} --json"
                 
                 
-                subprocess.run([pollcmd], shell=True, capture_output=True)
+                subprocess.run([pollcmd], shell=True, capture_output=True, env=self.sfdx_env)
     
     
                 cmd = f"sfdx force:data:soql:query -u {self.accesstoken} -q \"select id,ProcessStatus from OmniDataPack where Name='QBrixDeploy' and Id='{queueid}' ORDER BY CREATEDDATE DESC LIMIT 1\" --json"
@@ -157,7 +158,7 @@ class CMTDeployDefaultLayouts(SFDXBaseTask):
                 if(isclassdatapackload):
                     cmd = f"sfdx force:data:soql:query -u {self.accesstoken} -q \"select id,vlocity_cmt__Status__c from vlocity_cmt__VlocityDataPack__c where Name='QBrixDeploy' and Id='{queueid}' ORDER BY CREATEDDATE DESC LIMIT 1\" --json"
                     
-                result = subprocess.run([cmd], shell=True, capture_output=True)
+                result = subprocess.run([cmd], shell=True, capture_output=True, env=self.sfdx_env)
                 jsonresult = json.loads(result.stdout)
                 
                 if(isclassdatapackload):
@@ -178,7 +179,7 @@ class CMTDeployDefaultLayouts(SFDXBaseTask):
     def _is_classic_datapack(self):
         
         cmd = f"sfdx force:data:soql:query -u {self.accesstoken} -q \"SELECT  QualifiedApiName FROM EntityDefinition Where QualifiedApiName= 'OmniDataPack'\" --json"
-        result = subprocess.run([cmd], shell=True, capture_output=True)
+        result = subprocess.run([cmd], shell=True, capture_output=True, env=self.sfdx_env)
         jsonresult = json.loads(result.stdout)
         #if it does not exist - we are in classic loading.
         return int(jsonresult["result"]["totalSize"]) ==0
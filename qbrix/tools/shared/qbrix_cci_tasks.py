@@ -1,39 +1,310 @@
+import hashlib
+import json
 import os
 import shutil
 import subprocess
+import time
 from abc import ABC
 
+import yaml
+
 from cumulusci.core.utils import import_global
 from cumulusci.core.exceptions import TaskOptionsError
 from cumulusci.core.tasks import CURRENT_TASK, BaseTask
 from cumulusci.cli.runtime import CliRuntime
+from qbrix.tools.shared.qbrix_console_utils import init_logger
+
+log = init_logger()
+
+
+CCI_CACHE_STATE_FILE = os.path.join(".cci", "qbrix_cache_state.json")
+
+
+def _get_sources_fingerprint(project_file: str = "cumulusci.yml") -> str:
+    """
+    Generates a hash of the source and dependency definitions within the given project file. When these change, sources may have been added or removed so the cache has to be rebuilt from cold.
+
+    Args:
+        project_file (str): Relative File Path to the cumulusci.yml file
+
+    Returns:
+        str: sha1 hex digest of the sources and dependencies sections, or None if the file does not exist
+    """
+
+    if not os.path.exists(project_file):
+        return None
+
+    with open(project_file, "r") as f:
+        config = yaml.safe_load(f) or {}
+
+    fingerprint_data = {
+        "sources": config.get("sources"),
+        "dependencies": (config.get("project") or {}).get("dependencies"),
+    }
+
+    return hashlib.sha1(json.dumps(fingerprint_data, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+def get_cci_cache_snapshot(cci_project_cache_directory: str = ".cci/projects") -> dict:
+    """
+    Captures the cached commit folders for each project within the CCI projects Cache folder.
+
+    Args:
+        cci_project_cache_directory (str): Relative File Path to the CCI Projects Directory
+
+    Returns:
+        dict: Project name mapped to the set of cached commit folder names
+    """
+
+    snapshot = {}
+    if not os.path.isdir(cci_project_cache_directory):
+        return snapshot
+
+    for project_name in os.listdir(cci_project_cache_directory):
+        project_path = os.path.join(cci_project_cache_directory, project_name)
+        if os.path.isdir(project_path):
+            snapshot[project_name] = {d for d in os.listdir(project_path) if os.path.isdir(os.path.join(project_path, d))}
+
+    return snapshot
+
+
+def _save_cci_cache_state(fingerprint: str, flows: dict):
+    """ Records the fingerprint of the sources which were used to populate the CCI projects Cache folder, along with the cached commit folders each flow uses """
 
+    os.makedirs(os.path.dirname(CCI_CACHE_STATE_FILE), exist_ok=True)
+    with open(CCI_CACHE_STATE_FILE, "w") as state_file:
+        json.dump({
+            "sources_fingerprint": fingerprint,
+            "flows": {flow_name: {project_name: sorted(commit_folders) for project_name, commit_folders in projects.items()} for flow_name, projects in flows.items()}
+        }, state_file, indent=2)
 
-def rebuild_cci_cache(cci_project_cache_directory: str = ".cci/projects") -> bool:
+
+def _load_cci_cache_state() -> dict:
+    """ Loads the last recorded state of the CCI projects Cache folder. Returns an empty dict if no state is found. """
+
+    if not os.path.exists(CCI_CACHE_STATE_FILE):
+        return {}
+
+    try:
+        with open(CCI_CACHE_STATE_FILE, "r") as state_file:
+            cache_state = json.load(state_file)
+    except Exception:
+        return {}
+
+    # Older state files hold a single flow name and no folder references, so no flow has recorded references yet
+    flows = cache_state.get("flows") if isinstance(cache_state.get("flows"), dict) else {}
+    cache_state["flows"] = {flow_name: {project_name: set(commit_folders) for project_name, commit_folders in projects.items()} for flow_name, projects in flows.items()}
+    return cache_state
+
+
+def _resolve_cci_sources(flow_name: str = "dev_org"):
+    """ Runs the given flow info command so CCI resolves and caches all sources which the flow requires """
+
+    try:
+        subprocess.run(["cci", "flow", "info", flow_name])
+    except Exception as e:
+        raise Exception(f"Failed to rebuild CCI cache. Error Message: {e}")
+
+
+def rebuild_cci_cache(cci_project_cache_directory: str = ".cci/projects", flow_name: str = "dev_org") -> bool:
     """
     Rebuilds the CCI projects Cache folder using the dev_org flow from CCI
 
     Args:
         cci_project_cache_directory (str): Relative File Path to the CCI Projects Directory
+        flow_name (str): The flow used to resolve the project sources. Defaults to dev_org
 
     Returns:
         bool: True when complete
     """
 
+    start_time = time.time()
+
     # Cleanup Current Directory
     if os.path.exists(cci_project_cache_directory):
         shutil.rmtree(cci_project_cache_directory)
 
     # Run dev_org flow to capture all requirements
-    try:
-        subprocess.run(["cci", "flow", "info", "dev_org"])
-    except Exception as e:
-        raise Exception(f"Failed to rebuild CCI cache. Error Message: {e}")
+    _resolve_cci_sources(flow_name)
+    _save_cci_cache_state(_get_sources_fingerprint(), {flow_name: get_cci_cache_snapshot(cci_project_cache_directory)})
+
+    log.info(f"CCI Cache: Cold rebuild completed in {time.time() - start_time:.2f} seconds")
 
     # Return True to confirm completion
     return True
 
 
+def refresh_cci_cache(cci_project_cache_directory: str = ".cci/projects", flow_name: str = "dev_org") -> bool:
+    """
+    Incrementally refreshes the CCI projects Cache folder. CCI caches each source by commit, so only sources which now resolve to a new commit are downloaded and the older commit folders for those sources are removed. Unchanged sources are reused as they are. A cold rebuild is run when there is no cache yet or when the sources defined in cumulusci.yml have changed.
+
+    The cache state records the commit folders used by each flow, so callers can switch between flows without a rebuild and a folder still used by another flow is never removed.
+
+    Args:
+        cci_project_cache_directory (str): Relative File Path to the CCI Projects Directory
+        flow_name (str): The flow used to resolve the project sources. Defaults to dev_org
+
+    Returns:
+        bool: True when complete
+    """
+
+    fingerprint = _get_sources_fingerprint()
+    cache_state = _load_cci_cache_state()
+
+    if not os.path.isdir(cci_project_cache_directory) or not cache_state or cache_state.get("sources_fingerprint") != fingerprint:
+        log.info("CCI Cache: No reusable cache found or project sources have changed. Running full rebuild.")
+        return rebuild_cci_cache(cci_project_cache_directory, flow_name)
+
+    start_time = time.time()
+    flows = cache_state["flows"]
+    flow_folders = flows.get(flow_name, {})
+
+    # Resolve sources against the existing cache, CCI will only download commits which are not already cached
+    cache_before = get_cci_cache_snapshot(cci_project_cache_directory)
+    _resolve_cci_sources(flow_name)
+    cache_after = get_cci_cache_snapshot(cci_project_cache_directory)
+
+    updated_projects = []
+    new_flow_folders = {}
+    for project_name, commit_folders in cache_after.items():
+        new_commit_folders = commit_folders - cache_before.get(project_name, set())
+        if not new_commit_folders:
+            # Nothing was downloaded, so the flow still uses the folders recorded for it. When none are recorded, every cached folder is kept as possibly in use.
+            new_flow_folders[project_name] = (flow_folders.get(project_name, set()) & commit_folders) or set(commit_folders)
+            continue
+
+        updated_projects.append(project_name)
+        new_flow_folders[project_name] = new_commit_folders
+
+        # Remove superseded commits so only the latest resolved version of the source remains, unless another flow still uses them
+        other_flow_folders = set()
+        for other_flow_name, other_projects in flows.items():
+            if other_flow_name != flow_name:
+                other_flow_folders |= other_projects.get(project_name, set())
+
+        for stale_commit_folder in commit_folders - new_commit_folders - other_flow_folders:
+            shutil.rmtree(os.path.join(cci_project_cache_directory, project_name, stale_commit_folder), ignore_errors=True)
+
+    flows[flow_name] = new_flow_folders
+    _save_cci_cache_state(fingerprint, flows)
+
+    log.info(f"CCI Cache: Incremental refresh for {flow_name} completed in {time.time() - start_time:.2f} seconds. Updated {len(updated_projects)} of {len(cache_after)} cached source(s){': ' + ', '.join(sorted(updated_projects)) if updated_projects else ''}")
+
+    # Return True to confirm completion
+    return True
+
+
+_CCI_RUNTIME_CACHE = {}
+CCI_KEYCHAIN_FILE_SUFFIXES = (".org", ".service")
+CCI_KEYCHAIN_FILE_NAMES = ("DEFAULT_ORG.txt", "DEFAULT_SERVICES.json")
+
+
+def _get_keychain_fingerprint(keychain_directory: str = None) -> tuple:
+    """
+    Generates a fingerprint of the org and service files held in the CCI keychain folders. These change when orgs are added, removed, re-authorised or the default org changes.
+
+    Args:
+        keychain_directory (str): Path to the CCI config folder. Defaults to ~/.cumulusci
+
+    Returns:
+        tuple: Sorted tuple of the path and modified time of each keychain file
+    """
+
+    if keychain_directory is None:
+        keychain_directory = os.path.join(os.path.expanduser("~"), ".cumulusci")
+
+    keychain_files = []
+    # Global orgs sit at the top level, project orgs one folder down and services two folders down in services/<type>
+    for subdir, dirs, files in os.walk(keychain_directory):
+        relative_path = os.path.relpath(subdir, keychain_directory)
+        depth = 0 if relative_path == "." else relative_path.count(os.sep) + 1
+        if depth >= 2:
+            dirs[:] = []
+        for file_name in files:
+            if file_name.endswith(CCI_KEYCHAIN_FILE_SUFFIXES) or file_name in CCI_KEYCHAIN_FILE_NAMES:
+                file_path = os.path.join(subdir, file_name)
+                try:
+                    keychain_files.append((file_path, os.stat(file_path).st_mtime_ns))
+                except OSError:
+                    continue
+
+    return tuple(sorted(keychain_files))
+
+
+def _get_runtime_fingerprint(project_file: str = "cumulusci.yml") -> tuple:
+    """
+    Generates a fingerprint of the current project configuration and keychain, used to invalidate the cached CCI runtime when either changes.
+
+    Args:
+        project_file (str): Relative File Path to the cumulusci.yml file
+
+    Returns:
+        tuple: Working directory, the modified time and size of the project file and the keychain fingerprint
+    """
+
+    try:
+        project_stat = os.stat(project_file)
+        return os.getcwd(), project_stat.st_mtime_ns, project_stat.st_size, _get_keychain_fingerprint()
+    except OSError:
+        return os.getcwd(), None, None, _get_keychain_fingerprint()
+
+
+def get_cci_runtime() -> CliRuntime:
+    """
+    Returns a CCI runtime which is shared across calls within the current process. The runtime is rebuilt when the project configuration or the keychain org and service files change.
+
+    Returns:
+        CliRuntime: The shared CCI runtime for the current project
+    """
+
+    fingerprint = _get_runtime_fingerprint()
+    cached_runtime = _CCI_RUNTIME_CACHE.get("runtime")
+
+    if cached_runtime is None or _CCI_RUNTIME_CACHE.get("fingerprint") != fingerprint:
+        start_time = time.time()
+        _CCI_RUNTIME_CACHE.clear()
+        _CCI_RUNTIME_CACHE["runtime"] = CliRuntime()
+        _CCI_RUNTIME_CACHE["fingerprint"] = fingerprint
+        _CCI_RUNTIME_CACHE["orgs"] = {}
+        log.debug(f"CCI Runtime: Loaded project configuration and keychain in {time.time() - start_time:.2f} seconds")
+
+    return _CCI_RUNTIME_CACHE["runtime"]
+
+
+def get_cci_org_config(org_name: str = None):
+    """
+    Returns the org config for the given org alias from the shared CCI runtime. The org config is cached alongside the runtime. When the lookup fails, the runtime is reloaded and the lookup is tried once more, in case the keychain changed since it was loaded.
+
+    Args:
+        org_name (str): The optional alias for the org, this defaults to "dev"
+
+    Returns:
+        OrgConfig: The org config for the given alias
+    """
+
+    if not org_name:
+        org_name = "dev"
+
+    runtime = get_cci_runtime()
+    org_cache = _CCI_RUNTIME_CACHE["orgs"]
+    if org_name not in org_cache:
+        try:
+            org_cache[org_name] = runtime.project_config.keychain.get_org(org_name)
+        except Exception:
+            clear_cci_runtime_cache()
+            runtime = get_cci_runtime()
+            org_cache = _CCI_RUNTIME_CACHE["orgs"]
+            org_cache[org_name] = runtime.project_config.keychain.get_org(org_name)
+
+    return org_cache[org_name]
+
+
+def clear_cci_runtime_cache():
+    """ Clears the shared CCI runtime, so the next call reloads the project configuration, keychain and org config """
+
+    _CCI_RUNTIME_CACHE.clear()
+
+
 def _parse_task_options(options, task_class, task_config):
     """
     Task Option Parser
@@ -80,17 +351,19 @@ def run_cci_task(task_name: str, org_name: str = None, **options) -> bool:
     if not org_name:
         org_name = "dev"
 
+    runtime = get_cci_runtime()
+
     if getattr(CURRENT_TASK, "stack", None) and CURRENT_TASK.stack[0].project_config:
         _project_config = CURRENT_TASK.stack[0].project_config
     else:
-        _project_config = CliRuntime().project_config
+        _project_config = runtime.project_config
 
     if getattr(CURRENT_TASK, "stack", None) and CURRENT_TASK.stack[0].org_config:
         _org = CURRENT_TASK.stack[0].org_config
     else:
-        _org = CliRuntime().project_config.keychain.get_org(org_name)
+        _org = get_cci_org_config(org_name)
 
-    task_config = CliRuntime().project_config.get_task(task_name)
+    task_config = runtime.project_config.get_task(task_name)
     task_class = import_global(task_config.class_path)
     task_config = _parse_task_options(options, task_class, task_config)
     task = task_class(
@@ -124,8 +397,8 @@ def run_cci_flow(flow_name: str, org_name: str = None, **options) -> bool:
     if not org_name:
         org_name = "dev"
 
-    org_config = CliRuntime().project_config.keychain.get_org(org_name)
-    flow_coordinator = CliRuntime().get_flow(flow_name, options=options)
+    org_config = get_cci_org_config(org_name)
+    flow_coordinator = get_cci_runtime().get_flow(flow_name, options=options)
 
     try:
         flow_coordinator.run(org_config)
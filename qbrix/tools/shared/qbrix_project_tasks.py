@@ -1,6 +1,7 @@
 import datetime
 import filecmp
 import glob
+import hashlib
 import json
 import os
 import re
@@ -8,24 +9,96 @@ import shutil
 import subprocess
 import yaml
 import xml
-from io import BytesIO
 from os.path import exists
 import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
 from typing import Optional
-from urllib.request import urlopen
-from zipfile import ZipFile
+import zlib
+from urllib.error import HTTPError
+from urllib.request import Request, urlopen
+from zipfile import BadZipFile, ZipFile
 import xml.etree.ElementTree as ET
 from xml.dom import minidom
 
 from qbrix.tools.shared.qbrix_json_tasks import update_json_file_value, get_json_file_value, remove_json_entry
 from qbrix.tools.shared.qbrix_console_utils import init_logger
-from qbrix.tools.utils.qbrix_fart import FART
-from qbrix.tools.shared.qbrix_cci_tasks import rebuild_cci_cache
+from qbrix.tools.utils.qbrix_fart import fart_files
+from qbrix.tools.shared.qbrix_cci_tasks import refresh_cci_cache, get_cci_cache_snapshot
 from qbrix.tools.shared.qbrix_shared_checks import is_github_url
 
 log = init_logger()
 
 DEFAULT_UPDATE_LOCATION = "https://qbrix-core.herokuapp.com/qbrix/q_update_package.zip"
+STACK_INDEX_FILE = os.path.join(".cci", "qbrix_stack_index.json")
+API_VERSION_CACHE_FILE = os.path.join(".qbrix", "api_version_cache.json")
+DOWNLOAD_CACHE_DIR = os.path.join(".qbrix", "downloads")
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+
+# Permission Set entry types, mapped to the child tag which holds the name of the component each entry grants access to
+PERMISSION_SET_ENTRY_NAME_TAGS = {
+    "objectPermissions": "object",
+    "fieldPermissions": "field",
+    "recordTypeVisibilities": "recordType",
+    "classAccesses": "apexClass",
+    "apexPageAccess": "apexPage",
+    "tabSettings": "tab",
+    "applicationVisibilities": "application",
+    "customMetadataTypeAccesses": "name",
+    "customPermissions": "name",
+    "customSettingAccesses": "name",
+    "externalDataSourceAccesses": "externalDataSource",
+    "flowAccesses": "flow",
+    "userPermissions": "name"
+}
+
+
+def build_project_inventory(root="."):
+    """
+    Walks the project folder once and indexes every file by the directory which holds it. Hidden directories (e.g. .git, .cci and .sfdx) are skipped, in the same way as glob patterns skip them.
+
+    Args:
+        root (str): Folder to index. Defaults to the current directory, which is the project root
+
+    Returns:
+        dict: Directory path (relative to the current directory) mapped to the list of file names within it
+    """
+
+    inventory = {}
+    for subdir, dirs, files in os.walk(root):
+        dirs[:] = [d for d in dirs if not d.startswith(".")]
+        inventory[os.path.normpath(subdir)] = [f for f in files if not f.startswith(".")]
+    return inventory
+
+
+def get_inventory_files(inventory, directory, suffix=""):
+    """
+    Returns the files held in a project inventory at or below the given directory, matching the given suffix.
+
+    Args:
+        inventory (dict): Project inventory, see build_project_inventory
+        directory (str): Relative directory path e.g. force-app/main/default/classes
+        suffix (str): File name suffix to match e.g. .cls-meta.xml
+
+    Returns:
+        list(str): Relative file paths
+    """
+
+    directory = os.path.normpath(directory)
+    prefix = directory + os.sep
+    file_list = []
+    for subdir, files in inventory.items():
+        if subdir == directory or subdir.startswith(prefix):
+            file_list += [os.path.join(subdir, f) for f in files if f.endswith(suffix)]
+    return file_list
+
+
+def remove_inventory_file(inventory, file_path):
+    """ Removes a deleted file from a project inventory """
+
+    files = inventory.get(os.path.dirname(os.path.normpath(file_path)))
+    if files and os.path.basename(file_path) in files:
+        files.remove(os.path.basename(file_path))
 
 
 def replace_file_text(file_location, search_string, replacement_string, show_info=False, number_of_replacements=-1):
@@ -94,6 +167,45 @@ def get_qbrix_repo_url() -> str:
     return repo_url
 
 
+_feature_set_cache = {}
+_missing_feature_cache = {}
+
+
+def get_feature_prefix(feature):
+    """ Returns the part of a scratch org feature before any : e.g. multicurrency for MultiCurrency:2, which is used to match features with a value """
+
+    return feature.split(":")[0]
+
+
+def load_feature_set(file_location):
+    """
+    Loads the features from a scratch org json file. Files are parsed once and cached by the hash of their content, so the same definition shared by many projects in a stack is only parsed once.
+
+    Args:
+        file_location (str): Relative path to the scratch org json file
+
+    Returns:
+        dict: The content hash, the lower case feature list (None if the file has no features entry), and sets of the features and of their prefixes
+    """
+
+    with open(file_location, "rb") as json_file:
+        contents = json_file.read()
+
+    file_hash = hashlib.sha1(contents).hexdigest()
+    if file_hash not in _feature_set_cache:
+        features = json.loads(contents).get('features')
+        if features is not None:
+            features = [x.lower() for x in features]
+        _feature_set_cache[file_hash] = {
+            "hash": file_hash,
+            "features": features,
+            "feature_set": frozenset(features or []),
+            "prefix_set": frozenset(get_feature_prefix(x) for x in features or [])
+        }
+
+    return _feature_set_cache[file_hash]
+
+
 def advanced_feature_match(check_value, list_value):
     """Checks for a given scratch org feature containing a : within a list of scratch org features. If the feature already exists, this return True
     otherwise False is returned.
@@ -215,13 +327,13 @@ def update_org_file_features(file_location, missing_features, auto: Optional[boo
 
             # De-Duplicate Feature Lists and Append to Clean List
             clean_feature_list = []
-            for current_feature in current_features:
-                if (":" not in current_feature and not current_feature.lower() in clean_feature_list) or (":" in current_feature and not advanced_feature_match(current_feature.lower(), clean_feature_list)):
-                    clean_feature_list.append(current_feature.lower())
-
-            for missing_feature in missing_features:
-                if (":" not in missing_feature and not missing_feature.lower() in clean_feature_list) or (":" in missing_feature and not advanced_feature_match(missing_feature.lower(), clean_feature_list)):
-                    clean_feature_list.append(missing_feature.lower())
+            clean_feature_set = set()
+            clean_prefix_set = set()
+            for feature in current_features + [x.lower() for x in missing_features]:
+                if (":" not in feature and feature not in clean_feature_set) or (":" in feature and get_feature_prefix(feature) not in clean_prefix_set):
+                    clean_feature_list.append(feature)
+                    clean_feature_set.add(feature)
+                    clean_prefix_set.add(get_feature_prefix(feature))
 
             clean_feature_list.sort()
 
@@ -259,52 +371,30 @@ def find_missing_features(main_features_file, check_features_file):
 
     log.info(f"Feature Check: Comparing {main_features_file} to {check_features_file}")
 
-    # Init Missing Features List
-    missing_features = []
-
     try:
         # Load Main File
-        with open(main_features_file) as main_json_file:
-            main_json_file_data = json.load(main_json_file)
-
-        if not main_json_file_data['features']:
-            raise Exception(f"[ERROR] No features found in file: {main_json_file}. Check the file and try again.")
-
-        main_comparison_list = main_json_file_data['features']
-        main_comparison_list = [x.lower() for x in main_comparison_list]
+        main_feature_set = load_feature_set(main_features_file)
+        if not main_feature_set["features"]:
+            raise Exception(f"[ERROR] No features found in file: {main_features_file}. Check the file and try again.")
 
         # Load Comparison File
-        with open(check_features_file) as check_json_file:
-            check_json_file_data = json.load(check_json_file)
-
-        if check_json_file_data['features'] is None:
-            raise Exception(f"[ERROR] No features found in file: {check_json_file}. Check the file and try again.")
-
-        check_comparison_list = check_json_file_data['features']
-        check_comparison_list = [x.lower() for x in check_comparison_list]
-
-        # Compare both lists and populate missing list
-        missing_feature_count = 0
-        for missing_feature in check_comparison_list:
-            add_feature = False
-
-            # Separate out features which contain a :
-            if ":" in missing_feature:
-                if not advanced_feature_match(missing_feature.lower(), main_comparison_list):
-                    add_feature = True
-            else:
-                if not missing_feature.lower() in main_comparison_list:
-                    add_feature = True
-
-            if add_feature:
-                missing_features.append(missing_feature.lower())
-                missing_feature_count += 1
+        check_feature_set = load_feature_set(check_features_file)
+        if check_feature_set["features"] is None:
+            raise Exception(f"[ERROR] No features found in file: {check_features_file}. Check the file and try again.")
+
+        # Compare both lists and populate missing list. Features which contain a : are matched on the part before the :
+        comparison_key = (main_feature_set["hash"], check_feature_set["hash"])
+        if comparison_key not in _missing_feature_cache:
+            _missing_feature_cache[comparison_key] = sorted(
+                feature for feature in check_feature_set["features"]
+                if (":" in feature and get_feature_prefix(feature) not in main_feature_set["prefix_set"]) or (":" not in feature and feature not in main_feature_set["feature_set"])
+            )
+        missing_features = list(_missing_feature_cache[comparison_key])
 
         if len(missing_features) == 0:
             log.info(f"[OK] There are no missing features found when comparing to file: {check_features_file}")
         else:
-            log.info(f"{missing_feature_count} missing feature(s) found, when comparing to file: {check_features_file}")
-            missing_features.sort()
+            log.info(f"{len(missing_features)} missing feature(s) found, when comparing to file: {check_features_file}")
 
         return missing_features
 
@@ -329,9 +419,19 @@ def check_org_config_files(auto=False):
     if not os.path.exists("orgs/dev_preview.json"):
         raise Exception(f"The provided file path for the dev scratch org definition file, located at (orgs/dev_preview.json), does not exist.")
 
+    # Load each file once
+    scratch_config_data = {}
+    for scratch_config_file in ('orgs/dev.json', 'orgs/dev_preview.json'):
+        try:
+            with open(scratch_config_file) as json_file:
+                scratch_config_data[scratch_config_file] = json.load(json_file)
+        except Exception as e:
+            log.error(f"Failed to read json file value. Error: {e}")
+            scratch_config_data[scratch_config_file] = {}
+
     for scratch_config_file in ('orgs/dev.json', 'orgs/dev_preview.json'):
         # Check for "Enterprise" or "Partner Enterprise" edition in scratch org definition
-        current_edition = get_json_file_value(scratch_config_file, "edition")
+        current_edition = scratch_config_data[scratch_config_file].get("edition")
 
         if current_edition and "enterprise" not in current_edition.lower():
             log.info(f"Scratch Org File Check: [FAIL] Your {scratch_config_file} file is not set to Enterprise edition.")
@@ -344,7 +444,7 @@ def check_org_config_files(auto=False):
                 update_json_file_value('orgs/dev.json', 'edition', 'Enterprise')
                 log.info(f"Scratch Org File Check: Updated {scratch_config_file} to use Enterprise Edition")
 
-    instance = get_json_file_value("orgs/dev_preview.json", "instance") or ""
+    instance = scratch_config_data["orgs/dev_preview.json"].get("instance") or ""
     if "na135" not in instance.lower():
         log.error(
             "Scratch Org File Check: [FAIL] Your org/dev_preview.json file is not set to the NA135 Instance.")
@@ -391,8 +491,8 @@ def source_org_feature_checker(skip_rebuild=False, auto=False):
 
     # Prepare Project File
     if not skip_rebuild:
-        clean_project_files()
-        rebuild_cci_cache()
+        clean_project_files(include_cci_cache=False)
+        refresh_cci_cache()
     else:
         log.info("Cache Rebuild Skipped")
 
@@ -400,11 +500,13 @@ def source_org_feature_checker(skip_rebuild=False, auto=False):
     dev_files = glob.glob(".cci/projects" + "/**/dev.json", recursive=True)
 
     # Check for missing features and add them to dev.json
+    start_time = time.time()
     main_missing_feature_list = []
     for feature_check_file in dev_files:
         missing_feature_list = find_missing_features("orgs/dev.json", feature_check_file)
         if missing_feature_list is not None and len(missing_feature_list) > 0:
             main_missing_feature_list.extend(missing_feature_list)
+    log.info(f"Source Feature Check: Compared {len(dev_files)} file(s) in {time.time() - start_time:.2f} seconds")
     if len(main_missing_feature_list) > 0:
         main_missing_feature_list.sort()
         update_org_file_features("orgs/dev.json", main_missing_feature_list, auto)
@@ -438,15 +540,205 @@ def check_for_missing_files():
         log.error("[ERROR] Missing File: orgs/dev_preview.json")
 
 
-def download_and_unzip(url: Optional[str] = DEFAULT_UPDATE_LOCATION, archive_password: Optional[str] = None, ignore_optional_updates: Optional[bool] = False, q_update: Optional[bool] = False) -> bool:
+def _hash_file(file_path, file_hash):
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(DOWNLOAD_CHUNK_SIZE), b""):
+            file_hash.update(chunk)
+    return file_hash
+
+
+def _load_download_state(state_file):
+    if not os.path.isfile(state_file):
+        return {}
+    try:
+        with open(state_file, "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def download_file(url, checksum=None, download_dir=DOWNLOAD_CACHE_DIR):
+    """
+    Streams a file to disk in chunks. An interrupted download is resumed with an HTTP range request, and a completed download is kept and only fetched again when the server reports that it has changed.
+
+    Args:
+        url (str): The URL of the file
+        checksum (str): Optional SHA256 hex digest the downloaded file must match
+        download_dir (str): Folder used to hold downloads. Defaults to .qbrix/downloads
+
+    Returns:
+        tuple: Path to the downloaded file and the number of bytes received
+    """
+
+    os.makedirs(download_dir, exist_ok=True)
+    file_key = hashlib.sha1(url.encode("utf-8")).hexdigest()
+    file_path = os.path.join(download_dir, f"{file_key}.download")
+    part_path = f"{file_path}.part"
+    state_file = f"{file_path}.json"
+
+    state = _load_download_state(state_file)
+    validator = state.get("etag") or state.get("last_modified")
+
+    headers = {}
+    resume_from = 0
+    if os.path.isfile(file_path) and validator:
+        # Revalidate the completed download
+        if state.get("etag"):
+            headers["If-None-Match"] = state["etag"]
+        else:
+            headers["If-Modified-Since"] = state["last_modified"]
+    elif os.path.isfile(part_path) and validator:
+        # Resume the partial download, the server sends the whole file again if it has changed
+        resume_from = os.path.getsize(part_path)
+        headers["Range"] = f"bytes={resume_from}-"
+        headers["If-Range"] = validator
+
+    bytes_received = 0
+    try:
+        response = urlopen(Request(url, headers=headers))
+    except HTTPError as e:
+        if e.code == 304:
+            log.info("Download: Using the existing download as it has not changed")
+            response = None
+        elif e.code == 416:
+            # The saved range is no longer valid, so start again
+            os.remove(part_path)
+            return download_file(url, checksum, download_dir)
+        else:
+            raise
+
+    if response is not None:
+        with response:
+            if response.status != 206:
+                resume_from = 0
+
+            if os.path.isfile(file_path):
+                os.remove(file_path)
+
+            with open(state_file, "w") as f:
+                json.dump({"url": url, "etag": response.headers.get("ETag"), "last_modified": response.headers.get("Last-Modified")}, f)
+
+            expected_length = response.headers.get("Content-Length")
+            with open(part_path, "ab" if resume_from else "wb") as part_file:
+                for chunk in iter(lambda: response.read(DOWNLOAD_CHUNK_SIZE), b""):
+                    part_file.write(chunk)
+                    bytes_received += len(chunk)
+
+        # A dropped connection ends the stream early without an error, so check the full file was received. The partial file is kept so the next run can resume it
+        if expected_length is not None and bytes_received < int(expected_length):
+            raise Exception(f"Download interrupted after {resume_from + bytes_received} bytes. Run the update again to resume the download.")
+
+        if resume_from:
+            log.info(f"Download: Resumed from {resume_from} bytes")
+        os.replace(part_path, file_path)
+
+    if checksum:
+        file_checksum = _hash_file(file_path, hashlib.sha256()).hexdigest()
+        if file_checksum.lower() != checksum.lower():
+            os.remove(file_path)
+            raise Exception(f"Downloaded file checksum {file_checksum} does not match the expected checksum {checksum}")
+
+    return file_path, bytes_received
+
+
+def _get_archive_target_path(extract_path, member_name):
+    # Drops absolute and parent directory parts, in the same way as ZipFile.extractall
+    parts = [p for p in member_name.replace("\\", "/").split("/") if p not in ("", ".", "..")]
+    if not parts:
+        return None
+    return os.path.join(extract_path, *parts)
+
+
+def _is_archive_member_unchanged(member, target_path):
+    if not os.path.isfile(target_path) or os.path.getsize(target_path) != member.file_size:
+        return False
+    crc = 0
+    with open(target_path, "rb") as f:
+        for chunk in iter(lambda: f.read(DOWNLOAD_CHUNK_SIZE), b""):
+            crc = zlib.crc32(chunk, crc)
+    return crc == member.CRC
+
+
+def _get_umask():
+    umask = os.umask(0)
+    os.umask(umask)
+    return umask
+
+
+def extract_changed_files(archive, extract_path, mirror=False):
     """
-    Downloads a .zip file and extracts all contents to the root project directory in the same structure they are within the zip file.
+    Extracts the files from a zip archive whose size or CRC differ from the file already at the target location. Each file is written to a temporary file and moved into place.
+
+    Args:
+        archive (ZipFile): Open zip archive
+        extract_path (str): Folder to extract to
+        mirror (bool): When True, files within the top level folders of the archive which are not in the archive are removed. Only use for folders which hold nothing but the extracted archive
+
+    Returns:
+        dict: Counts of the files extracted, unchanged and removed and the number of bytes written
+    """
+
+    results = {"extracted": 0, "unchanged": 0, "removed": 0, "bytes_written": 0}
+    archive_files = set()
+    top_level_folders = set()
+    file_mode = 0o666 & ~_get_umask()
+
+    for member in archive.infolist():
+        target_path = _get_archive_target_path(extract_path, member.filename)
+        if target_path is None:
+            continue
+
+        relative_parts = os.path.relpath(target_path, extract_path).split(os.sep)
+        if len(relative_parts) > 1 or member.is_dir():
+            top_level_folders.add(os.path.join(extract_path, relative_parts[0]))
+
+        if member.is_dir():
+            os.makedirs(target_path, exist_ok=True)
+            continue
+
+        archive_files.add(os.path.normpath(target_path))
+        if _is_archive_member_unchanged(member, target_path):
+            results["unchanged"] += 1
+            continue
+
+        target_dir = os.path.dirname(target_path)
+        os.makedirs(target_dir, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=target_dir, prefix=f".{os.path.basename(target_path)}.", suffix=".tmp")
+        try:
+            with archive.open(member) as source, os.fdopen(fd, "wb") as target:
+                shutil.copyfileobj(source, target, DOWNLOAD_CHUNK_SIZE)
+            os.chmod(temp_path, file_mode)
+            os.replace(temp_path, target_path)
+        except Exception:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+        results["extracted"] += 1
+        results["bytes_written"] += member.file_size
+
+    if mirror:
+        for folder in top_level_folders:
+            for root, dirs, files in os.walk(folder):
+                for file_name in files:
+                    file_path = os.path.normpath(os.path.join(root, file_name))
+                    if file_path not in archive_files:
+                        os.remove(file_path)
+                        results["removed"] += 1
+
+    return results
+
+
+def download_and_unzip(url: Optional[str] = DEFAULT_UPDATE_LOCATION, archive_password: Optional[str] = None, ignore_optional_updates: Optional[bool] = False, q_update: Optional[bool] = False, checksum: Optional[str] = None) -> bool:
+    """
+    Downloads a .zip file and extracts all contents to the root project directory in the same structure they are within the zip file. The download is streamed to disk and can be resumed, and only files which differ from those already in place are written.
 
     Args:
         url (str): The URL where the .zip file is located. Note that this must be publicly accessible. If none is specified it will default to the QBrix Update Location
         archive_password (str): Optional password for the .zip file
         ignore_optional_updates (bool): Set to True to ignore anything flagged as optional. Applies only to the Q Brix Updates. Defaults to False
         q_update (bool): This is set to True to generate additional folders in the project directory when a Q Brix update is running. Defaults to False
+        checksum (str): Optional SHA256 checksum the downloaded .zip file must match
 
     Returns:
         bool: Returns True when the process has completed and False if there has been an issue.
@@ -454,34 +746,38 @@ def download_and_unzip(url: Optional[str] = DEFAULT_UPDATE_LOCATION, archive_pas
     """
 
     try:
-        zipfile = ZipFile(BytesIO(urlopen(url).read()))
+        start_time = time.time()
+        archive_path, bytes_received = download_file(url, checksum)
+        download_time = time.time() - start_time
+
+        try:
+            zipfile = ZipFile(archive_path)
+        except BadZipFile:
+            # Remove the download so it is fetched again next time
+            os.remove(archive_path)
+            raise
 
-        # Set Password if given
-        if archive_password:
-            zipfile.setpassword(pwd=bytes(archive_password, 'utf-8'))
+        with zipfile:
 
-        # Set Extraction Path
-        extract_path = "."
+            # Set Password if given
+            if archive_password:
+                zipfile.setpassword(pwd=bytes(archive_password, 'utf-8'))
 
-        # When Q Brix Update, Ensure all paths are created and clear old download
-        if q_update:
+            # Set Extraction Path
+            extract_path = "."
 
-            extract_path = os.path.join(".qbrix", "Update")
+            # When Q Brix Update, Ensure all paths are created. The previous download is kept so only changed files are extracted, with files removed from the update cleared out
+            if q_update:
 
-            if not exists(extract_path):
-                os.makedirs(name=extract_path, exist_ok=True)
+                extract_path = os.path.join(".qbrix", "Update")
 
-            if exists(os.path.join(".qbrix", "Update", "xDO-Template-main")):
-                shutil.rmtree(os.path.join(".qbrix", "Update", "xDO-Template-main"))
+                if not exists(extract_path):
+                    os.makedirs(name=extract_path, exist_ok=True)
 
-        # Ensure Extract Paths
-        dir_check_list = [x for x in zipfile.namelist() if x.endswith('/')]
-        for d in dir_check_list:
-            if not exists(os.path.join(extract_path, d)):
-                os.makedirs(name=os.path.join(extract_path, d), exist_ok=True)
+            # Extract Files
+            results = extract_changed_files(zipfile, extract_path, mirror=q_update)
 
-        # Extract Files
-        zipfile.extractall(path=extract_path)
+        log.info(f"Update: Downloaded {bytes_received} bytes in {download_time:.2f} seconds. Extracted {results['extracted']} changed file(s) ({results['bytes_written']} bytes written), {results['unchanged']} unchanged, {results['removed']} removed. Completed in {time.time() - start_time:.2f} seconds")
 
         # Clean Up
         dirs = glob.glob(".qbrix/Update/**/__pycache__/", recursive=True)
@@ -505,56 +801,67 @@ def download_and_unzip(url: Optional[str] = DEFAULT_UPDATE_LOCATION, archive_pas
 
 def check_and_update_old_class_refs():
     """
-    Scans the cumulusci.yml file and ensures that any old class references have been updated to the new locations.
+    Scans the cumulusci.yml file and ensures that any old class references have been updated to the new locations. The file is read once and only written when a reference has changed.
     """
 
-    # Health Check
-    replace_file_text("cumulusci.yml", "tasks.custom.qbrix_utils.HealthChecker", "qbrix.tools.utils.qbrix_health_check.HealthChecker")
-
-    # Q Brix Update
-    replace_file_text("cumulusci.yml", "tasks.custom.qbrix_utils.QBrixUpdater", "qbrix.tools.utils.qbrix_update.QBrixUpdater")
-
-    # FART
-    replace_file_text("cumulusci.yml", "tasks.custom.fart.FART", "qbrix.tools.utils.qbrix_fart.FART")
-
-    # Batch Apex
-    replace_file_text("cumulusci.yml", "tasks.custom.batchanonymousapex.BatchAnonymousApex", "qbrix.tools.utils.qbrix_batch_apex.BatchAnonymousApex")
-
-    # Org Generator
-    replace_file_text("cumulusci.yml", "tasks.custom.orggenerator.Spin", "qbrix.tools.utils.qbrix_org_generator.Spin")
-
-    # Init Project
-    replace_file_text("cumulusci.yml", "tasks.custom.qbrix_utils.Initialise_Project", "qbrix.tools.utils.qbrix_project_setup.InitProject")
-    replace_file_text("cumulusci.yml", "tasks.custom.qbrix_utils.InitProject", "qbrix.tools.utils.qbrix_project_setup.InitProject")
-
-    # List Q Brix
-    replace_file_text("cumulusci.yml", "tasks.custom.qbrix_sf.ListQBrix", "qbrix.salesforce.qbrix_salesforce_tasks.ListQBrix")
+    class_refs = [
+        # Health Check
+        ("tasks.custom.qbrix_utils.HealthChecker", "qbrix.tools.utils.qbrix_health_check.HealthChecker"),
+        # Q Brix Update
+        ("tasks.custom.qbrix_utils.QBrixUpdater", "qbrix.tools.utils.qbrix_update.QBrixUpdater"),
+        # FART
+        ("tasks.custom.fart.FART", "qbrix.tools.utils.qbrix_fart.FART"),
+        # Batch Apex
+        ("tasks.custom.batchanonymousapex.BatchAnonymousApex", "qbrix.tools.utils.qbrix_batch_apex.BatchAnonymousApex"),
+        # Org Generator
+        ("tasks.custom.orggenerator.Spin", "qbrix.tools.utils.qbrix_org_generator.Spin"),
+        # Init Project
+        ("tasks.custom.qbrix_utils.Initialise_Project", "qbrix.tools.utils.qbrix_project_setup.InitProject"),
+        ("tasks.custom.qbrix_utils.InitProject", "qbrix.tools.utils.qbrix_project_setup.InitProject"),
+        # List Q Brix
+        ("tasks.custom.qbrix_sf.ListQBrix", "qbrix.salesforce.qbrix_salesforce_tasks.ListQBrix"),
+        # Banner
+        ("tasks.custom.announce.CreateBanner", "qbrix.tools.shared.qbrix_console_utils.CreateBanner"),
+        # Mass File Ops
+        ("tasks.custom.qbrix_utils.MassFileOps", "qbrix.tools.utils.qbrix_mass_ops.MassFileOps"),
+        # SFDMU
+        ("tasks.custom.sfdmuload.SFDMULoad", "qbrix.tools.data.qbrix_sfdmu.SFDMULoad"),
+        # TESTIM
+        ("tasks.custom.testim.RunTestim", "qbrix.tools.testing.qbrix_testim.RunTestim"),
+    ]
 
-    # Banner
-    replace_file_text("cumulusci.yml", "tasks.custom.announce.CreateBanner", "qbrix.tools.shared.qbrix_console_utils.CreateBanner")
+    if not os.path.isfile("cumulusci.yml"):
+        raise Exception("Error: File Path does not exist or you do not have access to the given file path. Please check this file path and update as required: cumulusci.yml")
 
-    # Mass File Ops
-    replace_file_text("cumulusci.yml", "tasks.custom.qbrix_utils.MassFileOps", "qbrix.tools.utils.qbrix_mass_ops.MassFileOps")
+    with open("cumulusci.yml", "r") as config_file:
+        file_contents = config_file.read()
 
-    # SFDMU
-    replace_file_text("cumulusci.yml", "tasks.custom.sfdmuload.SFDMULoad", "qbrix.tools.data.qbrix_sfdmu.SFDMULoad")
+    updated_file_contents = file_contents
+    for old_ref, new_ref in class_refs:
+        updated_file_contents = updated_file_contents.replace(old_ref, new_ref)
 
-    # TESTIM
-    replace_file_text("cumulusci.yml", "tasks.custom.testim.RunTestim", "qbrix.tools.testing.qbrix_testim.RunTestim")
+    if updated_file_contents != file_contents:
+        with open("cumulusci.yml", "w") as config_file:
+            config_file.write(updated_file_contents)
 
 
-def clean_project_files():
+def clean_project_files(include_cci_cache=True):
     """
     Removes known directories and files from a Q Brix Project folder which can be safely removed.
+
+    Args:
+        include_cci_cache (bool): When True, the CCI projects cache folder is also removed. Set to False to keep the cache so it can be refreshed incrementally. Defaults to True
     """
 
     # Add Directory Paths to this list to have them removed by cleaner
     dirs_to_remove = [
-        ".cci/projects",
         "src",
         "browser"
     ]
 
+    if include_cci_cache:
+        dirs_to_remove.insert(0, ".cci/projects")
+
     # Add File Paths to this list to have them removed by cleaner
     files_to_remove = [
         "log.html",
@@ -573,23 +880,143 @@ def clean_project_files():
             check_and_delete_file(f)
 
 
-def delete_standard_fields():
+def delete_standard_fields(inventory=None):
     """
     Removes Core/Standard Fields from Project Source. These are fields which are often pulled down when a standard Object is changed, like Account. Only custom fields need to be stored in the project, so this cleans up the other fields.
+
+    Args:
+        inventory (dict): Optional project inventory to use instead of scanning the project folder, see build_project_inventory
     """
-    object_fields = glob.glob("force-app/main/default/objects/**/*.field-meta.xml", recursive=True)
+    if inventory is not None:
+        object_fields = get_inventory_files(inventory, "force-app/main/default/objects", ".field-meta.xml")
+    else:
+        object_fields = glob.glob("force-app/main/default/objects/**/*.field-meta.xml", recursive=True)
     if object_fields and len(object_fields) > 0:
         for of in object_fields:
             if not os.path.basename(of).endswith("__c.field-meta.xml"):
                 os.remove(of)
+                if inventory is not None:
+                    remove_inventory_file(inventory, of)
+
+
+def write_file_atomic(file_path, contents):
+    """
+    Replaces an existing file by writing a temporary file in the same folder and moving it into place, so the file is never left partly written.
+
+    Args:
+        file_path (str): Path to the existing file
+        contents (bytes): Contents to write
+    """
+
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(file_path) or ".", prefix=f".{os.path.basename(file_path)}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as temp_file:
+            temp_file.write(contents)
+        shutil.copymode(file_path, temp_path)
+        os.replace(temp_path, file_path)
+    except Exception:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+def _load_api_version_cache(cache_file):
+    if not os.path.isfile(cache_file):
+        return {}
+    try:
+        with open(cache_file, "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
 
 
-def update_file_api_versions(project_api_version) -> bool:
+def normalize_api_versions(project_api_version, file_tags, cache_file=API_VERSION_CACHE_FILE, max_workers=8):
+    """
+    Updates the API version held between the given tags in each file to the project API version. The size, modified time and content hash of every compliant file is remembered, so files which have not changed since the last run are skipped without being read. Files which already hold the version are never written, and only the mismatched version values are replaced, using atomic writes.
+
+    Args:
+        project_api_version (str): Target API Version e.g. 56.0
+        file_tags (dict): File path mapped to the (left tag, right tag) pair which holds the API version
+        cache_file (str): Relative path to the saved file hashes. Defaults to .qbrix/api_version_cache.json
+        max_workers (int): Maximum number of files processed at the same time. Defaults to 8
+
+    Returns:
+        list(str): File paths which were updated
+    """
+
+    start_time = time.time()
+    target_version = str(project_api_version)
+
+    saved_cache = _load_api_version_cache(cache_file)
+    saved_files = saved_cache.get("files", {}) if saved_cache.get("version") == target_version else {}
+
+    def process_file(file_path, file_stat):
+        left, right = (tag.encode("utf-8") for tag in file_tags[file_path])
+
+        with open(file_path, "rb") as f:
+            contents = f.read()
+
+        content_hash = hashlib.sha1(contents).hexdigest()
+        saved_entry = saved_files.get(file_path)
+        if saved_entry and saved_entry[2] == content_hash:
+            return file_path, [file_stat.st_mtime_ns, file_stat.st_size, content_hash], "unchanged"
+
+        updated_contents = contents
+        start_index = contents.find(left)
+        if start_index != -1:
+            start_index += len(left)
+            end_index = contents.find(right, start_index)
+            if end_index != -1 and contents[start_index:end_index] != target_version.encode("utf-8"):
+                updated_contents = contents.replace(left + contents[start_index:end_index] + right, left + target_version.encode("utf-8") + right)
+
+        if updated_contents == contents:
+            return file_path, [file_stat.st_mtime_ns, file_stat.st_size, content_hash], "compliant"
+
+        write_file_atomic(file_path, updated_contents)
+        file_stat = os.stat(file_path)
+        return file_path, [file_stat.st_mtime_ns, file_stat.st_size, hashlib.sha1(updated_contents).hexdigest()], "updated"
+
+    # Files with the same size and modified time as the last run are skipped without being read
+    results = []
+    files_to_read = []
+    for file_path in file_tags:
+        try:
+            file_stat = os.stat(file_path)
+        except OSError:
+            continue
+        saved_entry = saved_files.get(file_path)
+        if saved_entry and saved_entry[0] == file_stat.st_mtime_ns and saved_entry[1] == file_stat.st_size:
+            results.append((file_path, saved_entry, "unchanged"))
+        else:
+            files_to_read.append((file_path, file_stat))
+
+    if files_to_read:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            results += executor.map(lambda file: process_file(*file), files_to_read)
+
+    updated_files = [file_path for file_path, _, status in results if status == "updated"]
+    unchanged_files = sum(1 for _, _, status in results if status == "unchanged")
+
+    cache_files = {file_path: entry for file_path, entry, _ in results}
+    if cache_files != saved_files:
+        try:
+            os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+            with open(cache_file, "w") as f:
+                f.write(json.dumps({"version": target_version, "files": cache_files}))
+        except Exception as e:
+            log.debug(f"API Version Check: Unable to save file hashes. {e}")
+
+    log.info(f"API Version Check: Checked {len(results)} files ({unchanged_files} unchanged since the last run), updated {len(updated_files)} in {time.time() - start_time:.2f} seconds")
+    return updated_files
+
+
+def update_file_api_versions(project_api_version, inventory=None) -> bool:
     """
     Scans specific files in the project which specify their own API version and updates them to be the same as the provided version
 
     Args:
         project_api_version: Target API Version you want to update the files to. e.g. 56
+        inventory (dict): Optional project inventory to use instead of scanning the project folder, see build_project_inventory
 
     Returns:
         bool: Returns True when complete. False if there was an issue.
@@ -598,39 +1025,34 @@ def update_file_api_versions(project_api_version) -> bool:
     if not project_api_version:
         return False
 
-    # Init FART
-    second_wind = FART()
-
-    # File Locations To Check
-    file_pattern_locations = [
-        "force-app/main/default/classes/**/*.cls-meta.xml",
-        "force-app/main/default/aura/**/*.cmp-meta.xml",
-        "force-app/main/default/lwc/**/*.js-meta.xml",
-        "files/package.xml",
-        "sfdx-project.json"
-    ]
-
-    file_list = []
-    if file_pattern_locations and len(file_pattern_locations) > 0:
-        for pattern in file_pattern_locations:
-            file_list += glob.glob(pattern, recursive=True)
-
-        if len(file_list) > 0:
-            for f in file_list:
-                if not os.path.exists(f):
-                    continue
-
-                left_side = "<apiVersion>"
-                right_side = "</apiVersion>"
+    # File Locations To Check, along with the tags which hold the API version
+    file_pattern_locations = {
+        ("<apiVersion>", "</apiVersion>"): [
+            "force-app/main/default/classes/**/*.cls-meta.xml",
+            "force-app/main/default/aura/**/*.cmp-meta.xml",
+            "force-app/main/default/lwc/**/*.js-meta.xml",
+        ],
+        ("<version>", "</version>"): [
+            "files/package.xml",
+        ],
+        ("<sourceApiVersion>", "</sourceApiVersion>"): [
+            "sfdx-project.json",
+        ],
+    }
 
-                if f == "files/package.xml":
-                    left_side = "<version>"
-                    right_side = "</version>"
-                elif f == "sfdx-project.json":
-                    left_side = "<sourceApiVersion>"
-                    right_side = "</sourceApiVersion>"
+    file_tags = {}
+    for tags, patterns in file_pattern_locations.items():
+        for pattern in patterns:
+            if inventory is not None and "/**/*" in pattern:
+                directory, suffix = pattern.split("/**/*", 1)
+                file_list = get_inventory_files(inventory, directory, suffix)
+            else:
+                file_list = glob.glob(pattern, recursive=True)
+            for file_path in file_list:
+                file_tags.setdefault(file_path, tags)
 
-                second_wind.fartbetween(srcfile=f, left=left_side, right=right_side, replacewith=project_api_version, formatval=None)
+    if len(file_tags) > 0:
+        normalize_api_versions(project_api_version, file_tags)
 
     return True
 
@@ -665,16 +1087,22 @@ def upsert_gitignore_entries(list_entries) -> bool:
     return True
 
 
-def check_permset_group_files():
+def check_permset_group_files(inventory=None):
     """
     Checks Permission Set Group Metadata Files and ensures they are set as 'Outdated'. This ensures they are recalculated upon deployment to an org.
+
+    Args:
+        inventory (dict): Optional project inventory to use instead of scanning the project folder, see build_project_inventory
     """
-    psg_files = glob.glob("force-app/main/default/permissionsetgroups/**/*.permissionsetgroup-meta.xml", recursive=True)
+    if inventory is not None:
+        psg_files = get_inventory_files(inventory, "force-app/main/default/permissionsetgroups", ".permissionsetgroup-meta.xml")
+    else:
+        psg_files = glob.glob("force-app/main/default/permissionsetgroups/**/*.permissionsetgroup-meta.xml", recursive=True)
     if len(psg_files) > 0:
         log.info("Checking Permission Set Group File(s)")
-        for psg in psg_files:
-            log.info(f"Checking {psg} file configuration.")
-            FART.fartbetween(FART, psg, "<status>", "</status>", "Outdated", None)
+        updated_files = fart_files(psg_files, [{"mode": "Between", "findleft": "<status>", "findright": "</status>", "replacewith": "Outdated"}])
+        for psg in updated_files:
+            log.info(f"Updated {psg} status to Outdated.")
 
 
 def add_prefix(path, prefix):
@@ -919,7 +1347,221 @@ def compare_directories(dcmp):
     return new_or_changed
 
 
-def compare_metadata(target_org_alias):
+def hash_directory_files(directory_path):
+    """
+    Generates a manifest of content hashes for all files within a directory.
+
+    Args:
+        directory_path (str): Relative path to the directory to hash
+
+    Returns:
+        dict: Relative file path (from the given directory) mapped to the sha256 hex digest of the file content
+    """
+
+    manifest = {}
+    if not os.path.isdir(directory_path):
+        return manifest
+
+    for root, dirs, files in os.walk(directory_path):
+        for file_name in files:
+            file_path = os.path.join(root, file_name)
+            file_hash = hashlib.sha256()
+            with open(file_path, "rb") as f:
+                for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                    file_hash.update(chunk)
+            manifest[os.path.relpath(file_path, directory_path).replace(os.sep, "/")] = file_hash.hexdigest()
+
+    return manifest
+
+
+def _read_package_members(package_xml_path):
+    """
+    Reads the members listed for each metadata type within a package.xml file.
+
+    Args:
+        package_xml_path (str): Relative path to the package.xml file
+
+    Returns:
+        dict: Metadata type name mapped to the list of member names
+    """
+
+    nsmap = {'': "http://soap.sforce.com/2006/04/metadata"}
+    package_members = {}
+    root = ET.parse(package_xml_path).getroot()
+    for types_element in root.findall("types", namespaces=nsmap):
+        type_name = types_element.findtext("name", namespaces=nsmap)
+        if type_name:
+            package_members.setdefault(type_name, []).extend(m.text for m in types_element.findall("members", namespaces=nsmap) if m.text)
+
+    return package_members
+
+
+def _write_package_xml(package_xml_path, package_members, api_version):
+    """ Writes a package.xml file for the given metadata type members """
+
+    root = ET.Element("Package", xmlns="http://soap.sforce.com/2006/04/metadata")
+    for type_name in sorted(package_members):
+        types_element = ET.SubElement(root, "types")
+        for member in sorted(package_members[type_name]):
+            ET.SubElement(types_element, "members").text = member
+        ET.SubElement(types_element, "name").text = type_name
+    ET.SubElement(root, "version").text = str(api_version)
+
+    os.makedirs(os.path.dirname(package_xml_path), exist_ok=True)
+    with open(package_xml_path, "wb") as f:
+        f.write(minidom.parseString(ET.tostring(root)).toprettyxml(indent="    ", encoding="UTF-8"))
+
+
+def _run_sfdx_json(command):
+    """ Runs an sfdx command with json output and returns the result section. Returns None if the command fails """
+
+    try:
+        result = subprocess.run(f"{command} --json", shell=True, capture_output=True, text=True)
+        output = json.loads(result.stdout)
+    except Exception as e:
+        log.debug(f"Command failed: {command}. {e}")
+        return None
+
+    if output.get("status") != 0:
+        log.debug(f"Command failed: {command}. {output.get('message')}")
+        return None
+
+    return output.get("result")
+
+
+def _get_org_username(target_org_alias):
+    """ Looks up the username for a CCI org alias so sfdx can be called directly """
+
+    try:
+        result = subprocess.run(f"cci org info {target_org_alias} --json", shell=True, capture_output=True, text=True)
+        return json.loads(result.stdout).get("username")
+    except Exception as e:
+        log.debug(f"Unable to get the username for org {target_org_alias}. {e}")
+        return None
+
+
+def _get_child_type_map(describe_result):
+    """ Maps child metadata types, like CustomField, to their parent metadata type using the describemetadata result """
+
+    child_to_parent = {}
+    for metadata_object in describe_result.get("metadataObjects", []):
+        for child_name in metadata_object.get("childXmlNames") or []:
+            child_to_parent[child_name] = metadata_object["xmlName"]
+
+    return child_to_parent
+
+
+def _get_in_folder_types(describe_result):
+    """ Lists the metadata types which are stored in folders, like Report and Dashboard, using the describemetadata result """
+
+    return {metadata_object["xmlName"] for metadata_object in describe_result.get("metadataObjects", []) if metadata_object.get("inFolder")}
+
+
+def _get_org_component_timestamps(username, package_members, describe_result):
+    """
+    Lists the last modified date for each component of the given metadata types within the target org. Child component changes, for example a CustomField, are rolled up to their parent component.
+    Types stored in folders are skipped, as they can only be listed folder by folder. Their members are always retrieved instead.
+
+    Args:
+        username (str): The sfdx username of the target org
+        package_members (dict): Metadata type name mapped to member names, taken from the local package.xml
+        describe_result (dict): Result of force:mdapi:describemetadata for the org
+
+    Returns:
+        dict: Component key ("Type:FullName") mapped to the last modified date. None if any listing failed.
+    """
+
+    child_to_parent = _get_child_type_map(describe_result)
+    in_folder_types = _get_in_folder_types(describe_result)
+
+    def list_type(type_name):
+        return type_name, _run_sfdx_json(f"sfdx force:mdapi:listmetadata -m {type_name} -u {username}")
+
+    timestamps = {}
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        for type_name, listing in executor.map(list_type, sorted(set(package_members) - in_folder_types)):
+            if listing is None:
+                return None
+            if isinstance(listing, dict):
+                listing = [listing]
+
+            for component in listing:
+                full_name = component.get("fullName", "")
+                if type_name in child_to_parent:
+                    key = f"{child_to_parent[type_name]}:{full_name.split('.')[0]}"
+                else:
+                    key = f"{type_name}:{full_name}"
+                timestamps[key] = max(timestamps.get(key, ""), component.get("lastModifiedDate", ""))
+
+    return timestamps
+
+
+def _get_file_component_key(relative_path, directory_types):
+    """
+    Works out the component key ("Type:FullName") for a file within a metadata api format folder.
+
+    Args:
+        relative_path (str): Path of the file relative to the root of the metadata folder, e.g. classes/MyClass.cls
+        directory_types (dict): Directory name mapped to a tuple of the metadata type name and whether the type is stored in folders
+
+    Returns:
+        str: The component key or None if the file does not belong to a known metadata type
+    """
+
+    path_parts = relative_path.split("/")
+    if len(path_parts) < 2 or path_parts[0] not in directory_types:
+        return None
+
+    type_name, in_folder = directory_types[path_parts[0]]
+
+    if len(path_parts) > 2 and not in_folder:
+        # Bundles, like aura and lwc, are stored in a sub folder named after the component
+        return f"{type_name}:{path_parts[1]}"
+
+    full_name = "/".join(path_parts[1:])
+    if full_name.endswith("-meta.xml"):
+        full_name = full_name[:-len("-meta.xml")]
+
+    folder_path, _, file_name = full_name.rpartition("/")
+    if "." in file_name:
+        file_name = file_name.rsplit(".", 1)[0]
+
+    return f"{type_name}:{folder_path + '/' if folder_path else ''}{file_name}"
+
+
+def _retrieve_and_unpack(target_org_alias, package_xml_path):
+    """ Retrieves the metadata listed in a package.xml file from the target org and unpacks it to mdapipkg/unpackaged """
+
+    retrieve_command = f"cci task run dx --command \"force:mdapi:retrieve -r mdapipkg -k {package_xml_path}\" --org {target_org_alias}"
+    run_command(retrieve_command)
+
+    retrieved_zip_path = os.path.join("mdapipkg", "unpackaged.zip")
+    if not os.path.exists(retrieved_zip_path):
+        raise Exception(f"Metadata retrieve from the org with alias {target_org_alias} failed. No retrieved metadata was found at {retrieved_zip_path}.")
+
+    with ZipFile(retrieved_zip_path) as retrieved_zip:
+        retrieved_zip.extractall(os.path.join("mdapipkg", "unpackaged"))
+
+
+def compare_metadata(target_org_alias, manifest_path=None):
+    """
+    Compares the local project metadata with the metadata in the target org and copies new or changed files to the upgrade_src folder.
+
+    A manifest of content hashes for the org metadata is kept between runs along with the last modified date of each component in the org. When a manifest exists, only components which have changed in the org since the last run are retrieved and files are compared by hash. A full retrieve is used when there is no manifest or the org timestamps cannot be listed.
+
+    Args:
+        target_org_alias (str): The CCI alias of the target org
+        manifest_path (str): Relative path to the manifest file. Defaults to .qbrix/metadata_manifest_<alias>.json
+
+    Returns:
+        list(str): List of new or changed file paths
+    """
+
+    start_time = time.time()
+
+    if not manifest_path:
+        manifest_path = os.path.join(".qbrix", f"metadata_manifest_{target_org_alias}.json")
+
     # Default Org Command
     if os.path.exists('src'):
         shutil.rmtree('src')
@@ -932,20 +1574,76 @@ def compare_metadata(target_org_alias):
 
     run_command("cci task run dx_convert_from")
 
-    # Retrieve metadata from the target org
-    log.info(f"Retrieving metadata from the target org with alias {target_org_alias} (This can take a few minutes..)")
-    retrieve_command = f"cci task run dx --command \"force:mdapi:retrieve -r mdapipkg -k src/package.xml\" --org {target_org_alias}"
-    run_command(retrieve_command)
+    # Hash local metadata
+    local_hashes = hash_directory_files("src")
+    package_members = _read_package_members(os.path.join("src", "package.xml"))
+    package_version = ET.parse(os.path.join("src", "package.xml")).getroot().findtext("{http://soap.sforce.com/2006/04/metadata}version") or "58.0"
+
+    org_manifest = {}
+    if os.path.exists(manifest_path):
+        try:
+            with open(manifest_path, "r") as f:
+                org_manifest = json.load(f)
+        except Exception as e:
+            log.debug(f"Unable to read metadata manifest. {e}")
+
+    # Get the current state of the org components
+    username = _get_org_username(target_org_alias)
+    describe_result = _run_sfdx_json(f"sfdx force:mdapi:describemetadata -u {username}") if username else None
+    org_timestamps = _get_org_component_timestamps(username, package_members, describe_result) if describe_result else None
+
+    directory_types = {}
+    if describe_result:
+        for metadata_object in describe_result.get("metadataObjects", []):
+            directory_types[metadata_object["directoryName"]] = (metadata_object["xmlName"], metadata_object.get("inFolder", False))
+
+    incremental = bool(org_manifest.get("files") is not None and org_timestamps is not None)
+    org_hashes = dict(org_manifest.get("files", {})) if incremental else {}
+
+    if incremental:
+        previous_timestamps = org_manifest.get("components", {})
+        changed_components = {key for key, last_modified in org_timestamps.items() if previous_timestamps.get(key) != last_modified}
+        removed_components = set(previous_timestamps) - set(org_timestamps)
+        in_folder_types = _get_in_folder_types(describe_result)
+
+        # Drop hashes for components which have changed or been removed from the org, and for all types stored in folders as their changes cannot be listed
+        for file_path in list(org_hashes):
+            component_key = _get_file_component_key(file_path, directory_types)
+            if component_key in changed_components | removed_components or (component_key and component_key.split(":", 1)[0] in in_folder_types):
+                del org_hashes[file_path]
+
+        # Only retrieve the local members which belong to changed components. Child members, like CustomField, are retrieved when their parent has changed.
+        child_to_parent = _get_child_type_map(describe_result)
+        retrieve_members = {}
+        for type_name, members in package_members.items():
+            parent_type = child_to_parent.get(type_name)
+            for member in members:
+                component_key = f"{parent_type}:{member.split('.')[0]}" if parent_type else f"{type_name}:{member}"
+                if component_key in changed_components or type_name in in_folder_types:
+                    retrieve_members.setdefault(type_name, []).append(member)
+
+        log.info(f"{len(changed_components)} component(s) changed in the target org since the last comparison")
+
+        if retrieve_members:
+            log.info(f"Retrieving changed metadata from the target org with alias {target_org_alias}")
+            _write_package_xml(os.path.join("mdapipkg", "package.xml"), retrieve_members, package_version)
+            _retrieve_and_unpack(target_org_alias, "mdapipkg/package.xml")
+            org_hashes.update(hash_directory_files(os.path.join("mdapipkg", "unpackaged", "unpackaged")))
+    else:
+        # Retrieve metadata from the target org
+        log.info(f"Retrieving metadata from the target org with alias {target_org_alias} (This can take a few minutes..)")
+        _retrieve_and_unpack(target_org_alias, "src/package.xml")
+        org_hashes = hash_directory_files(os.path.join("mdapipkg", "unpackaged", "unpackaged"))
 
-    # Unzip the retrieved metadata
-    log.info("Unpacking Metadata")
-    unzip_command = f"unzip -o mdapipkg/unpackaged.zip -d mdapipkg/unpackaged"
-    run_command(unzip_command)
+    # Save org manifest for the next comparison
+    if org_timestamps is not None:
+        os.makedirs(os.path.dirname(manifest_path), exist_ok=True)
+        with open(manifest_path, "w") as f:
+            json.dump({"components": org_timestamps, "files": org_hashes}, f, indent=2)
 
     # Compare the local and target org's metadata
     log.info("Comparing Metadata")
-    dcmp = filecmp.dircmp('mdapipkg/unpackaged/unpackaged', 'src')
-    new_or_changed = compare_directories(dcmp)
+    new_or_changed = [os.path.join("src", file_path) for file_path, file_hash in sorted(local_hashes.items()) if org_hashes.get(file_path) != file_hash]
 
     changes = []
 
@@ -961,7 +1659,7 @@ def compare_metadata(target_org_alias):
             changes.append(file_path)
 
             # Determine the destination path of the metadata file to copy
-            dst_file_path = os.path.join('upgrade_src', file_path.replace('src/', ''))
+            dst_file_path = os.path.join('upgrade_src', file_path.replace('src/', '', 1))
 
             # Create the destination directory if it does not exist
             dst_directory = os.path.dirname(dst_file_path)
@@ -973,6 +1671,8 @@ def compare_metadata(target_org_alias):
 
         run_command("sfdx force:source:manifest:create --sourcepath upgrade_src --manifestname upgrade_src/package")
 
+    log.info(f"Metadata comparison ({'incremental' if incremental else 'full retrieve'}) completed in {time.time() - start_time:.2f} seconds")
+
     return changes
 
 
@@ -989,21 +1689,7 @@ def get_existing_entries(permission_set_file_path):
     ET.register_namespace('', "http://soap.sforce.com/2006/04/metadata")
 
     # Define a dictionary to track existing entries
-    existing_entries = {
-        "objectPermissions": [],
-        "fieldPermissions": [],
-        "recordTypeVisibilities": [],
-        "classAccesses": [],
-        "apexPageAccess": [],
-        "tabSettings": [],
-        "applicationVisibilities": [],
-        "customMetadataTypeAccesses": [],
-        "customPermissions": [],
-        "customSettingAccesses": [],
-        "externalDataSourceAccesses": [],
-        "flowAccesses": [],
-        "userPermissions": []
-    }
+    existing_entries = {entry: [] for entry in PERMISSION_SET_ENTRY_NAME_TAGS}
 
     # Parse the existing XML file if it exists
     if os.path.exists(permission_set_file_path):
@@ -1024,6 +1710,88 @@ def get_existing_entries(permission_set_file_path):
     return existing_entries
 
 
+def index_existing_entries(existing_entries):
+    """
+    Indexes existing Permission Set entries by type and by the name of the component they grant access to, so each lookup takes constant time.
+
+    Args:
+        existing_entries (dict): Entry type mapped to the list of existing elements, see get_existing_entries
+
+    Returns:
+        dict: Entry type mapped to a dict of component name to the first existing element for it
+    """
+
+    nsmap = {'': "http://soap.sforce.com/2006/04/metadata"}
+    entry_index = {}
+    for entry_type, elements in existing_entries.items():
+        name_tag = PERMISSION_SET_ENTRY_NAME_TAGS.get(entry_type)
+        entry_index[entry_type] = {}
+        if not name_tag:
+            continue
+        for element in elements:
+            child_element = element.find(name_tag, namespaces=nsmap)
+            if child_element is not None:
+                entry_index[entry_type].setdefault(child_element.text, element)
+    return entry_index
+
+
+def _scan_object_metadata(objects_path):
+    """
+    Walks the objects folder once and collects the objects, fields and record types which need access in a Permission Set. Each field file is read a single time, and folders are read in sorted order so the entry order does not depend on the filesystem.
+
+    Args:
+        objects_path (str): Relative path to the objects folder
+
+    Returns:
+        tuple: Object names (including objects referenced by lookup fields), field keys (Object.Field) and record type keys (Object.RecordType)
+    """
+
+    objects = {}
+    field_keys = []
+    record_type_keys = []
+
+    if not os.path.exists(objects_path):
+        return list(objects), field_keys, record_type_keys
+
+    for object_name in sorted(os.listdir(objects_path)):
+
+        if object_name == '.DS_Store':
+            continue
+
+        # Add Object Dir to Set
+        objects.setdefault(object_name)
+
+        object_folder_path = os.path.join(objects_path, object_name)
+        if not os.path.isdir(object_folder_path):
+            continue
+
+        fields_folder_path = os.path.join(object_folder_path, "fields")
+        if os.path.isdir(fields_folder_path):
+            for field_file in sorted(os.listdir(fields_folder_path)):
+                with open(os.path.join(fields_folder_path, field_file), "r") as file:
+                    contents = file.read()
+
+                # Add object permissions for lookup fields that reference objects not in the project
+                reference_to_start = contents.find("<referenceTo>")
+                reference_to_end = contents.find("</referenceTo>")
+                if reference_to_start != -1 and reference_to_end != -1:
+                    objects.setdefault(contents[reference_to_start + 13:reference_to_end])
+
+                # Skip MasterDetail, Formula and Required Fields
+                if contents.find("<formula>") > -1 or contents.find("<type>MasterDetail</type>") > -1 or contents.find("<required>true</required>") > -1:
+                    continue
+
+                field_keys.append(f"{object_name}.{field_file[:-15]}")
+
+        record_types_folder_path = os.path.join(object_folder_path, "recordTypes")
+        if os.path.isdir(record_types_folder_path):
+            for record_type_file in sorted(os.listdir(record_types_folder_path)):
+                if record_type_file.endswith(".recordType-meta.xml"):
+                    record_type_keys.append(f"{object_name}.{record_type_file[:-20]}")
+
+    return list(objects), field_keys, record_type_keys
+
+
 def create_permission_set_file(name, label, permission_set_path=None, run_as_upsert=True):
     """
     Creates or updates a Permission Set in the XML file.
@@ -1046,6 +1814,7 @@ def create_permission_set_file(name, label, permission_set_path=None, run_as_ups
     # Get Dict of Access Types
     # Note for developers, Permission Sets require all types of access, e.g. customMetadataTypeAccesses to be grouped together in the resulting file
     existing_entries = get_existing_entries(permission_set_file_path=permissionset_path)
+    existing_index = index_existing_entries(existing_entries)
 
     # Create or update the root element
     root = ET.Element("PermissionSet")
@@ -1066,43 +1835,21 @@ def create_permission_set_file(name, label, permission_set_path=None, run_as_ups
             root.append(existing_object_permission)
 
     # Check for additional or new entries 
-    objects_set = set()
     objects_path = os.path.join("force-app", "main", "default", "objects")
-    if os.path.exists(objects_path):
-        for object_name in os.listdir(objects_path):
-
-            if object_name == '.DS_Store':
-                continue
-
-            # Add Object Dir to Set
-            objects_set.add(object_name)
-        
-            # Add object permissions for lookup fields that reference objects not in the project
-            fields_folder_path = os.path.join(objects_path, object_name, "fields")
-            if os.path.isdir(fields_folder_path):
-                for field_file in os.listdir(fields_folder_path):
-                    field_path = os.path.join(fields_folder_path, field_file)
-                    with open(field_path, "r") as file:
-                        contents = file.read()
-                        reference_to_start = contents.find("<referenceTo>")
-                        reference_to_end = contents.find("</referenceTo>")
-                        if reference_to_start != -1 and reference_to_end != -1:
-                            reference_object = contents[reference_to_start + 13:reference_to_end]
-                            objects_set.add(reference_object)
-
-        # Create Entries for any missing ObjectPermissions
-        for obj in objects_set:
-            object_permissions_element = find_existing_entry(existing_entries["objectPermissions"], "object", obj)
-            if object_permissions_element is None:
-                print(f" -> Adding New Entry for {obj}")
-                object_permissions_element = ET.SubElement(root, "objectPermissions")
-                ET.SubElement(object_permissions_element, "allowCreate").text = "true"
-                ET.SubElement(object_permissions_element, "allowDelete").text = "true"
-                ET.SubElement(object_permissions_element, "allowEdit").text = "true"
-                ET.SubElement(object_permissions_element, "allowRead").text = "true"
-                ET.SubElement(object_permissions_element, "modifyAllRecords").text = "true"
-                ET.SubElement(object_permissions_element, "object").text = obj
-                ET.SubElement(object_permissions_element, "viewAllRecords").text = "true"               
+    object_names, field_keys, record_type_keys = _scan_object_metadata(objects_path)
+
+    # Create Entries for any missing ObjectPermissions
+    for obj in object_names:
+        if obj not in existing_index["objectPermissions"]:
+            print(f" -> Adding New Entry for {obj}")
+            object_permissions_element = ET.SubElement(root, "objectPermissions")
+            ET.SubElement(object_permissions_element, "allowCreate").text = "true"
+            ET.SubElement(object_permissions_element, "allowDelete").text = "true"
+            ET.SubElement(object_permissions_element, "allowEdit").text = "true"
+            ET.SubElement(object_permissions_element, "allowRead").text = "true"
+            ET.SubElement(object_permissions_element, "modifyAllRecords").text = "true"
+            ET.SubElement(object_permissions_element, "object").text = obj
+            ET.SubElement(object_permissions_element, "viewAllRecords").text = "true"               
 
     # FIELD PERMISSIONS
 
@@ -1112,33 +1859,12 @@ def create_permission_set_file(name, label, permission_set_path=None, run_as_ups
             root.append(existing_field_permission)
 
     # Check for New or Additional Entries and add them
-    if os.path.exists(objects_path):
-        for object_folder in os.listdir(objects_path):
-            object_folder_path = os.path.join(objects_path, object_folder)
-            if os.path.isdir(object_folder_path):
-                fields_folder_path = os.path.join(object_folder_path, "fields")
-                if os.path.isdir(fields_folder_path):
-                    for field_file in os.listdir(fields_folder_path):
-
-                        # Read File and skip MasterDetail and Formula Fields
-                        with open(os.path.join(fields_folder_path, field_file), "r") as file:
-                            contents = file.read()
-                            formula_reference_to_start = contents.find("<formula>")
-                            md_reference_to_start = contents.find("<type>MasterDetail</type>")
-                            req_reference_to_start = contents.find("<required>true</required>")
-
-                        if formula_reference_to_start > -1 or md_reference_to_start > -1 or req_reference_to_start > -1:
-                            continue
-
-                        field_name = field_file[:-15]
-                        field_key = f"{object_folder}.{field_name}"
-                        field_permissions_element = find_existing_entry(existing_entries["fieldPermissions"], "field", field_key)
-                        if field_permissions_element is None:
-                            field_permissions_element = ET.SubElement(root, "fieldPermissions")
-                            ET.SubElement(field_permissions_element, "editable").text = "true"
-                            ET.SubElement(field_permissions_element, "field").text = field_key
-                            ET.SubElement(field_permissions_element, "readable").text = "true"
-                                
+    for field_key in field_keys:
+        if field_key not in existing_index["fieldPermissions"]:
+            field_permissions_element = ET.SubElement(root, "fieldPermissions")
+            ET.SubElement(field_permissions_element, "editable").text = "true"
+            ET.SubElement(field_permissions_element, "field").text = field_key
+            ET.SubElement(field_permissions_element, "readable").text = "true"
 
     # RECORD TYPE ACCESS
 
@@ -1148,21 +1874,11 @@ def create_permission_set_file(name, label, permission_set_path=None, run_as_ups
             root.append(existing_rt_permission)
 
     # Handle New or Additional Access
-    if os.path.exists(objects_path):
-        for object_folder in os.listdir(objects_path):
-            object_folder_path = os.path.join(objects_path, object_folder)
-            if os.path.isdir(object_folder_path):
-                record_types_folder_path = os.path.join(object_folder_path, "recordTypes")
-                if os.path.isdir(record_types_folder_path):
-                    for record_type_file in os.listdir(record_types_folder_path):
-                        if record_type_file.endswith(".recordType-meta.xml"):
-                            record_type_name = record_type_file[:-20]
-                            record_type_key = f"{object_folder}.{record_type_name}"
-                            record_type_permissions_element = find_existing_entry(existing_entries["recordTypeVisibilities"], "recordType", record_type_key)
-                            if record_type_permissions_element is None:
-                                record_type_permissions_element = ET.SubElement(root, "recordTypeVisibilities")
-                                ET.SubElement(record_type_permissions_element, "recordType").text = record_type_key
-                                ET.SubElement(record_type_permissions_element, "visible").text = "true"
+    for record_type_key in record_type_keys:
+        if record_type_key not in existing_index["recordTypeVisibilities"]:
+            record_type_permissions_element = ET.SubElement(root, "recordTypeVisibilities")
+            ET.SubElement(record_type_permissions_element, "recordType").text = record_type_key
+            ET.SubElement(record_type_permissions_element, "visible").text = "true"
 
     # APEX Class Access
 
@@ -1177,8 +1893,7 @@ def create_permission_set_file(name, label, permission_set_path=None, run_as_ups
         for class_file in os.listdir(classes_path):
             if class_file.endswith(".cls"):
                 class_name = class_file[:-4]
-                class_permissions_element = find_existing_entry(existing_entries["classAccesses"], "apexClass", class_name)
-                if class_permissions_element is None:
+                if class_name not in existing_index["classAccesses"]:
                     class_permissions_element = ET.SubElement(root, "classAccesses")
                     ET.SubElement(class_permissions_element, "apexClass").text = class_name
                     ET.SubElement(class_permissions_element, "enabled").text = "true"
@@ -1196,8 +1911,7 @@ def create_permission_set_file(name, label, permission_set_path=None, run_as_ups
         for tab_file in os.listdir(tabs_path):
             if tab_file.endswith(".tab-meta.xml"):
                 tab_name = tab_file[:-13]
-                tab_permissions_element = find_existing_entry(existing_entries["tabSettings"], "tab", tab_name)
-                if tab_permissions_element is None:
+                if tab_name not in existing_index["tabSettings"]:
                     tab_permissions_element = ET.SubElement(root, "tabSettings")
                     ET.SubElement(tab_permissions_element, "tab").text = tab_name
                     ET.SubElement(tab_permissions_element, "visibility").text = "Visible"
@@ -1215,8 +1929,7 @@ def create_permission_set_file(name, label, permission_set_path=None, run_as_ups
         for apps_file in os.listdir(apps_path):
             if apps_file.endswith(".app-meta.xml"):
                 app_name = apps_file[:-13]
-                app_permissions_element = find_existing_entry(existing_entries["applicationVisibilities"], "application", app_name)
-                if app_permissions_element is None:
+                if app_name not in existing_index["applicationVisibilities"]:
                     app_permissions_element = ET.SubElement(root, "applicationVisibilities")
                     ET.SubElement(app_permissions_element, "application").text = app_name
                     ET.SubElement(app_permissions_element, "visible").text = "true"
@@ -1234,8 +1947,7 @@ def create_permission_set_file(name, label, permission_set_path=None, run_as_ups
         for flow_file in os.listdir(flows_path):
             if flow_file.endswith(".flow-meta.xml"):
                 flow_name = flow_file[:-14]
-                flow_permissions_element = find_existing_entry(existing_entries["flowAccesses"], "flow", flow_name)
-                if flow_permissions_element is None:
+                if flow_name not in existing_index["flowAccesses"]:
                     flow_permissions_element = ET.SubElement(root, "flowAccesses")
                     ET.SubElement(flow_permissions_element, "flow").text = flow_name
                     ET.SubElement(flow_permissions_element, "enabled").text = "true"
@@ -1255,8 +1967,7 @@ def create_permission_set_file(name, label, permission_set_path=None, run_as_ups
                 md_file_name = os.path.basename(custom_md_file)
                 md_name = md_file_name.split(".")[0]
                 md_name += "__mdt"
-                md_permissions_element = find_existing_entry(existing_entries["customMetadataTypeAccesses"], "name", md_name)
-                if md_permissions_element is None:
+                if md_name not in existing_index["customMetadataTypeAccesses"]:
                     md_permissions_element = ET.SubElement(root, "customMetadataTypeAccesses")
                     ET.SubElement(md_permissions_element, "name").text = md_name
                     ET.SubElement(md_permissions_element, "enabled").text = "true"
@@ -1304,8 +2015,7 @@ def create_permission_set_file(name, label, permission_set_path=None, run_as_ups
         for page_file in os.listdir(pages_path):
             if page_file.endswith(".page-meta.xml"):
                 page_file = page_file[:-14]
-                page_permissions_element = find_existing_entry(existing_entries["apexPageAccess"], "apexPage", page_file)
-                if page_permissions_element is None:
+                if page_file not in existing_index["apexPageAccess"]:
                     page_permissions_element = ET.SubElement(root, "apexPageAccess")
                     ET.SubElement(page_permissions_element, "apexPage").text = page_file
                     ET.SubElement(page_permissions_element, "enabled").text = "true"
@@ -1361,6 +2071,91 @@ def find_existing_entry(existing_entries, child_tag, child_text):
             return entry
     return None
 
+def _index_stack_project(project_path):
+    """
+    Walks a cached project folder once, capturing the details needed for the stack view.
+
+    Args:
+        project_path (str): Relative path to the project folder within the CCI projects cache
+
+    Returns:
+        dict: The project config details (if a cumulusci.yml file was found) and the list of files found within force-app/main/default
+    """
+
+    config_file = None
+    project_files = []
+    seen_files = set()
+
+    for root, dirs, files in os.walk(project_path):
+        if config_file is None and "cumulusci.yml" in files:
+            config_file = os.path.join(root, "cumulusci.yml")
+
+        if "force-app/main/default" in root:
+            for file_name in files:
+                file_path = os.path.join(root, file_name)
+                force_app_index = file_path.find("force-app/main/default/")
+                if force_app_index != -1:
+                    file_path = file_path[force_app_index + len("force-app/main/default/"):]
+                    if file_path not in seen_files:
+                        seen_files.add(file_path)
+                        project_files.append(file_path)
+
+    project_index = {"has_config": False, "files": project_files}
+
+    if config_file:
+        with open(config_file, 'r') as f:
+            config = yaml.safe_load(f) or {}
+
+        project_config = config.get('project') or {}
+        project_index["has_config"] = True
+        project_index["api_version"] = (project_config.get('package') or {}).get('api_version')
+        project_index["repo_url"] = (project_config.get('git') or {}).get('repo_url')
+        project_index["dependencies"] = project_config.get("dependencies") or []
+
+    return project_index
+
+
+def build_stack_index(parent_directory_path='.cci/projects', index_file=STACK_INDEX_FILE):
+    """
+    Builds an index of the config and files for every project within the CCI projects cache. The index is saved and reused on later runs while the cached projects have not changed.
+
+    Args:
+        parent_directory_path (str): Relative path to the CCI projects cache. Defaults to .cci/projects
+        index_file (str): Relative path to the saved index file. Defaults to .cci/qbrix_stack_index.json
+
+    Returns:
+        dict: Project folder name mapped to the indexed project details
+    """
+
+    # Cached projects are stored by commit, so the commit folders identify the version of each project
+    snapshot = {project: sorted(commits) for project, commits in get_cci_cache_snapshot(parent_directory_path).items()}
+
+    if os.path.exists(index_file):
+        try:
+            with open(index_file, 'r') as f:
+                saved_index = json.load(f)
+            if saved_index.get("parent_directory_path") == parent_directory_path and saved_index.get("snapshot") == snapshot:
+                log.debug("Stack Index: Reusing saved index as cached projects are unchanged")
+                return saved_index["projects"]
+        except Exception as e:
+            log.debug(f"Stack Index: Unable to read saved index, rebuilding. {e}")
+
+    projects = {}
+    for qbrix in sorted(os.listdir(parent_directory_path)):
+        project_path = os.path.join(parent_directory_path, qbrix)
+        if os.path.isdir(project_path):
+            projects[qbrix] = _index_stack_project(project_path)
+
+    try:
+        os.makedirs(os.path.dirname(index_file), exist_ok=True)
+        with open(index_file, 'w') as f:
+            json.dump({"parent_directory_path": parent_directory_path, "snapshot": snapshot, "projects": projects}, f, default=str)
+    except Exception as e:
+        log.debug(f"Stack Index: Unable to save index. {e}")
+
+    return projects
+
+
 def get_packages_in_stack(skip_cache_rebuild=False, whole_stack=True):
 
     """
@@ -1371,21 +2166,13 @@ def get_packages_in_stack(skip_cache_rebuild=False, whole_stack=True):
 
     # Regenerate cci cache
     if not skip_cache_rebuild:
-        rebuild_cci_cache()
+        refresh_cci_cache()
 
     if whole_stack:
-        qbrix_dirs = sorted(os.listdir(".cci/projects"))
-        for qbrix in qbrix_dirs:
-            cci_yml = glob.glob(f"{os.path.join('.cci', 'projects', qbrix)}/**/cumulusci.yml", recursive=True)
-            if len(cci_yml) > 0:
-                with open(cci_yml[0], 'r') as f:
-                    config = yaml.safe_load(f)
-                
-                dependencies = config['project'].get("dependencies")
-                if dependencies:
-                    for d in dependencies:
-                        if d.get("version_id"):
-                            package_list.append((d.get("version_id"), qbrix))
+        for qbrix, project_index in build_stack_index().items():
+            for d in project_index.get("dependencies", []):
+                if d.get("version_id"):
+                    package_list.append((d.get("version_id"), qbrix))
 
     with open('cumulusci.yml', 'r') as f:
         local_config = yaml.safe_load(f)
@@ -1401,189 +2188,132 @@ def get_packages_in_stack(skip_cache_rebuild=False, whole_stack=True):
 
 def generate_stack_view(parent_directory_path='.cci/projects', output="terminal"):
     # Regenerate cci cache
-    rebuild_cci_cache()
+    refresh_cci_cache(parent_directory_path)
 
-    if not os.path.exists('.cci/projects'):
+    if not os.path.exists(parent_directory_path):
         print("No Sources to traverse. Skipping")
         return
 
-    # Get Stack folder locations and order
-    sub_directory_names_sorted = sorted(os.listdir(parent_directory_path))
-    sub_directory_names_sorted.append("LOCAL")
+    log_file = None
 
-    files_list = []
-    overwritten_files_list = []
+    def write_output(terminal_text, file_text):
+        if output == "terminal":
+            print(terminal_text)
+        else:
+            log_file.write(file_text)
 
     if output == "terminal":
         print("Sending outputs to the Terminal")
-        print("\n***SOURCE QBRIX FILES***")
     else:
         now = datetime.datetime.now()
         log_file_name = "stack_log_" + now.strftime("%Y%m%d%H%M%S") + ".txt"
         log_file = open(log_file_name, "w")
         print(f"Sending output to log file, located at {log_file_name}")
-        log_file.write("\n***SOURCE QBRIX FILES***")
 
-    for i, qbrix in enumerate(sub_directory_names_sorted):
-        if qbrix != "LOCAL":
-            if output == "terminal":
-                print(f"\n{qbrix}")
-                print("-" * len(qbrix))
-            else:
-                log_file.write(f"\n\n{qbrix}\n")
-                log_file.write("-" * len(qbrix))
+    write_output("\n***SOURCE QBRIX FILES***", "\n***SOURCE QBRIX FILES***")
 
-            cci_yml = glob.glob(f"{os.path.join('.cci', 'projects', qbrix)}/**/cumulusci.yml", recursive=True)
+    # Index all projects once, the saved index is reused if the cached projects have not changed
+    stack_index = build_stack_index(parent_directory_path)
 
-            if cci_yml:
-                with open(cci_yml[0], 'r') as f:
-                    config = yaml.safe_load(f)
+    # Map each file to the projects which deploy it, in stack order. The first entry is the original deployer.
+    file_deployers = {}
 
-                api_version = config['project']['package']['api_version']
-                if api_version:
-                    if output == "terminal":
-                        print(f"\nAPI Version: {api_version}")
-                    else:
-                        log_file.write(f"\nAPI Version: {api_version}")
-                else:
-                    if output == "terminal":
-                        print("\nAPI Version: ERROR MISSING!!!")
-                    else:
-                        log_file.write("\nAPI Version: ERROR MISSING!!!")
+    for qbrix, project_index in stack_index.items():
+        write_output(f"\n{qbrix}\n" + "-" * len(qbrix), f"\n\n{qbrix}\n" + "-" * len(qbrix))
 
-                repo_url = config['project']['git']['repo_url']
-                if repo_url:
-                    if output == "terminal":
-                        print(f"\nREPO URL: {repo_url}")
-                    else:
-                        log_file.write(f"\nREPO URL: {repo_url}")
-                else:
-                    print("\nREPO URL: ERROR MISSING!!!")
-
-                dependencies = config['project'].get("dependencies")
-                if dependencies and len(dependencies) > 0:
-                    if output == "terminal":
-                        print("\nPACKAGES:")
-                    else:
-                        log_file.write("\nPACKAGES:")
-
-                    for d in dependencies:
-                        if d.get("namespace"):
-                            if output == "terminal":
-                                print(f" - Managed Package: {d.get('namespace')}")
-                            else:
-                                log_file.write(f"\n - Managed Package: {d.get('namespace')}")
-                        if d.get("version_id"):
-                            if output == "terminal":
-                                print(f" - Unmanaged Package Version ID: {d.get('version_id')}")
-                            else:
-                                log_file.write(f"\n - Unmanaged Package Version ID: {d.get('version_id')}")
-                        if d.get("github"):
-                            if output == "terminal":
-                                print(f" - Github Repo: {d.get('github')}")
-                            else:
-                                log_file.write(f"\n - Github Repo: {d.get('github')}")
-            if output == "terminal":
-                print("\nFILES:")
+        if project_index["has_config"]:
+            api_version = project_index.get("api_version")
+            if api_version:
+                write_output(f"\nAPI Version: {api_version}", f"\nAPI Version: {api_version}")
             else:
-                log_file.write(f"\nFILES:")
-            for root, dirs, files in os.walk(os.path.join(".cci", "projects", qbrix)):
-                if "force-app/main/default" in root:
-                    for file_name in files:
-                        file_path = os.path.join(root, file_name)
-                        force_app_index = file_path.find("force-app/main/default/")
-                        if force_app_index != -1:
-                            file_path = os.path.join(file_path[force_app_index + len("force-app/main/default/"):])
-                            if output == "terminal":
-                                print(f" - {file_path}")
-                            else:
-                                log_file.write(f"\n - {file_path}")
-                            if i == 0:
-                                files_list.append((file_path, qbrix))
-                            else:
-                                if len([t for t in files_list if t[0] == file_path]) >= 1:
-                                    overwritten_files_list.append((file_path, qbrix))
-                                else:
-                                    files_list.append((file_path, qbrix))
+                write_output("\nAPI Version: ERROR MISSING!!!", "\nAPI Version: ERROR MISSING!!!")
 
-        else:
-            if output == "terminal":
-                print(f"\nLOCAL QBRIX")
-                print("-" * len("LOCAL QBRIX"))
+            repo_url = project_index.get("repo_url")
+            if repo_url:
+                write_output(f"\nREPO URL: {repo_url}", f"\nREPO URL: {repo_url}")
             else:
-                log_file.write(f"\n\nLOCAL QBRIX\n")
-                log_file.write("-" * len("LOCAL QBRIX"))
-
-            for root, dirs, files in os.walk("force-app/main/default"):
-                for file_name in files:
-                    file_path = os.path.join(root, file_name)
-                    force_app_index = file_path.find("force-app/main/default/")
-                    if force_app_index != -1:
-                        file_path = os.path.join(file_path[force_app_index + len("force-app/main/default/"):])
-                        if output == "terminal":
-                            print(f" - {file_path}")
-                        else:
-                            log_file.write(f"\n - {file_path}")
-                        if i == 0:
-                            files_list.append((file_path, qbrix))
-                        else:
-                            if len([t for t in files_list if t[0] == file_path]) >= 1:
-                                overwritten_files_list.append((file_path, qbrix))
-                            else:
-                                files_list.append((file_path, qbrix))
+                print("\nREPO URL: ERROR MISSING!!!")
+
+            dependencies = project_index.get("dependencies")
+            if dependencies:
+                write_output("\nPACKAGES:", "\nPACKAGES:")
+
+                for d in dependencies:
+                    if d.get("namespace"):
+                        write_output(f" - Managed Package: {d.get('namespace')}", f"\n - Managed Package: {d.get('namespace')}")
+                    if d.get("version_id"):
+                        write_output(f" - Unmanaged Package Version ID: {d.get('version_id')}", f"\n - Unmanaged Package Version ID: {d.get('version_id')}")
+                    if d.get("github"):
+                        write_output(f" - Github Repo: {d.get('github')}", f"\n - Github Repo: {d.get('github')}")
+
+        write_output("\nFILES:", "\nFILES:")
+        for file_path in project_index["files"]:
+            write_output(f" - {file_path}", f"\n - {file_path}")
+            file_deployers.setdefault(file_path, []).append(qbrix)
+
+    write_output("\nLOCAL QBRIX\n" + "-" * len("LOCAL QBRIX"), "\n\nLOCAL QBRIX\n" + "-" * len("LOCAL QBRIX"))
+
+    for root, dirs, files in os.walk("force-app/main/default"):
+        for file_name in files:
+            file_path = os.path.join(root, file_name)
+            force_app_index = file_path.find("force-app/main/default/")
+            if force_app_index != -1:
+                file_path = file_path[force_app_index + len("force-app/main/default/"):]
+                write_output(f" - {file_path}", f"\n - {file_path}")
+                deployers = file_deployers.setdefault(file_path, [])
+                if "LOCAL" not in deployers:
+                    deployers.append("LOCAL")
+
+    write_output("\n***STACK FILES WHICH ARE REDEPLOYED***", "\n\n***STACK FILES WHICH ARE REDEPLOYED***")
+
+    total_overwritten_files = 0
+    for f, deployers in file_deployers.items():
+        if len(deployers) < 2:
+            continue
 
-    if output == "terminal":
-        print("\n***STACK FILES WHICH ARE REDEPLOYED***")
-    else:
-        log_file.write("\n\n***STACK FILES WHICH ARE REDEPLOYED***")
+        total_overwritten_files += len(deployers) - 1
+        write_output(f"\n{f} (Deployed By {deployers[0]})", f"\n\n{f} (Deployed By {deployers[0]})")
 
-    for f, q in files_list:
-        overwrite_matches = [t for t in overwritten_files_list if t[0] == f]
+        for o in deployers[1:]:
+            write_output(f" > Updated in: {o}", f"\n > Updated in: {o}")
 
-        if len(overwrite_matches) > 0:
-            if output == "terminal":
-                print(f"\n{f} (Deployed By {q})")
-            else:
-                log_file.write(f"\n\n{f} (Deployed By {q})")
-
-            for o in list(set(overwrite_matches)):
-                if o[1] != q:
-                    if output == "terminal":
-                        print(f" > Updated in: {o[1]}")
-                    else:
-                        log_file.write(f"\n > Updated in: {o[1]}")
     if output == "terminal":
         print("\n***STACK STATS***")
-        print(f"\nTotal Files in Stack: {len(files_list)}")
-        print(f"Total Files updated within stack: {len(overwritten_files_list)}")
+        print(f"\nTotal Files in Stack: {len(file_deployers)}")
+        print(f"Total Files updated within stack: {total_overwritten_files}")
     else:
-        log_file.write(f"\n***STACK STATS***\n\nTotal Files in Stack: {len(files_list)}\nTotal Files updated within stack: {len(overwritten_files_list)}")
-
-    if output != "terminal":
+        log_file.write(f"\n***STACK STATS***\n\nTotal Files in Stack: {len(file_deployers)}\nTotal Files updated within stack: {total_overwritten_files}")
         log_file.close()
 
-def remove_empty_translations():
+def remove_empty_translations(inventory=None):
     
     """
     Removes empty translations from the project directory. Defaults to the force-app/main/default/objectTranslations directory.
+
+    Args:
+        inventory (dict): Optional project inventory to use instead of scanning the project folder, see build_project_inventory
     """
 
     # Define the path to the objectTranslations directory
     obj_trans_dir = os.path.join('force-app', 'main', 'default', 'objectTranslations')
-    
-    # Loop through all subdirectories in the objectTranslations directory
-    for obj_dir in os.listdir(obj_trans_dir):
-        obj_dir_path = os.path.join(obj_trans_dir, obj_dir)
-        if not os.path.isdir(obj_dir_path):
-            continue
-        
+
+    if inventory is None:
+        if not os.path.isdir(obj_trans_dir):
+            return
+        inventory = build_project_inventory(obj_trans_dir)
+
+    # Group the translation files by object directory
+    translation_files = {}
+    for trans_file_path in get_inventory_files(inventory, obj_trans_dir, '.xml'):
+        obj_dir_path = os.path.dirname(trans_file_path)
+        if os.path.dirname(obj_dir_path) == obj_trans_dir:
+            translation_files.setdefault(obj_dir_path, []).append(trans_file_path)
+
+    for obj_dir_path, trans_file_paths in translation_files.items():
+
         # Check if all label tags have no value
-        
-        for trans_file in os.listdir(obj_dir_path):
-            if not trans_file.endswith('.xml'):
-                continue
-            
-            trans_file_path = os.path.join(obj_dir_path, trans_file)
+        remove_obj_dir = True
+        for trans_file_path in trans_file_paths:
             tree = ET.parse(trans_file_path)
             root = tree.getroot()
             has_translation = False
@@ -1591,20 +2321,20 @@ def remove_empty_translations():
                 if child.find('label') is not None and child.find('label').text != '':
                     has_translation = True
                     break
-            
+
             if not has_translation:
                 print(f"No translation found in {trans_file_path}")
                 os.remove(trans_file_path)
-                remove_obj_dir = True
+                remove_inventory_file(inventory, trans_file_path)
             else:
                 remove_obj_dir = False
-        
+
         # Remove object directory if all files within have no translations
-        if remove_obj_dir:
+        if remove_obj_dir and not os.listdir(obj_dir_path):
             os.rmdir(obj_dir_path)
 
     # Remove objectTranslations directory if empty
-    if not os.listdir(obj_trans_dir):
+    if os.path.isdir(obj_trans_dir) and not os.listdir(obj_trans_dir):
         os.rmdir(obj_trans_dir)
 
 def pretty_print(elem, level=0):
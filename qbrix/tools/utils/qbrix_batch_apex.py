@@ -4,27 +4,76 @@ import os
 import time
 import subprocess
 import requests
+from urllib.parse import urlencode
 from abc import abstractmethod
+from concurrent.futures import ThreadPoolExecutor
 
 from cumulusci.core.config import ScratchOrgConfig
 from cumulusci.tasks.sfdx import SFDXBaseTask
 from cumulusci.core.exceptions import CommandException
 from cumulusci.core.keychain import BaseProjectKeychain
+from qbrix.core.qbrix_org_session import get_org_session, get_sfdx_env
 
 LOAD_COMMAND = "sfdx apex run "
 
+# executeAnonymous takes the script in the query string. Longer URLs are rejected (414/431), so those scripts run through the CLI instead
+MAX_EXECUTE_URL_LENGTH = 4096
+
+
+def wait_for_condition(check, max_wait_seconds, initial_delay=2, max_delay=60, on_wait=None):
+    """
+    Polls a condition with exponential backoff until it holds or the wait budget is used up.
+
+    Args:
+        check (function): Called with no arguments on each poll. Returns True when the condition holds
+        max_wait_seconds (int): Maximum number of seconds to wait in total
+        initial_delay (int): Seconds to wait before the first poll. Each following wait doubles, up to max_delay
+        max_delay (int): Maximum number of seconds to wait between polls
+        on_wait (function): Optional function called with the seconds waited so far each time the condition does not hold
+
+    Returns:
+        tuple: True if the condition was met, and the total number of seconds waited
+    """
+
+    start_time = time.time()
+    delay = initial_delay
+
+    while True:
+        waited = time.time() - start_time
+        remaining = max_wait_seconds - waited
+        if remaining <= 0:
+            return False, waited
+
+        time.sleep(min(delay, remaining))
+        if check():
+            return True, time.time() - start_time
+
+        if on_wait:
+            on_wait(time.time() - start_time)
+        delay = min(delay * 2, max_delay)
+
 
 class BatchAnonymousApex(SFDXBaseTask):
     keychain_class = BaseProjectKeychain
 
     task_docs = """
     Takes one or more apex script files (defined in the filepaths option) which need to be deployed and runs them against the target org.
+    Scripts are run through the Tooling API executeAnonymous endpoint, or through the Salesforce CLI when a script is too large to send in the request URL. Independent scripts run concurrently up to the maxworkers limit.
+    A script that must run on its own, after every script listed before it has finished, can be listed as a dictionary with a path and sequential set to True.
     """
 
     task_options = {
 
         "filepaths": {
-            "description": "When mode is set to File, each file is executed in order",
+            "description": "List of apex script files to run. Each entry is either a file path or a dictionary with a path and an optional sequential flag.",
+            "required": False
+        },
+        "maxworkers": {
+            "description": "Maximum number of independent scripts to run at the same time. Default is 4",
+            "required": False
+        },
+        "sequential": {
+            "description": "When True, every script is run one at a time in the order listed. Default is False",
             "required": False
         },
         "org": {
@@ -34,7 +83,7 @@ class BatchAnonymousApex(SFDXBaseTask):
     }
 
     def _setprojectdefaults(self, instanceurl):
-        subprocess.run([f"sfdx config:set instanceUrl={instanceurl}"], shell=True, capture_output=True)
+        self.sfdx_env = get_sfdx_env(instanceurl)
 
     def _init_options(self, kwargs):
         super(BatchAnonymousApex, self)._init_options(kwargs)
@@ -109,17 +158,115 @@ class BatchAnonymousApex(SFDXBaseTask):
     def _run_task(self):
 
         self._prepruntime(self)
+
+        if not hasattr(self, "filepaths") or not self.filepaths:
+            return
+
+        max_workers = max(int(self.options.get("maxworkers") or 4), 1)
+        run_all_sequential = str(self.options.get("sequential") or False).lower() == "true"
+
+        api_version = self.project_config.project__package__api_version
+        session = get_org_session(self.org_config, api_version, self.accesstoken, self.instanceurl)
+        self.execute_url = session.url("tooling/executeAnonymous/")
         self._setprojectdefaults(self.instanceurl)
 
-        if hasattr(self, "filepaths") and self.filepaths is not None:
-            for i, v in enumerate(self.filepaths):
-                if os.path.isfile(v):
-                    runthiscmd = f"{LOAD_COMMAND} -f {v} -u {self.accesstoken} --json"
-                    self.logger.info(f'Running Apex Script in {v}')
-                    resp = subprocess.run([runthiscmd], shell=True, capture_output=True, cwd=self.options.get("dir"))
-                    self.logger.info(resp.stdout)
-                else:
-                    self.logger.error(f"File path {v} is not a valid file")
+        # Group consecutive independent scripts so they can run together. A sequential script waits for everything before it.
+        batches = []
+        for entry in self.filepaths:
+            if isinstance(entry, dict):
+                path = entry.get("path")
+                sequential = str(entry.get("sequential") or False).lower() == "true"
+            else:
+                path = entry
+                sequential = False
+
+            if not os.path.isfile(path):
+                self.logger.error(f"File path {path} is not a valid file")
+                continue
+
+            if sequential or run_all_sequential or not batches or batches[-1]["sequential"]:
+                batches.append({"sequential": sequential or run_all_sequential, "paths": [path]})
+            else:
+                batches[-1]["paths"].append(path)
+
+        results = []
+        start_time = time.time()
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            for batch in batches:
+                results.extend(executor.map(lambda path: self._execute_script(session, path), batch["paths"]))
+
+        self.logger.info(f"Ran {len(results)} Apex Script(s) in {time.time() - start_time:.2f}s")
+        for result in results:
+            if result["success"]:
+                self.logger.info(f" - {result['path']}: {result['status']} ({result['duration']:.2f}s)")
+            else:
+                self.logger.error(f" - {result['path']}: {result['status']} ({result['duration']:.2f}s) {result['message']}")
+
+    def _execute_script(self, session, path):
+        """
+        Runs a single apex script through the Tooling API executeAnonymous endpoint.
+
+        Args:
+            session (OrgSession): Shared session for the target org
+            path (str): Path to the apex script file
+
+        Returns:
+            dict: The script path, success flag, status, message and duration in seconds
+        """
+
+        self.logger.info(f'Running Apex Script in {path}')
+        with open(path, "r", encoding="utf-8") as apex_file:
+            apex_body = apex_file.read()
+
+        start_time = time.time()
+        result = {"path": path, "success": False, "status": "Failed", "message": ""}
+
+        if len(self.execute_url) + 1 + len(urlencode({"anonymousBody": apex_body})) > MAX_EXECUTE_URL_LENGTH:
+            self.logger.info(f"{path} is too large for the executeAnonymous endpoint. Running it through the Salesforce CLI.")
+            self._execute_script_with_cli(path, result)
+            result["duration"] = time.time() - start_time
+            return result
+
+        try:
+            response = session.get(self.execute_url, params={"anonymousBody": apex_body}, timeout=600)
+            if response.status_code in (414, 431):
+                self.logger.info(f"{path} was rejected as too large by the executeAnonymous endpoint. Running it through the Salesforce CLI.")
+                self._execute_script_with_cli(path, result)
+            else:
+                response.raise_for_status()
+                self._set_execute_result(result, response.json())
+        except requests.exceptions.RequestException as e:
+            result["message"] = str(e)
+
+        result["duration"] = time.time() - start_time
+        return result
+
+    def _execute_script_with_cli(self, path, result):
+        """ Runs an apex script through sfdx apex run and records the outcome in result """
+
+        runthiscmd = f"{LOAD_COMMAND} -f {path} -u {self.accesstoken} --json"
+        resp = subprocess.run([runthiscmd], shell=True, capture_output=True, cwd=self.options.get("dir"), env=self.sfdx_env)
+        try:
+            output = json.loads(resp.stdout)
+        except ValueError:
+            result["message"] = (resp.stderr or resp.stdout).decode("utf-8", errors="replace")
+            return
+
+        if isinstance(output.get("result"), dict) and "compiled" in output["result"]:
+            self._set_execute_result(result, output["result"])
+        else:
+            result["message"] = output.get("message") or ""
+
+    def _set_execute_result(self, result, data):
+        if not data.get("compiled"):
+            result["status"] = "Compile Error"
+            result["message"] = f"Line {data.get('line')}, Column {data.get('column')}: {data.get('compileProblem')}"
+        elif not data.get("success"):
+            result["status"] = "Execution Error"
+            result["message"] = f"{data.get('exceptionMessage')}\n{data.get('exceptionStackTrace')}"
+        else:
+            result["success"] = True
+            result["status"] = "Success"
 
     def _handle_returncode(self, returncode, stderr):
         if returncode:
@@ -145,7 +292,7 @@ class RunAnonymousApexAndWait(SFDXBaseTask):
         }
         ,
         "waitseconds": { 
-            "description": "Number of secondsd to wait per cycle. Default is 60",
+            "description": "Number of seconds per wait cycle. Polling starts after a couple of seconds and backs off up to this value. Default is 60",
             "required": False
         },
         "exitonsoqlzero": { 
@@ -153,7 +300,7 @@ class RunAnonymousApexAndWait(SFDXBaseTask):
             "required": False
         },
         "maxwaithchecks": { 
-            "description": "Max number of times to check to and wait after no detection of the running jobs. Each wait check is 60 seconds. Default of 1 if not set.",
+            "description": "Max number of wait cycles after the first one before giving up. Each wait cycle is waitseconds long. Default of 1 if not set.",
             "required": False
         },
          "runscriptperwait": { 
@@ -172,7 +319,7 @@ class RunAnonymousApexAndWait(SFDXBaseTask):
     }
 
     def _setprojectdefaults(self, instanceurl):
-        subprocess.run([f"sfdx config:set instanceUrl={instanceurl}"], shell=True, capture_output=True)
+        self.sfdx_env = get_sfdx_env(instanceurl)
 
     def _init_options(self, kwargs):
         super(RunAnonymousApexAndWait, self)._init_options(kwargs)
@@ -276,41 +423,59 @@ class RunAnonymousApexAndWait(SFDXBaseTask):
             if os.path.isfile(self.filepath):
                 runthiscmd = f"{LOAD_COMMAND} -f {self.filepath} -u {self.accesstoken} --json"
                 self.logger.info(f'Running Apex Script in {self.filepath}')
-                resp = subprocess.run([runthiscmd], shell=True, capture_output=True, cwd=self.options.get("dir"))
-                time.sleep(self.waitseconds)
-                if hasattr(self, "exitonsoqlzero") and self.exitonsoqlzero is not None:    
-                    while(self.maxwaithchecks>0):
-    
-                        if(self._is_zero_count(self.exitonsoqlzero)):
-                            time.sleep(30)
-                            if(self._is_zero_count(self.exitonsoqlzero)):
-                                self.maxwaithchecks=0
-                                continue
-                            
-                        #if we want to run a scropt per wait
-                        if(self.waitscript):
-                            runthiscmd = f"{LOAD_COMMAND} -f {self.waitscript} -u {self.accesstoken} --json"
-                            self.logger.info(f'Running Additional Wait Apex Script in {self.waitscript}')
-                            resp = subprocess.run([runthiscmd], shell=True, capture_output=True, cwd=self.options.get("dir"))
-                            
-                        self.maxwaithchecks=self.maxwaithchecks-1
-                        time.sleep(self.waitseconds)
+                resp = subprocess.run([runthiscmd], shell=True, capture_output=True, cwd=self.options.get("dir"), env=self.sfdx_env)
+                if hasattr(self, "exitonsoqlzero") and self.exitonsoqlzero is not None:
+                    self.session = get_org_session(self.org_config, self.project_config.project__package__api_version, self.accesstoken, self.instanceurl)
+                    completed, self.waited_seconds = self._wait_for_zero_count(self.exitonsoqlzero)
+                    if completed:
+                        self.logger.info(f"Count reached zero after waiting {self.waited_seconds:.0f}s")
+                    else:
+                        self.logger.info(f"Count did not reach zero after waiting {self.waited_seconds:.0f}s")
+                else:
+                    time.sleep(self.waitseconds)
+                    self.waited_seconds = self.waitseconds
                             
             else:
                 self.logger.error(f"File path {self.filepath} is not a valid file")
-                
-                
-    def _is_zero_count(self,soql):
-        modsoql=soql.replace(" ","+")
-        url = f"{self.instanceurl}/services/data/v56.0/query/?q={modsoql}"
-        headers = {
-            'Authorization': f'Bearer {self.accesstoken}',
-            'Content-Type': 'application/json'
-        }
-        response = requests.request("GET", url, headers=headers)
-        data = json.loads(response.text)
+
+    def _wait_for_zero_count(self, soql):
+        """
+        Waits until the count query returns zero, polling with exponential backoff capped at waitseconds.
+
+        Args:
+            soql (str): SOQL count query to poll
+
+        Returns:
+            tuple: True if the count reached zero, and the total number of seconds waited
+        """
+
+        self.last_wait_script_run = 0
+
+        def run_wait_script(waited):
+            # Run the wait script at most once per wait cycle, as the polling interval can be shorter than a cycle
+            if self.waitscript and waited - self.last_wait_script_run >= self.waitseconds:
+                runthiscmd = f"{LOAD_COMMAND} -f {self.waitscript} -u {self.accesstoken} --json"
+                self.logger.info(f'Running Additional Wait Apex Script in {self.waitscript}')
+                subprocess.run([runthiscmd], shell=True, capture_output=True, cwd=self.options.get("dir"), env=self.sfdx_env)
+                self.last_wait_script_run = waited
+
+        return wait_for_condition(
+            lambda: self._is_zero_count(soql),
+            max_wait_seconds=(int(self.maxwaithchecks) + 1) * self.waitseconds,
+            max_delay=self.waitseconds,
+            on_wait=run_wait_script
+        )
+
+    def _is_zero_count(self, soql):
+        session = getattr(self, "session", None) or get_org_session(self.org_config, self.project_config.project__package__api_version, self.accesstoken, self.instanceurl)
+        data = session.query(soql)
         self.logger.info(data)
-        return data["records"][0]["expr0"] == 0
+
+        # count() queries return the total size, while count(Id) style aggregates return expr0
+        records = data.get("records") or []
+        if records and "expr0" in records[0]:
+            return records[0]["expr0"] == 0
+        return data.get("totalSize") == 0
     
     def _handle_returncode(self, returncode, stderr):
         if returncode:
@@ -1,4 +1,5 @@
 from genericpath import isfile
+import hashlib
 import json
 import os
 import re
@@ -16,8 +17,64 @@ from cumulusci.tasks.sfdx import SFDXBaseTask
 from cumulusci.core.exceptions import TaskOptionsError
 from cumulusci.core.exceptions import CommandException
 from cumulusci.core.keychain import BaseProjectKeychain
+from qbrix.core.qbrix_org_session import get_sfdx_env
 
 LOAD_COMMAND = "sfdx force:apex:execute "
+DEPLOY_ENV_CACHE_FILE = os.path.join(".qbrix", "deploy_env_cache.json")
+
+
+def get_keychain_fingerprint(project_name):
+    """
+    Builds a fingerprint of the CumulusCI and sfdx keychain files, so org and service discovery can be reused until they change.
+
+    Args:
+        project_name (str): Name of the CumulusCI project, used to find the project keychain folder
+
+    Returns:
+        str: SHA1 of the path, size and modified time of each keychain file
+    """
+
+    home = os.path.expanduser("~")
+    keychain_paths = [
+        os.path.join(home, ".cumulusci", project_name or ""),
+        os.path.join(home, ".cumulusci", "services"),
+        os.path.join(home, ".sfdx", "alias.json"),
+        os.path.join(home, ".sf", "alias.json")
+    ]
+
+    fingerprint = hashlib.sha1()
+    for keychain_path in keychain_paths:
+        if os.path.isfile(keychain_path):
+            file_paths = [keychain_path]
+        elif os.path.isdir(keychain_path):
+            file_paths = sorted(os.path.join(root, name) for root, _, files in os.walk(keychain_path) for name in files)
+        else:
+            continue
+
+        for file_path in file_paths:
+            try:
+                stat = os.stat(file_path)
+            except OSError:
+                continue
+            fingerprint.update(f"{file_path}|{stat.st_size}|{stat.st_mtime_ns}\n".encode("utf-8"))
+
+    return fingerprint.hexdigest()
+
+
+def _load_deploy_env_cache(cache_file=DEPLOY_ENV_CACHE_FILE):
+    if not os.path.isfile(cache_file):
+        return {}
+    try:
+        with open(cache_file, "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_deploy_env_cache(cache, cache_file=DEPLOY_ENV_CACHE_FILE):
+    os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+    with open(cache_file, "w") as f:
+        json.dump(cache, f, indent=2)
 
 #This extension is really for running a CCI style flow in a single shell. This is to get around
 #granular task behavior within Metadeploy
@@ -40,7 +97,7 @@ class Deploy(SFDXBaseTask):
     }
     
     def _setprojectdefaults(self, instanceurl):
-        subprocess.run([f"sfdx config:set instanceUrl={instanceurl}"], shell=True, capture_output=True)
+        self.sfdx_env = get_sfdx_env(instanceurl)
 
     def _init_options(self, kwargs):
         super(Deploy, self)._init_options(kwargs)
@@ -122,26 +179,21 @@ class Deploy(SFDXBaseTask):
         #self.logger.info(f'ENTRYPOINTTYPE::{self.entrypointtype}')
         #self.logger.info(f'TARGETORG::{self.cciorg}')
         
-        orglist=subprocess.run([f"cci org list"], shell=True, capture_output=True)
-        #self.logger.info(orglist)
-        srvclist=subprocess.run([f"cci service list"], shell=True, capture_output=True)
-        #self.logger.info(srvclist)
-        srvclist=subprocess.run([f"cci org info {self.cciorg}"], shell=True, capture_output=True)
-        #self.logger.info(srvclist)
-        
-        hashedalias = "cciorg"+str(hash(self.accesstoken))
+        start_time = time.time()
+        project_name = self.project_config.project__name
+
+        # The alias is derived from the access token, so the same token always maps to the same imported org
+        hashedalias = "cciorg" + hashlib.sha1(self.accesstoken.encode("utf-8")).hexdigest()[:16]
         #self.logger.info(hashedalias)
-        
-        sfdximport=subprocess.run([f"export SFDX_ACCESS_TOKEN='{self.accesstoken}' && sfdx force:auth:accesstoken:store --instanceurl {self.instanceurl} -a {hashedalias} --noprompt --json --loglevel DEBUG "], shell=True, capture_output=True)
-        #self.logger.info(sfdximport)
-        
-        sfdximport=subprocess.run([f"cci org import {hashedalias} {hashedalias}"], shell=True, capture_output=True)
-        #self.logger.info(sfdximport)
-        
-        orglist=subprocess.run([f"cci org list"], shell=True, capture_output=True)
-        #self.logger.info(orglist)
-        
-    
+
+        cache = _load_deploy_env_cache()
+        if cache.get("fingerprint") == get_keychain_fingerprint(project_name) and hashedalias in cache.get("orgs", []):
+            self.logger.info(f"Keychain unchanged and org {hashedalias} already imported. Skipping org and service discovery.")
+        else:
+            cache = self._discoverenvironment(hashedalias)
+
+        self.logger.info(f"Pre-deploy setup completed in {time.time() - start_time:.2f} seconds")
+
         with subprocess.Popen(['cci', self.entrypointtype, 'run', self.entrypoint, '--org', hashedalias],
                 stdout=subprocess.PIPE, stderr=subprocess.PIPE, bufsize=1,
                 universal_newlines=True) as p:
@@ -153,8 +205,53 @@ class Deploy(SFDXBaseTask):
                 self.logger.error(line)  # process line here
                 #self.logger.error(line[20:])  # process line here
 
+        # Running the flow can refresh the org tokens on disk, so record the keychain state the next deploy will see
+        cache["fingerprint"] = get_keychain_fingerprint(project_name)
+        _save_deploy_env_cache(cache)
+
         if p.returncode != 0:
             raise subprocess.CalledProcessError(p.returncode, f"Failure running QBrix {self.entrypointtype} {self.entrypoint} ")
+
+    def _discoverenvironment(self, hashedalias):
+        """
+        Reads the orgs and services in the keychain and imports the target org when it is not already there.
+
+        Args:
+            hashedalias (str): Alias to import the target org under
+
+        Returns:
+            dict: Cache entry holding the keychain fingerprint, known orgs and services
+        """
+
+        orgs = self._run_cci_json("cci org list --json")
+        services = self._run_cci_json("cci service list --json")
+
+        if hashedalias not in orgs:
+            sfdximport=subprocess.run([f"export SFDX_ACCESS_TOKEN='{self.accesstoken}' && sfdx force:auth:accesstoken:store --instanceurl {self.instanceurl} -a {hashedalias} --noprompt --json --loglevel DEBUG "], shell=True, capture_output=True)
+            #self.logger.info(sfdximport)
+
+            sfdximport=subprocess.run([f"cci org import {hashedalias} {hashedalias}"], shell=True, capture_output=True)
+            #self.logger.info(sfdximport)
+
+            orgs = self._run_cci_json("cci org list --json")
+        else:
+            self.logger.info(f"Org {hashedalias} already imported")
+
+        cache = {
+            "fingerprint": get_keychain_fingerprint(self.project_config.project__name),
+            "orgs": sorted(orgs),
+            "services": services
+        }
+        _save_deploy_env_cache(cache)
+        return cache
+
+    def _run_cci_json(self, command):
+        result = subprocess.run([command], shell=True, capture_output=True)
+        try:
+            return json.loads(result.stdout)
+        except ValueError:
+            self.logger.info(f"Unable to read output from {command}")
+            return {}
         
         
     def _run_task(self):
@@ -1,10 +1,93 @@
+import glob
 import json
 import os
 import subprocess
 from abc import abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+
 from cumulusci.tasks.command import Command
 from cumulusci.core.exceptions import CommandException
 from cumulusci.core.keychain import BaseProjectKeychain
+from qbrix.core.qbrix_org_session import OrgSession, get_org_session, get_sfdx_env
+
+BETWEEN_MODES = {"Between", "SOQL-Between"}
+SOQL_MODES = {"SOQL", "SOQL-Between"}
+
+
+def apply_fart_rules(contents: str, rules: list) -> str:
+    """
+    Applies a list of resolved find and replace rules to the given text, in order.
+
+    Args:
+        contents (str): Text to update
+        rules (list(dict)): Rules with a mode along with either find or findleft/findright, the resolved replacewith value and an optional format
+
+    Returns:
+        str: The updated text
+    """
+
+    for rule in rules:
+        replacewith = rule.get("replacewith")
+        if replacewith is None:
+            continue
+
+        formatval = rule.get("format")
+        if formatval and "{0}" in formatval:
+            replacewith = formatval.format(replacewith)
+
+        if rule.get("mode", "Text") in BETWEEN_MODES:
+            left = rule.get("findleft")
+            right = rule.get("findright")
+            if not left or not right:
+                continue
+
+            start_index = contents.find(left)
+            if start_index == -1:
+                continue
+            start_index += len(left)
+
+            end_index = contents.find(right, start_index)
+            if end_index == -1:
+                continue
+
+            contents = contents.replace(f"{left}{contents[start_index:end_index]}{right}", f"{left}{replacewith}{right}")
+        elif rule.get("find"):
+            contents = contents.replace(rule["find"], str(replacewith))
+
+    return contents
+
+
+def fart_files(srcfiles: list, rules: list, max_workers: int = 8) -> list:
+    """
+    Applies resolved find and replace rules to many files in parallel. Each file is read once and only written when the content has changed.
+
+    Args:
+        srcfiles (list(str)): File paths to update
+        rules (list(dict)): Resolved rules, see apply_fart_rules
+        max_workers (int): Maximum number of files processed at the same time. Defaults to 8
+
+    Returns:
+        list(str): File paths which were updated
+    """
+
+    def process_file(srcfile):
+        if not os.path.isfile(srcfile):
+            return None
+
+        with open(srcfile, "r") as tmpFile:
+            defcontents = tmpFile.read()
+
+        defcontentsmodified = apply_fart_rules(defcontents, rules)
+        if defcontentsmodified == defcontents:
+            return None
+
+        with open(srcfile, "w") as tmpFile:
+            tmpFile.write(defcontentsmodified)
+
+        return srcfile
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return [f for f in executor.map(process_file, list(dict.fromkeys(srcfiles))) if f]
 
 
 class FART(Command):
@@ -16,11 +99,11 @@ class FART(Command):
 
     task_options = {
         "srcfile": {
-            "description": "Directory path to the export.json to upload",
-            "required": True
+            "description": "Directory path to the export.json to upload. Required for every mode except Batch",
+            "required": False
         },
         "mode": {
-            "description": "Run mode: Text or Between or SOQL or SOQL-Between",
+            "description": "Run mode: Text or Between or SOQL or SOQL-Between or Batch",
             "required": False,
             "default": "Text"
         },
@@ -51,6 +134,18 @@ class FART(Command):
         "format": {
             "description": "Format pattern to apply to the supplied replacewith or located value from a soql statement",
             "required": False
+        },
+        "srcglob": {
+            "description": "For run mode of Batch, glob pattern for the files to update, e.g. force-app/**/*.xml",
+            "required": False
+        },
+        "rules": {
+            "description": "For run mode of Batch, list of rules (or path to a .json file containing the list). Each rule has a mode (Text, Between, SOQL, SOQL-Between or Cache) and the same keys as the single file options: find, findleft, findright, replacewith, soql, tooling and format",
+            "required": False
+        },
+        "maxworkers": {
+            "description": "For run mode of Batch, the maximum number of files to process at the same time. Defaults to 8",
+            "required": False
         }
 
     }
@@ -93,16 +188,20 @@ class FART(Command):
             self._load_keychain()
             self.logger.info("Org passed in but no keychain found in runtime")
 
-        if "srcfile" not in self.options or not self.options["srcfile"]:
-            raise ValueError('No source file provided to analyze.')
-        else:
-            self.fartpath = self.options["srcfile"]
-
         if "mode" not in self.options or not self.options["mode"]:
             self.fartmode = "Text"
         else:
             self.fartmode = self.options["mode"]
 
+        if self.fartmode == "Batch":
+            self._prepbatch()
+            return
+
+        if "srcfile" not in self.options or not self.options["srcfile"]:
+            raise ValueError('No source file provided to analyze.')
+        else:
+            self.fartpath = self.options["srcfile"]
+
         # universal
         if "replacewith" not in self.options or not self.options["replacewith"]:
             self.fartreplacewith = None
@@ -153,7 +252,78 @@ class FART(Command):
             if self.org_config.instance_url is not None:
                 self.instanceurl = self.org_config.instance_url
 
+    def _prepbatch(self):
+        self.fartfiles = []
+        if self.options.get("srcglob"):
+            self.fartfiles += sorted(glob.glob(self.options["srcglob"], recursive=True))
+        if self.options.get("srcfile"):
+            self.fartfiles.append(self.options["srcfile"])
+
+        if not self.fartfiles:
+            raise ValueError('No source files found to analyze. Check the srcglob and srcfile options.')
+
+        rules = self.options.get("rules")
+        if isinstance(rules, str):
+            if os.path.isfile(rules):
+                with open(rules, "r") as rules_file:
+                    rules = json.load(rules_file)
+            else:
+                rules = json.loads(rules)
+
+        if not rules:
+            raise ValueError('No rules provided for Batch mode.')
+
+        self.fartrules = [dict(rule) for rule in rules]
+        self.maxworkers = int(self.options.get("maxworkers") or 8)
+
+        if any(rule.get("mode") in SOQL_MODES for rule in self.fartrules):
+            self.accesstoken = self.org_config.access_token
+            self.instanceurl = self.org_config.instance_url
+
+    def _query_first_value(self, session: OrgSession, soql: str, tooling: bool = False):
+        response = session.get("tooling/query/" if tooling else "query/", params={"q": soql}, timeout=60)
+        response.raise_for_status()
+        records = response.json().get("records") or []
+
+        if len(records) >= 1:
+            # we want the first key (1) after attributes(0). That is the first column and all we want
+            return records[0][list(records[0].keys())[1]]
+
+        return None
+
+    def resolvebatchrules(self, rules: list) -> list:
+        """ Resolves the replacement values for Cache and SOQL rules. Each distinct query is run once, concurrently, over a shared session. """
+
+        resolved_rules = [dict(rule) for rule in rules]
+
+        for rule in resolved_rules:
+            if rule.get("mode") == "Cache":
+                rule["replacewith"] = self.org_config.qbrix_cache_get(rule.get("replacewith"))
+
+        queries = list(dict.fromkeys((rule["soql"], bool(rule.get("tooling"))) for rule in resolved_rules if rule.get("mode") in SOQL_MODES and rule.get("soql")))
+
+        if queries:
+            session = get_org_session(self.org_config, self.project_config.project__package__api_version, self.accesstoken, self.instanceurl)
+            with ThreadPoolExecutor(max_workers=min(len(queries), 8)) as executor:
+                query_results = dict(zip(queries, executor.map(lambda q: self._query_first_value(session, q[0], q[1]), queries)))
+
+            for rule in resolved_rules:
+                if rule.get("mode") in SOQL_MODES:
+                    rule["replacewith"] = query_results.get((rule.get("soql"), bool(rule.get("tooling"))))
+
+        return resolved_rules
+
+    def runbatch(self):
+        rules = self.resolvebatchrules(self.fartrules)
+        updated_files = fart_files(self.fartfiles, rules, self.maxworkers)
+        self.logger.info(f"FART Batch: Updated {len(updated_files)} of {len(self.fartfiles)} file(s)")
+        for updated_file in updated_files:
+            self.logger.info(f" -> {updated_file}")
+
     def run(self):
+        if self.fartmode == "Batch":
+            self.runbatch()
+
         if self.fartmode == "Text":
             self.runwithtext()
             
@@ -185,7 +355,7 @@ class FART(Command):
         if self.soql is None or self.soql == "":
             return
 
-        subprocess.run([f"sfdx config:set instanceUrl={self.instanceurl}"], shell=True, capture_output=True)
+        self.sfdx_env = get_sfdx_env(self.instanceurl)
 
         self.fartsoql(self.fartpath, self.fartfind, self.accesstoken, self.soql, self.formatval, self.tooling)
 
@@ -197,7 +367,7 @@ class FART(Command):
         if self.fartfindleft is None or self.fartfindright is None:
             return
 
-        subprocess.run([f"sfdx config:set instanceUrl={self.instanceurl}"], shell=True, capture_output=True)
+        self.sfdx_env = get_sfdx_env(self.instanceurl)
 
         self.fartsoqlbetween(self.fartpath, self.fartfindleft, self.fartfindright, self.accesstoken, self.soql,
                              self.formatval, self.tooling)
@@ -272,7 +442,7 @@ class FART(Command):
         if tooling:
             cmd = f"{cmd} -t"
 
-        result = subprocess.run([cmd], shell=True, capture_output=True)
+        result = subprocess.run([cmd], shell=True, capture_output=True, env=getattr(self, "sfdx_env", None))
 
         if result is None:
             return None
@@ -1,6 +1,8 @@
+import time
 from abc import ABC
+
 from qbrix.tools.shared.qbrix_console_utils import init_logger
-from qbrix.tools.shared.qbrix_project_tasks import clean_project_files, check_api_versions, check_permset_group_files, check_and_update_old_class_refs, create_external_id_field, create_permission_set_file, delete_standard_fields, remove_empty_translations, source_org_feature_checker, org_feature_checker, check_org_config_files, update_file_api_versions, upsert_gitignore_entries, replace_file_text, get_qbrix_repo_url
+from qbrix.tools.shared.qbrix_project_tasks import build_project_inventory, clean_project_files, check_api_versions, check_permset_group_files, check_and_update_old_class_refs, create_external_id_field, create_permission_set_file, delete_standard_fields, remove_empty_translations, source_org_feature_checker, org_feature_checker, check_org_config_files, update_file_api_versions, upsert_gitignore_entries, replace_file_text, get_qbrix_repo_url
 from cumulusci.core.tasks import BaseTask
 from qbrix.tools.shared.qbrix_json_tasks import update_json_file_value, get_json_file_value
 
@@ -48,27 +50,46 @@ class HealthChecker(BaseTask, ABC):
         self.auto_generate_external_id_fields = self.options["auto_generate_external_id_fields"] if "auto_generate_external_id_fields" in self.options else False
         self.regenerate_permission_set = self.options["regenerate_permission_set"] if "regenerate_permission_set" in self.options else False
 
+    def _run_check(self, title, check, *args):
+        start_time = time.time()
+        check(*args)
+        return title, time.time() - start_time
+
     def _run_task(self):
         self.logger.info("\nHealth Check: Starting Health Checker Tool")
+        start_time = time.time()
 
         self.logger.info("\nHealth Check: Removing cached/unneeded files and folders from project.")
-        clean_project_files()
+        clean_project_files(include_cci_cache=False)
         self.logger.info(" -> Check Complete!")
 
-        self.logger.info("\nHealth Check: Checking for old class references and updating them...")
-        check_and_update_old_class_refs()
-        self.logger.info(" -> Check Complete!")
+        # Walk the project once and share the file list between the file checks
+        inventory_start_time = time.time()
+        inventory = build_project_inventory()
+        self.logger.info(f"\nHealth Check: Indexed {sum(len(files) for files in inventory.values())} project files in {time.time() - inventory_start_time:.2f} seconds")
+
+        # These checks do not prompt, so they run one after another over the shared inventory before the interactive checks
+        project_api_version = self.project_config.project__package__api_version
+        file_checks = [
+            ("Checking for old class references and updating them", check_and_update_old_class_refs),
+            ("Checking that all references to the API version, match the project version", self._check_api_versions, project_api_version, inventory),
+            ("Checking .gitignore file", self._check_gitignore),
+            ("Checking Permission Set Group files are set to Outdated", check_permset_group_files, inventory),
+        ]
+        if self.remove_standard_fields:
+            file_checks.append(("Checking for standard object fields and removing them from the project", delete_standard_fields, inventory))
+        if self.remove_empty_translations:
+            file_checks.append(("Checking for and removing empty translations", remove_empty_translations, inventory))
+
+        self.logger.info(f"\nHealth Check: Running {len(file_checks)} project file checks")
+        for file_check in file_checks:
+            title, duration = self._run_check(*file_check)
+            self.logger.info(f" -> {title}: Check Complete! ({duration:.2f} seconds)")
 
         self.logger.info("\nHealth Check: Checking placeholder names have been replaced and other naming is correct.")
         self.check_project_file_naming()
         self.logger.info(" -> Check Complete!")
 
-        self.logger.info("\nHealth Check: Checking that all references to the API version, match the project version.")
-        check_api_versions(self.project_config.project__package__api_version)
-        if self.api_checker_include_code_files:
-            update_file_api_versions(self.project_config.project__package__api_version)
-        self.logger.info(" -> Check Complete!")
-
         self.logger.info("\nHealth Check: Checking that orgs/dev.json has all features from all sources related to this Q Brix.")
         source_org_feature_checker(False, self.auto)
         self.logger.info(" -> Check Complete!")
@@ -81,16 +102,6 @@ class HealthChecker(BaseTask, ABC):
         check_org_config_files(True)
         self.logger.info(" -> Check Complete!")
 
-        if self.remove_standard_fields:
-            self.logger.info("\nHealth Check: Checking for standard object fields and removing them from the project")
-            delete_standard_fields()
-            self.logger.info(" -> Check Complete!")
-
-        if self.remove_empty_translations:
-            self.logger.info("\nHealth Check: Checking for and removing empty translations")
-            remove_empty_translations()
-            self.logger.info(" -> Check Complete!")
-
         if self.auto_generate_external_id_fields:
             self.logger.info("\nHealth Check: Checking for and adding External ID Fields to objects")
             create_external_id_field()
@@ -109,7 +120,20 @@ class HealthChecker(BaseTask, ABC):
                 else:
                     self.logger.info("There was an unexpected response, expecting y or n, skipping Permission Set check and rebuild.")
 
-        self.logger.info("\nHealth Check: Checking .gitignore file")
+        self.logger.info(f"\n\nHealth Check: All Checks completed in {time.time() - start_time:.2f} seconds!")
+
+    def _check_api_versions(self, project_api_version, inventory):
+
+        """ Checks the project API version and, when enabled, updates the code files to match. Both update sfdx-project.json so they run together. """
+
+        check_api_versions(project_api_version)
+        if self.api_checker_include_code_files:
+            update_file_api_versions(project_api_version, inventory)
+
+    def _check_gitignore(self):
+
+        """ Checks the .gitignore file has the required entries """
+
         test_list = []
 
         # ADD ENTRIES FOR THE .GITIGNORE FILE BELOW. LEFT THIS AS IS TO MAKE IT EASIER TO READ
@@ -140,13 +164,6 @@ class HealthChecker(BaseTask, ABC):
         # Check to ensure that .vscode is not ignored from git
         replace_file_text(".gitignore", ".vscode/", "")
 
-        # Check Permission Set Group Files are set to Outdated
-        check_permset_group_files()
-
-        self.logger.info(" -> Check Complete!")
-
-        self.logger.info("\n\nHealth Check: All Checks completed!")
-
     def check_project_file_naming(self):
 
         """ Checks that the project file names are set correctly """
@@ -14,6 +14,7 @@ from cumulusci.tasks.sfdx import SFDXBaseTask
 from cumulusci.core.exceptions import TaskOptionsError
 from cumulusci.core.exceptions import CommandException
 from cumulusci.core.keychain import BaseProjectKeychain
+from qbrix.core.qbrix_org_session import get_org_session, get_sfdx_env
 
 LOAD_COMMAND = "sfdx force:apex:execute "
 
@@ -33,7 +34,7 @@ class SFIDirectDatapackDeployer(SFDXBaseTask):
     }
     
     def _setprojectdefaults(self, instanceurl):
-        subprocess.run([f"sfdx config:set instanceUrl={instanceurl}"], shell=True, capture_output=True)
+        self.sfdx_env = get_sfdx_env(instanceurl)
 
     def _init_options(self, kwargs):
         super(SFIDirectDatapackDeployer, self)._init_options(kwargs)
@@ -120,16 +121,11 @@ class SFIDirectDatapackDeployer(SFDXBaseTask):
     def process_datapack_payload(self,payload:str):
         if(payload is None):
             return
-        targeturl =f"{self.org_config.instance_url}/services/apexrest/SFIDirectDatapackAPI"
         try:
-            url = targeturl
-            headers = {
-            'Authorization': f'Bearer {self.accesstoken}',
-            'Content-Type': 'application/json'
-            }
+            session = get_org_session(self.org_config, access_token=self.accesstoken)
 
             #self.logger.info(f"Payload::{payload}")
-            response = requests.request("POST", url, headers=headers, data=payload)            
+            response = session.post("/services/apexrest/SFIDirectDatapackAPI", data=payload)
             payloadresponse = json.loads(response.text)
             
             status =payloadresponse["status"]
@@ -158,13 +154,13 @@ class SFIDirectDatapackDeployer(SFDXBaseTask):
         
 
     def _setprojectdefaults(self, instanceurl):
-        subprocess.run([f"sfdx config:set instanceUrl={instanceurl}"], shell=True, capture_output=True)
+        self.sfdx_env = get_sfdx_env(instanceurl)
         
     def determinenamespace(self, username: str):
 
         result = subprocess.run([
             f"sfdx force:data:soql:query -u {username} -q \"SELECT NamespacePrefix FROM PackageLicense where NamespacePrefix in ('omnistudio','vlocity_cmt','vlocity_ps','vlocity_ins') LIMIT 1\" --json"],
-            shell=True, capture_output=True)
+            shell=True, capture_output=True, env=self.sfdx_env)
 
         self.logger.info(result.stdout)
         if result is None: return "omnistudio"
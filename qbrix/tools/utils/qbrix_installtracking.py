@@ -13,18 +13,163 @@ from time import sleep
 import atexit
 import uuid
 import socket
+import threading
+from contextlib import contextmanager
 from datetime import datetime
 
 
 
+from cumulusci.cli.error import get_logfile_path, get_traceback
 from cumulusci.core.config import ScratchOrgConfig
 from cumulusci.tasks.sfdx import SFDXBaseTask
 from cumulusci.core.exceptions import TaskOptionsError
 from cumulusci.core.exceptions import CommandException
 from cumulusci.core.keychain import BaseProjectKeychain
+from qbrix.core.qbrix_org_session import get_org_session, get_sfdx_env
 
 LOAD_COMMAND = "sfdx force:apex:execute "
 
+TRACKING_URL = "https://qbrix-core.herokuapp.com/qbrix/InstallTracking"
+TRACKING_QUEUE_FILE = os.path.join(".qbrix", "installtracking_queue.jsonl")
+TRACKING_BATCH_SIZE = 25
+TRACKING_TIMEOUT = (3, 10)
+TRACKING_EXIT_TIMEOUT = (2, 3)
+TRACKING_EXIT_WAIT_SECONDS = 3
+TRACKING_QUEUE_MAX_RECORDS = 500
+TRACKING_EXIT_MAX_RECORDS = 1
+TRACKING_LOCK_TIMEOUT = 5
+TRACKING_LOCK_STALE_SECONDS = 60
+ORG_QUERY_TIMEOUT = 30
+
+_tracking_queue_lock = threading.Lock()
+
+
+@contextmanager
+def tracking_queue_lock(queue_file=TRACKING_QUEUE_FILE, timeout=TRACKING_LOCK_TIMEOUT):
+    """
+    Locks the tracking queue against other threads and other processes. Other processes are kept out with a lock file created with O_EXCL next to the queue file.
+    A lock file left behind by a process which died is removed once it is older than TRACKING_LOCK_STALE_SECONDS.
+
+    Args:
+        queue_file (str): Path to the queue file
+        timeout (int): Seconds to wait for the lock
+
+    Raises:
+        TimeoutError: When the lock could not be taken in time
+    """
+
+    lock_file = f"{queue_file}.lock"
+    with _tracking_queue_lock:
+        os.makedirs(os.path.dirname(queue_file) or ".", exist_ok=True)
+        deadline = time.time() + timeout
+        while True:
+            try:
+                os.close(os.open(lock_file, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+                break
+            except FileExistsError:
+                try:
+                    if time.time() - os.path.getmtime(lock_file) > TRACKING_LOCK_STALE_SECONDS:
+                        os.remove(lock_file)
+                        continue
+                except OSError:
+                    continue
+                if time.time() > deadline:
+                    raise TimeoutError(f"Timed out waiting for the tracking queue lock: {lock_file}")
+                sleep(0.05)
+
+        try:
+            yield
+        finally:
+            try:
+                os.remove(lock_file)
+            except OSError:
+                pass
+
+
+def _read_tracking_queue(queue_file):
+    if not os.path.isfile(queue_file):
+        return []
+    with open(queue_file, "r", encoding="utf-8") as queue:
+        return [line for line in queue.read().splitlines() if line.strip()]
+
+
+def _write_tracking_queue(queue_file, lines):
+    with open(queue_file, "w", encoding="utf-8") as queue:
+        queue.writelines(f"{line}\n" for line in lines)
+
+
+def spool_tracking_record(record, queue_file=TRACKING_QUEUE_FILE, max_records=TRACKING_QUEUE_MAX_RECORDS):
+    """
+    Appends a tracking record to the local queue file, so it can be sent later without blocking the caller.
+    The queue holds at most max_records records, and the oldest records are dropped first.
+
+    Args:
+        record (dict): Tracking record to queue
+        queue_file (str): Path to the queue file. Each line holds one JSON record
+        max_records (int): Maximum number of records to keep queued
+    """
+
+    with tracking_queue_lock(queue_file):
+        pending = _read_tracking_queue(queue_file)
+        if len(pending) < max_records:
+            with open(queue_file, "a", encoding="utf-8") as queue:
+                queue.write(json.dumps(record) + "\n")
+        else:
+            _write_tracking_queue(queue_file, (pending + [json.dumps(record)])[-max_records:])
+
+
+def send_tracking_queue(url=TRACKING_URL, queue_file=TRACKING_QUEUE_FILE, max_records=TRACKING_BATCH_SIZE, timeout=TRACKING_TIMEOUT):
+    """
+    Sends queued tracking records over a single session and removes the ones which were accepted. Each record is sent as its own JSON object, one per POST, as the endpoint expects.
+    Sending stops at the first failure, and anything not sent stays queued for the next run.
+
+    Args:
+        url (str): Tracking endpoint which accepts one record per POST
+        queue_file (str): Path to the queue file
+        max_records (int): Maximum number of records to send in one call
+        timeout (tuple): Connect and read timeout in seconds for each request
+
+    Returns:
+        int: Number of records sent
+    """
+
+    with tracking_queue_lock(queue_file):
+        pending = _read_tracking_queue(queue_file)
+    if not pending:
+        return 0
+
+    sent = 0
+    with requests.Session() as session:
+        for line in pending[:max_records]:
+            try:
+                response = session.post(url, data=line, timeout=timeout, verify=True)
+            except requests.exceptions.RequestException:
+                break
+            if not response.ok:
+                break
+            sent += 1
+
+    if sent:
+        # Records can be appended while sending, so only drop the ones which were sent from the front of the queue
+        with tracking_queue_lock(queue_file):
+            _write_tracking_queue(queue_file, _read_tracking_queue(queue_file)[sent:])
+
+    return sent
+
+
+def start_tracking_sender(url=TRACKING_URL, queue_file=TRACKING_QUEUE_FILE):
+    """
+    Sends the tracking queue on a background thread so slow endpoints never hold up the task.
+    Threads cannot be started at interpreter shutdown, so use send_tracking_queue directly from exit handlers.
+
+    Returns:
+        threading.Thread: The daemon thread sending the queue
+    """
+
+    sender = threading.Thread(target=send_tracking_queue, kwargs={"url": url, "queue_file": queue_file}, daemon=True)
+    sender.start()
+    return sender
+
 class InstallRecorder(SFDXBaseTask):
     
     
@@ -46,7 +191,7 @@ class InstallRecorder(SFDXBaseTask):
         }
      
     def _setprojectdefaults(self, instanceurl):
-        subprocess.run([f"sfdx config:set instanceUrl={instanceurl}"], shell=True, capture_output=True)
+        self.sfdx_env = get_sfdx_env(instanceurl)
 
     def _init_options(self, kwargs):
         super(SFDXBaseTask, self)._init_options(kwargs)
@@ -75,6 +220,8 @@ class InstallRecorder(SFDXBaseTask):
             else:
                 self.logger.info(f"Existing Ambient Transient Key Found::{self.org_config.qbrix_ambient_tracking_id}")
                 
+            # atexit runs handlers in reverse, so the sender wait is registered first to run after the exit handler
+            atexit.register(self._waitforsender)
             atexit.register(self._exithandler)
         except:
             print('No Tracking')
@@ -182,40 +329,7 @@ class InstallRecorder(SFDXBaseTask):
             self.trackingdata["qbrix_image_id"]=""
             
             
-            orginzationdata = self._salesforce_query("select Id,CreatedDate,OrganizationType,InstanceName from Organization")
-            if(not orginzationdata is None):
-                self.trackingdata["orgid"] = orginzationdata["result"]["records"][0]["Id"]
-                self.trackingdata["orgcreatedate"] = orginzationdata["result"]["records"][0]["CreatedDate"]
-                self.trackingdata["organizationtype"] = orginzationdata["result"]["records"][0]["OrganizationType"]
-                self.trackingdata["instancename"] = orginzationdata["result"]["records"][0]["InstanceName"]
-            else:
-                self.trackingdata["orgid"] = ""
-                self.trackingdata["orgcreatedate"] = ""
-                self.trackingdata["organizationtype"] = ""
-                self.trackingdata["instancename"] = ""
-
-            
-            
-            currentuserdata = self._salesforce_query(f"select Email from User where username='{self.org_config.username}'")
-            if(not currentuserdata is None):
-                self.trackingdata["installuseremail"] = currentuserdata["result"]["records"][0]["Email"]
-            else:
-                self.trackingdata["installuseremail"] = ""
-                
-            qlaborgdata = self._salesforce_query("select Identifier__c,Org_Type__c from QLabs__mdt")
-            if(not qlaborgdata is None):
-                self.trackingdata["qlabsorgidentifier"] = qlaborgdata["result"]["records"][0]["Identifier__c"]
-                self.trackingdata["qlabsorgtype"] = qlaborgdata["result"]["records"][0]["Org_Type__c"]
-            else:
-                self.trackingdata["qlabsorgidentifier"] = ""
-                self.trackingdata["qlabsorgtype"] = ""
-            
-                
-            maxapiversion =self._get_org_max_api_version()
-            if(not maxapiversion is None):
-                self.trackingdata["maxapiversion"] = maxapiversion
-            else:
-                self.trackingdata["maxapiversion"] = 0.0
+            self.trackingdata.update(self._get_org_details())
             
             
             self.__writertrackingtofile()
@@ -226,59 +340,91 @@ class InstallRecorder(SFDXBaseTask):
         #Fake error
         #raise Exception("fake error for testing")
         
-    def _get_org_max_api_version(self):
-
-        url = f"{self.instanceurl}/services/data/"
-        headers = {
-            'Authorization': f'Bearer {self.accesstoken}',
-            'Content-Type': 'application/json'
+    def _get_org_details(self):
+        """
+        Collects the org details for the tracking record in one pass over the shared org session.
+        The org versions endpoint gives the max API version, then the org, user and QLabs queries are sent together as one composite batch.
+
+        Returns:
+            dict: Tracking fields for the org. Fields which could not be read are left blank.
+        """
+
+        details = {
+            "orgid": "",
+            "orgcreatedate": "",
+            "organizationtype": "",
+            "instancename": "",
+            "installuseremail": "",
+            "qlabsorgidentifier": "",
+            "qlabsorgtype": "",
+            "maxapiversion": 0.0
         }
-        response = requests.request("GET", url, headers=headers)
-        data = json.loads(response.text)
-        
-        return float(data[-1]['version'])
-
-    def _salesforce_query(self,soql):
-        
-        if soql != "":
 
-            dx_command = f"sfdx force:data:soql:query -q \"{soql}\" --json "
-            subprocess.run(f"sfdx config:set instanceUrl={self.org_config.instance_url}", shell=True, capture_output=True)
-            if isinstance(self.org_config, ScratchOrgConfig):
-                dx_command += " -u {username}".format(username=self.org_config.username)
-            else:
-                dx_command += " -u {username}".format(username=self.org_config.access_token)
-
-            result = subprocess.run(dx_command, shell=True, capture_output=True)
-            subprocess.run("sfdx config:unset instanceUrl", shell=True, capture_output=True)
-            
-            if result.returncode > 0:
+        start_time = time.time()
+        session = get_org_session(self.org_config, self.project_config.project__package__api_version, self.accesstoken, self.instanceurl)
 
-                if result.stderr:
-                    error_detail = result.stderr.decode("UTF-8")
-                    self.logger.error(f"Salesforce Query Error - Details: {error_detail}")
-                else:
-                    self.logger.error("Salesforce Query Failed, although no error detail was returned.")
-
-                return None
-                
-            json_result = json.loads(result.stdout)
-            self.logger.info(json_result)
-            return json_result
-        
+        try:
+            response = session.get("/services/data/", timeout=ORG_QUERY_TIMEOUT)
+            response.raise_for_status()
+            details["maxapiversion"] = float(response.json()[-1]['version'])
+        except (requests.exceptions.RequestException, ValueError, KeyError, IndexError) as e:
+            self.logger.error(f"Unable to read org API versions: {e}")
+            return details
+
+        queries = [
+            "select Id,CreatedDate,OrganizationType,InstanceName from Organization",
+            f"select Email from User where username='{self.org_config.username}'",
+            "select Identifier__c,Org_Type__c from QLabs__mdt"
+        ]
+        api_version = f"v{details['maxapiversion']:.1f}"
+        batch_request = {
+            "batchRequests": [
+                {"method": "GET", "url": f"{api_version}/query?{requests.compat.urlencode({'q': soql})}"}
+                for soql in queries
+            ]
+        }
 
-        return None
+        try:
+            response = session.post(f"/services/data/{api_version}/composite/batch", json=batch_request, timeout=ORG_QUERY_TIMEOUT)
+            response.raise_for_status()
+            results = response.json().get("results", [])
+        except (requests.exceptions.RequestException, ValueError) as e:
+            self.logger.error(f"Salesforce Query Error - Details: {e}")
+            return details
+
+        records = []
+        for soql, result in zip(queries, results):
+            if result.get("statusCode") == 200 and result.get("result", {}).get("records"):
+                records.append(result["result"]["records"][0])
+            else:
+                self.logger.info(f"No result for query: {soql}")
+                records.append(None)
+
+        organization, user, qlabs = (records + [None, None, None])[:3]
+        if organization:
+            details["orgid"] = organization["Id"]
+            details["orgcreatedate"] = organization["CreatedDate"]
+            details["organizationtype"] = organization["OrganizationType"]
+            details["instancename"] = organization["InstanceName"]
+        if user:
+            details["installuseremail"] = user["Email"]
+        if qlabs:
+            details["qlabsorgidentifier"] = qlabs["Identifier__c"]
+            details["qlabsorgtype"] = qlabs["Org_Type__c"]
+
+        self.logger.info(f"Org details collected in {time.time() - start_time:.2f}s")
+        return details
  
  
     def _getlastccierror(self):
+        # Reads the last traceback from the CumulusCI log directly, rather than starting cci error info on exit
         try:
-            result = subprocess.run("cci error info", shell=True, capture_output=True)
-            if result.stderr:
-                 return "Unable to access last CCI error info"
-            else:
-                return result.stdout.decode("UTF-8")
+            logfile_path = get_logfile_path()
+            if not logfile_path.is_file():
+                return f"No logfile found at: {logfile_path}"
+            return get_traceback(logfile_path.read_text(encoding="utf-8"))
         except:
-            return ""
+            return "Unable to access last CCI error info"
 
     def __writertrackingtofile(self):
         if(self.project_config.project__name in self.trackingdata or self.trackingdata is None):
@@ -310,15 +456,32 @@ class InstallRecorder(SFDXBaseTask):
             raise CommandException(message)
 
 
-    def _recordtracking(self):
+    def _recordtracking(self, at_exit=False):
         
         if(self.trackingdata is None):
             return
         
-        url = "https://qbrix-core.herokuapp.com/qbrix/InstallTracking"
-        payload = json.dumps(self.trackingdata )
-        response = requests.request("POST", url, data=payload, verify=True)
-        print(response.text)
+        # Queue the record and send it. Records which fail to send are retried on the next run.
+        try:
+            spool_tracking_record(self.trackingdata)
+        except Exception as e:
+            self.logger.info(f"Unable to queue install tracking: {e}")
+            return
+
+        try:
+            if at_exit:
+                # New threads cannot be started at interpreter shutdown, so make one short attempt in this thread. Anything else is sent on the next run
+                send_tracking_queue(max_records=TRACKING_EXIT_MAX_RECORDS, timeout=TRACKING_EXIT_TIMEOUT)
+            else:
+                self._sender = start_tracking_sender()
+        except Exception as e:
+            self.logger.info(f"Unable to send install tracking, it will be sent on the next run: {e}")
+
+    def _waitforsender(self):
+        # Give the background sender a short window at exit, so a slow endpoint never holds up the process
+        sender = getattr(self, "_sender", None)
+        if sender is not None and sender.is_alive():
+            sender.join(TRACKING_EXIT_WAIT_SECONDS)
 
      
     def _exithandler(self):
@@ -334,21 +497,21 @@ class InstallRecorder(SFDXBaseTask):
                 self.trackingdata["status"]="Failed"
                 self.trackingdata["lasterror"]=self._getlastccierror()
                 self.__writertrackingtofile()
-                self._recordtracking()
+                self._recordtracking(at_exit=True)
                 
             elif self._hooks.exception is not None:
                 print("death by exception: %s" % self._hooks.exception)
                 self.trackingdata["status"]="Failed"
                 self.trackingdata["lasterror"]=self._getlastccierror()
                 self.__writertrackingtofile()
-                self._recordtracking()
+                self._recordtracking(at_exit=True)
                 
             else:
                 print("natural death")
                 self.trackingdata["status"]="Completed"
                 self.trackingdata["lasterror"]=""
                 self.__writertrackingtofile()
-                self._recordtracking()
+                self._recordtracking(at_exit=True)
                             
             self.logger.info('Exit Handler Exit')
 
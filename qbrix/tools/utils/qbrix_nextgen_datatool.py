@@ -4,11 +4,11 @@ import requests
 
 from abc import ABC
 from abc import abstractmethod
+from concurrent.futures import ThreadPoolExecutor
 from cumulusci.core.tasks import BaseTask
 from cumulusci.tasks.sfdx import SFDXBaseTask
 from qbrix.tools.shared.qbrix_console_utils import init_logger
 from cumulusci.core.config import ScratchOrgConfig
-from qbrix.salesforce.qbrix_salesforce_tasks import salesforce_query
 from cumulusci.core.keychain import BaseProjectKeychain
 
 
@@ -30,6 +30,14 @@ class RunDataTool(SFDXBaseTask):
             "description": "If defined, this is the total amount of time in seconds which the script will wait between each data load. If only one data collection is defined, this will be the wait time after the data load has completed.",
             "required": False
         },
+        "max_concurrent_jobs": {
+            "description": "Maximum number of data collections to load at the same time. Defaults to 1, which loads them one at a time in the order listed. Only raise this when the data collections do not depend on each other, e.g. no lookups from one collection to records loaded by another.",
+            "required": False
+        },
+        "sequential": {
+            "description": "When True, data collections are loaded one at a time in the order listed, whatever max_concurrent_jobs is set to. Defaults to False.",
+            "required": False
+        },
         "org": {
             "description": "org alias",
             "required": False
@@ -88,6 +96,10 @@ class RunDataTool(SFDXBaseTask):
         self.data_keys = self.options["data_keys"]
         self.total_timeout = int(self.options["total_timeout"]) if "total_timeout" in self.options else 8600
         self.wait = int(self.options["wait"]) if "wait" in self.options else 2
+        self.sequential = str(self.options.get("sequential") or False).lower() == "true"
+        self.max_concurrent_jobs = 1 if self.sequential else max(int(self.options.get("max_concurrent_jobs") or 1), 1)
+        self.min_poll_seconds = 2
+        self.max_poll_seconds = 30
 
     def _run_task(self):
 
@@ -99,12 +111,11 @@ class RunDataTool(SFDXBaseTask):
                 "NextGen Data Tool: Error, there were no data collection keys were passed! Please check your task definition and add the correct data keys.")
             raise Exception("No Data Keys Passed! Data Load Failed.")
 
-        data_load_job_counter = 1
+        run_start_time = time.time()
         total_keys = len(self.data_keys)
 
-        # Get Email from target org
-        email_address = salesforce_query(
-            f"SELECT Email From User Where Username = '{self.org_config.username}' LIMIT 1", self.org_config)
+        # Get Email from target org, using the org's existing API session
+        email_address = self._get_user_email()
         if email_address is None or email_address == "":
             raise Exception("Unable to get email address from the target org. Stopping Data Load.")
 
@@ -113,111 +124,150 @@ class RunDataTool(SFDXBaseTask):
         if self.org_config.is_sandbox:
             IsScratchOrg = True
 
-        for data_key in self.data_keys:
-
-            # Set Start Time of Job
-            st = time.time()
-            self.logger.info(f"NextGen Data Tool: Processing Data Load {data_load_job_counter} of {total_keys}")
+        if self.total_timeout < 500 or self.total_timeout > 8600:
+            self.total_timeout = 8600
 
+        pending = []
+        for data_load_job_counter, data_key in enumerate(self.data_keys, start=1):
             # Check for missing Data Collection Key
             if data_key is None or data_key == "":
                 self.logger.error(
                     f"NextGen Data Tool: Invalid or missing Data Collection ID. Skipping Job {data_load_job_counter} of {total_keys}.")
                 continue
+            pending.append((data_load_job_counter, data_key))
 
-            # Start Data Load and get Job ID
-            headers = {"Content-Type": "application/json; charset=utf-8"}
-            data = {
-                "username": self.org_config.username,
-                "email": email_address,
-                "collection_version_id": f"{data_key}",
-                "is_production": not IsScratchOrg,
-                "instance_url": self.instanceurl,
-                "access_token": self.accesstoken
-            }
-            
-            #self.logger.info(data)
+        session = requests.Session()
+        active_jobs = {}
+        completed_jobs = 0
+        poll_seconds = self.min_poll_seconds
 
-            self.logger.info(
-                f"NextGen Data Tool: Starting Job\n\nRequesting Data Job with the following configuration:\n\nData Collection ID: {data_key}\nUsername: {self.org_config.username}\nEmail: {email_address}\nScratch Org Mode: {IsScratchOrg}\n")
-            result = requests.post(self.url, json=data, headers=headers)
-            jsonResponse = result.json()
+        with ThreadPoolExecutor(max_workers=self.max_concurrent_jobs) as executor:
+            while pending or active_jobs:
 
-            if jsonResponse is not None:
-                job_id = jsonResponse["id"]
-                self.logger.info(f"NextGen Data Tool: Data Load started with ID {job_id}")
-            else:
-                self.logger.error(
-                    f"NextGen Data Tool: Error the job failed to start. This could be due to network issues or issues with the NextGen Data Load host.")
-                raise Exception("Data Load Job Failed to start.")
+                # Start as many data loads as the concurrency limit allows
+                to_submit = pending[:self.max_concurrent_jobs - len(active_jobs)]
+                pending = pending[len(to_submit):]
+                for job in executor.map(lambda item: self._submit_job(session, item[0], total_keys, item[1], email_address, IsScratchOrg), to_submit):
+                    active_jobs[job["id"]] = job
 
-            job_status_check_url = f"{self.url}/{job_id}"
+                sleep(poll_seconds)
 
-            # Check job for status updates
-            timeout = 0
-            total_retries = 0
+                # Check every outstanding job in one pass
+                job_states = list(executor.map(lambda job_id: (job_id, self._get_job_status(session, active_jobs[job_id])), list(active_jobs)))
 
-            if self.total_timeout < 500 or self.total_timeout > 8600:
-                self.total_timeout = 8600
+                finished = False
+                for job_id, check_job_json in job_states:
+                    job = active_jobs[job_id]
 
-            self.logger.info(f'JOB STATUS URL:: {job_status_check_url}')
-            while True:
+                    # Handle Timeout
+                    if time.time() - job["start"] > self.total_timeout:
+                        self.logger.error(
+                            f"NextGen Data Tool: Error Data Load Timeout Reached (Timeout set at {self.total_timeout} seconds)")
+                        raise Exception("Data Load timed out. Data load failed.")
 
-                # Get Job Status
-                check_job = requests.get(job_status_check_url)
+                    if check_job_json is None:
+                        continue
+
+                    status = check_job_json["state"]
+                    progress = check_job_json["progress"]
+                    status_update = "Waiting to start."
+
+                    if isinstance(progress, dict):
+                        status_update = f"Running - {progress['progress']}%"
 
-                # print("\nResult\n")
-                # print(check_job.json())
+                    if status == "completed":
+                        elapsed_time = time.time() - job["start"]
+                        self.logger.info(f"Job Complete! Data Load {job['counter']} of {total_keys}. Total Time: " + time.strftime("%H:%M:%S", time.gmtime(elapsed_time)))
+                        del active_jobs[job_id]
+                        completed_jobs += 1
+                        finished = True
+                        continue
 
-                # Handle issues with job status
-                if check_job.json() is None:
-                    if total_retries > 3:
-                        self.logger.error("NextGen Data Tool: Unable to lookup job status. Check your internet connection.")
-                        raise Exception("NextGen Data Tool Job Failed")
-                    else:
-                        total_retries += 1
-                        log.debug(
-                            f"NextGen Data Tool: Unable to lookup job status. Waiting 5 seconds and then retrying... retry attempt {total_retries}")
-                        sleep(5)
+                    if status == "active":
+                        self.logger.info(f"NextGen Data Tool: Job ID {job_id}. {status_update}")
                         continue
 
-                # Handle Timeout
-                if timeout > self.total_timeout:
-                    self.logger.error(
-                        f"NextGen Data Tool: Error Data Load Timeout Reached (Timeout set at {self.total_timeout} seconds)")
-                    raise Exception("Data Load timed out. Data load failed.")
-
-                check_job_json = check_job.json()
-                
-                #self.logger.info(check_job_json)
-                
-                status = check_job_json["state"]
-                progress = check_job_json["progress"]
-                status_update = "Waiting to start."
-
-                if isinstance(progress, dict):
-                    status_update = f"Running - {progress['progress']}%"
-
-                if status == "completed":
-                    et = time.time()
-                    elapsed_time = et - st
-                    self.logger.info(f"Job Complete! Total Time: " + time.strftime("%H:%M:%S", time.gmtime(elapsed_time)))
-                    break
-
-                if status == "active":
-                    self.logger.info(f"NextGen Data Tool: Job ID {job_id}. {status_update}")
-
-                if status == "failed":
-                    self.logger.error(f"The data load job has failed. Job ID: {job_id}")
-                    self.logger.error(check_job_json)
-                    raise Exception("Data Load Failed")
-
-                if status != "active" and status != "completed":
+                    if status == "failed":
+                        self.logger.error(f"The data load job has failed. Job ID: {job_id}")
+                        self.logger.error(check_job_json)
+                        raise Exception("Data Load Failed")
+
                     self.logger.error(f"NextGen Data Tool: Unsupported status ({status}) read. Stopping deployment")
                     raise Exception("Data Load Failed. An unsupported status was received from the NextGen Data Tool.")
 
-                sleep(5)
-                timeout += 1
+                if finished:
+                    # Start polling quickly again for newly submitted jobs
+                    poll_seconds = self.min_poll_seconds
+                    if pending:
+                        sleep(self.wait)
+                else:
+                    poll_seconds = min(poll_seconds * 2, self.max_poll_seconds)
 
-            data_load_job_counter += 1
+        if completed_jobs:
             sleep(self.wait)
+
+        self.logger.info(f"NextGen Data Tool: Loaded {completed_jobs} of {total_keys} data collections. Total Time: " + time.strftime("%H:%M:%S", time.gmtime(time.time() - run_start_time)))
+
+    def _get_user_email(self):
+        try:
+            result = self.org_config.salesforce_client.query(
+                f"SELECT Email From User Where Username = '{self.org_config.username}' LIMIT 1")
+        except Exception as e:
+            self.logger.error(f"NextGen Data Tool: Unable to query the target org user. {e}")
+            return None
+
+        if result.get("records"):
+            return result["records"][0]["Email"]
+        return None
+
+    def _submit_job(self, session, data_load_job_counter, total_keys, data_key, email_address, IsScratchOrg):
+
+        self.logger.info(f"NextGen Data Tool: Processing Data Load {data_load_job_counter} of {total_keys}")
+
+        # Start Data Load and get Job ID
+        headers = {"Content-Type": "application/json; charset=utf-8"}
+        data = {
+            "username": self.org_config.username,
+            "email": email_address,
+            "collection_version_id": f"{data_key}",
+            "is_production": not IsScratchOrg,
+            "instance_url": self.instanceurl,
+            "access_token": self.accesstoken
+        }
+
+        self.logger.info(
+            f"NextGen Data Tool: Starting Job\n\nRequesting Data Job with the following configuration:\n\nData Collection ID: {data_key}\nUsername: {self.org_config.username}\nEmail: {email_address}\nScratch Org Mode: {IsScratchOrg}\n")
+        st = time.time()
+        result = session.post(self.url, json=data, headers=headers, timeout=120)
+        jsonResponse = result.json()
+
+        if jsonResponse is not None:
+            job_id = jsonResponse["id"]
+            self.logger.info(f"NextGen Data Tool: Data Load started with ID {job_id}")
+        else:
+            self.logger.error(
+                f"NextGen Data Tool: Error the job failed to start. This could be due to network issues or issues with the NextGen Data Load host.")
+            raise Exception("Data Load Job Failed to start.")
+
+        job_status_check_url = f"{self.url}/{job_id}"
+        self.logger.info(f'JOB STATUS URL:: {job_status_check_url}')
+
+        return {"id": job_id, "counter": data_load_job_counter, "url": job_status_check_url, "start": st, "retries": 0}
+
+    def _get_job_status(self, session, job):
+
+        # Handle issues with job status
+        try:
+            check_job_json = session.get(job["url"], timeout=60).json()
+        except (requests.exceptions.RequestException, ValueError):
+            check_job_json = None
+
+        if check_job_json is None:
+            if job["retries"] > 3:
+                self.logger.error("NextGen Data Tool: Unable to lookup job status. Check your internet connection.")
+                raise Exception("NextGen Data Tool Job Failed")
+            job["retries"] += 1
+            log.debug(
+                f"NextGen Data Tool: Unable to lookup job status. Retrying on the next check... retry attempt {job['retries']}")
+
+        return check_job_json
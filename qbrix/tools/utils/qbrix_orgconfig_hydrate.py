@@ -1,6 +1,5 @@
 import os
 import json
-import requests
 import glob
 import subprocess
 
@@ -9,6 +8,7 @@ from cumulusci.core.config import ScratchOrgConfig
 from cumulusci.tasks.sfdx import SFDXBaseTask
 from cumulusci.core.exceptions import CommandException
 from cumulusci.core.keychain import BaseProjectKeychain
+from qbrix.core.qbrix_org_session import get_org_session, get_sfdx_env
 
 
 class NGSFDXWrapper(SFDXBaseTask):
@@ -76,7 +76,7 @@ class NGSFDXWrapper(SFDXBaseTask):
             self.targetusername = self.options["targetusername"]
             
         
-        subprocess.run(f"sfdx config:set instanceUrl={self.org_config.instance_url}", shell=True, capture_output=True)
+        self.sfdx_env = get_sfdx_env(self.org_config.instance_url)
 
         
         
@@ -84,13 +84,11 @@ class NGSFDXWrapper(SFDXBaseTask):
     def _run_task(self):
         self._prepruntime()
         cmd = f"sfdx {self.command} --target-org '{self.targetusername}'"
-        p= subprocess.Popen(cmd,stdout=subprocess.PIPE, stderr=subprocess.PIPE, bufsize=1,universal_newlines=True,shell=True)
+        p= subprocess.Popen(cmd,stdout=subprocess.PIPE, stderr=subprocess.PIPE, bufsize=1,universal_newlines=True,shell=True,env=self.sfdx_env)
         (out, err)=p.communicate()
         self.logger.info(out)
         self.logger.error(err)
         
-        subprocess.run("sfdx config:unset instanceUrl", shell=True, capture_output=True)
-        
         if p.returncode != 0:
             raise subprocess.CalledProcessError(p.returncode, f"SFDX Command Failed:: {cmd} ")
         
@@ -330,40 +328,19 @@ class NGOrgConfig(SFDXBaseTask):
 
     def _is_qbrix_installed(self, qbrixname):
 
-        url = f"{self.instanceurl}/services/data/v56.0/query/?q=select+MasterLabel+from+xDO_Base_QBrix_Register__mdt+where+MasterLabel='{qbrixname}'"
-        headers = {
-            'Authorization': f'Bearer {self.accesstoken}',
-            'Content-Type': 'application/json'
-        }
-        response = requests.request("GET", url, headers=headers)
-        # print(response.text)
-        data = json.loads(response.text)
+        data = self._query(f"select MasterLabel from xDO_Base_QBrix_Register__mdt where MasterLabel='{qbrixname}'")
         self.logger.info(data["totalSize"])
         return data["totalSize"] == 1
     
     def _is_package_namespace_installed(self, namespace):
 
-        url = f"{self.instanceurl}/services/data/v56.0/query/?q=select+NamespacePrefix+from+PackageLicense+where+NamespacePrefix='{namespace}'"
-        headers = {
-            'Authorization': f'Bearer {self.accesstoken}',
-            'Content-Type': 'application/json'
-        }
-        response = requests.request("GET", url, headers=headers)
-        # print(response.text)
-        data = json.loads(response.text)
+        data = self._query(f"select NamespacePrefix from PackageLicense where NamespacePrefix='{namespace}'")
         self.logger.info(data["totalSize"])
         return data["totalSize"] == 1
     
     def _is_package_installed(self, packagename):
 
-        url = f"{self.instanceurl}/services/data/v56.0/tooling/query/?q=select+SubscriberPackage.Name+from+InstalledSubscriberPackage+order+by+SubscriberPackage.Name"
-        headers = {
-            'Authorization': f'Bearer {self.accesstoken}',
-            'Content-Type': 'application/json'
-        }
-        response = requests.request("GET", url, headers=headers)
-        # print(response.text)
-        data = json.loads(response.text)
+        data = self._query(f"select SubscriberPackage.Name from InstalledSubscriberPackage order by SubscriberPackage.Name", tooling=True)
         for pkg in data['records']:
             if(pkg['SubscriberPackage']['Name']==packagename):
                 return True
@@ -380,14 +357,7 @@ class NGOrgConfig(SFDXBaseTask):
         
         #SELECT  QualifiedApiName FROM EntityDefinition Where QualifiedApiName=
 
-        url = f"{self.instanceurl}/services/data/v56.0/query/?q=select+QualifiedApiName+from+EntityDefinition+where+QualifiedApiName='{targetobject}' LIMIT 1"
-        headers = {
-            'Authorization': f'Bearer {self.accesstoken}',
-            'Content-Type': 'application/json'
-        }
-        response = requests.request("GET", url, headers=headers)
-        # print(response.text)
-        data = json.loads(response.text)
+        data = self._query(f"select QualifiedApiName from EntityDefinition where QualifiedApiName='{targetobject}' LIMIT 1")
         self.logger.info(data["totalSize"])
         return data["totalSize"] == 1
     
@@ -399,26 +369,16 @@ class NGOrgConfig(SFDXBaseTask):
         
         self.logger.info(f"_is_data_present_in_org::ttargetobject::{targetobject}::filter::{filter}")
         
-        url=""
-        querytarget="query"
-        if(tooling):
-            querytarget="tooling/query"
-        
-        
         if(not filter is None):
-            url = f"{self.instanceurl}/services/data/v56.0/{querytarget}/?q=select+Id+from+{targetobject}+where+({filter})"
+            soql = f"select Id from {targetobject} where ({filter})"
         else:
-            url = f"{self.instanceurl}/services/data/v56.0/{querytarget}/?q=select+Id+from+{targetobject}"
+            soql = f"select Id from {targetobject}"
             
-        self.logger.info(f"url::{url}")
+        # Filters were previously placed straight into the query string, where "+" reads as a space
+        soql = soql.replace("+", " ")
+        self.logger.info(f"soql::{soql}")
         
-        headers = {
-            'Authorization': f'Bearer {self.accesstoken}',
-            'Content-Type': 'application/json'
-        }
-        response = requests.request("GET", url, headers=headers)
-        
-        data = json.loads(response.text)
+        data = self._query(soql, tooling=tooling)
         #self.logger.info(data)
         self.logger.info(data["totalSize"])
         return data["totalSize"] > 0
@@ -433,14 +393,7 @@ class NGOrgConfig(SFDXBaseTask):
         #e.g. 
         #SELECT  id,MasterLabel,DeveloperName from PermissionSetLicense where (Masterlabel='OmniStudioDesigner' or DeveloperName='OmniStudioDesigner')
 
-        url = f"{self.instanceurl}/services/data/v56.0/query/?q=select+Id+from+PermissionSetLicense+where+(Masterlabel='{psl}'+or+DeveloperName='{psl}')+LIMIT+1"
-        headers = {
-            'Authorization': f'Bearer {self.accesstoken}',
-            'Content-Type': 'application/json'
-        }
-        response = requests.request("GET", url, headers=headers)
-        # print(response.text)
-        data = json.loads(response.text)
+        data = self._query(f"select Id from PermissionSetLicense where (Masterlabel='{psl}' or DeveloperName='{psl}') LIMIT 1")
         self.logger.info(data["totalSize"])
         return data["totalSize"] == 1
     
@@ -454,14 +407,7 @@ class NGOrgConfig(SFDXBaseTask):
         #self.logger.info(qty)
         #self.logger.info(type(qty))
         
-        url = f"{self.instanceurl}/services/data/v56.0/query/?q=select+Id,TotalLicenses,UsedLicenses+from+PermissionSetLicense+where+(Masterlabel='{psl}'+or+DeveloperName='{psl}')+LIMIT+1"
-        headers = {
-            'Authorization': f'Bearer {self.accesstoken}',
-            'Content-Type': 'application/json'
-        }
-        response = requests.request("GET", url, headers=headers)
-        #self.logger.info(response.text)
-        data = json.loads(response.text)
+        data = self._query(f"select Id,TotalLicenses,UsedLicenses from PermissionSetLicense where (Masterlabel='{psl}' or DeveloperName='{psl}') LIMIT 1")
         #self.logger.info(data["totalSize"])
         if data["totalSize"] == 0:
             return False
@@ -518,14 +464,7 @@ class NGOrgConfig(SFDXBaseTask):
         #e.g. 
         #SELECT  id,MasterLabel,DeveloperName from PermissionSet where (Name='OmniStudioDesigner' or Label='OmniStudioDesigner')
 
-        url = f"{self.instanceurl}/services/data/v56.0/query/?q=select+Id+from+PermissionSet+where+(Name='{ps}'+or+Label='{ps}')+LIMIT+1"
-        headers = {
-            'Authorization': f'Bearer {self.accesstoken}',
-            'Content-Type': 'application/json'
-        }
-        response = requests.request("GET", url, headers=headers)
-        # print(response.text)
-        data = json.loads(response.text)
+        data = self._query(f"select Id from PermissionSet where (Name='{ps}' or Label='{ps}') LIMIT 1")
         self.logger.info(data["totalSize"])
         return data["totalSize"] == 1
     
@@ -548,14 +487,7 @@ class NGOrgConfig(SFDXBaseTask):
         try:
             #e.g. 
             #SDO or GUID
-            url = f"{self.instanceurl}/services/data/v56.0/query/?q=select+Id+from+QLabs__mdt+where+(Org_Type__c='{identifier}')+LIMIT+1"
-            headers = {
-                'Authorization': f'Bearer {self.accesstoken}',
-                'Content-Type': 'application/json'
-            }
-            response = requests.request("GET", url, headers=headers)
-            # print(response.text)
-            data = json.loads(response.text)
+            data = self._query(f"select Id from QLabs__mdt where (Org_Type__c='{identifier}') LIMIT 1")
             self.logger.info(data["totalSize"])
             return data["totalSize"] == 1
         except:
@@ -570,14 +502,7 @@ class NGOrgConfig(SFDXBaseTask):
         try:
             #e.g. 
             #SDO or GUID
-            url = f"{self.instanceurl}/services/data/v56.0/query/?q=select+Id+from+QLabs__mdt+where+(Identifier__c='{identifier}')+LIMIT+1"
-            headers = {
-                'Authorization': f'Bearer {self.accesstoken}',
-                'Content-Type': 'application/json'
-            }
-            response = requests.request("GET", url, headers=headers)
-            # print(response.text)
-            data = json.loads(response.text)
+            data = self._query(f"select Id from QLabs__mdt where (Identifier__c='{identifier}') LIMIT 1")
             self.logger.info(data["totalSize"])
             return data["totalSize"] == 1
         except:
@@ -590,16 +515,16 @@ class NGOrgConfig(SFDXBaseTask):
 
     def _get_org_max_api_version(self):
 
-        url = f"{self.instanceurl}/services/data/"
-        headers = {
-            'Authorization': f'Bearer {self.accesstoken}',
-            'Content-Type': 'application/json'
-        }
-        response = requests.request("GET", url, headers=headers)
-        data = json.loads(response.text)
+        data = self._get_org_session().get("/services/data/").json()
         
         return float(data[-1]['version'])
 
+    def _get_org_session(self):
+        return get_org_session(self.org_config, self.project_config.project__package__api_version, self.accesstoken, self.instanceurl)
+
+    def _query(self, soql, tooling=False):
+        return self._get_org_session().query(soql, tooling=tooling)
+
     def _run_task(self):
 
         self._prepruntime()
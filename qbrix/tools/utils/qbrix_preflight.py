@@ -1,6 +1,8 @@
 import json
 import os
+import time
 from abc import ABC
+from concurrent.futures import ThreadPoolExecutor
 
 import requests
 from cumulusci.core.exceptions import CommandException
@@ -8,7 +10,7 @@ from cumulusci.core.keychain import BaseProjectKeychain
 from cumulusci.core.tasks import BaseTask
 from cumulusci.core.config import ScratchOrgConfig, TaskConfig
 from qbrix.tools.shared.qbrix_console_utils import init_logger
-from qbrix.salesforce.qbrix_salesforce_tasks import QbrixInstallCheck
+from qbrix.salesforce.qbrix_salesforce_tasks import get_installed_qbrix, is_qbrix_installed
 from qbrix.tools.shared.qbrix_cci_tasks import run_cci_task, run_cci_flow
 from qbrix.tools.shared.qbrix_project_tasks import run_command
 from qbrix.tools.utils.qbrix_orgconfig_hydrate import NGOrgConfig
@@ -89,7 +91,7 @@ class RunPreflight(BaseTask, ABC):
         # Check if Q Brix Registration is already installed
         self.logger.info(f"\nPREFLIGHT TASK: Check Q Brix Register is deployed in org with alias {self.org_config.name}")
 
-        if not QbrixInstallCheck("QBrix-1-xDO-Tool-QBrixRegister", self.org_config):
+        if not is_qbrix_installed("QBrix-1-xDO-Tool-QBrixRegister", self.installed_qbrix):
             self.logger.info(f" -> Deploying Q Brix Registration to Org {self.org_config.name}")
             checkreg_deploy_result = run_cci_task("base:check_register", self.org_config.name)
             if checkreg_deploy_result:
@@ -100,7 +102,7 @@ class RunPreflight(BaseTask, ABC):
     def deploy_base_config_and_data(self):
         self.logger.info(f"\nPREFLIGHT TASK: Deploy Base Config and Base Data to org with alias {self.org_config.name}")
 
-        if not QbrixInstallCheck("QBrix-0-xDO-BaseConfig", self.org_config):
+        if not is_qbrix_installed("QBrix-0-xDO-BaseConfig", self.installed_qbrix):
             self.logger.info(" -> Deploying Q Brix Base Config")
             deploy_result = run_cci_flow(f"base:deploy_qbrix", self.org_config.name)
 
@@ -112,7 +114,7 @@ class RunPreflight(BaseTask, ABC):
             self.logger.info(" -> Q Brix Base Config Deployed")
 
         if not self.only_base_config:
-            if not QbrixInstallCheck("QBrix-0-xDO-BaseData", self.org_config):
+            if not is_qbrix_installed("QBrix-0-xDO-BaseData", self.installed_qbrix):
                 self.logger.info(" -> Installing Q Brix Base Data")
                 deploy_result = run_cci_flow(f"base:deploy_qbrix_base_data", self.org_config.name)
 
@@ -138,29 +140,52 @@ class RunPreflight(BaseTask, ABC):
         # Check and deploy Q Brix Register
         self.deploy_qbrix_register()
 
+    def hydrate_org_config(self):
+        self.logger.info("\nPREFLIGHT TASK: Running Org Config Hydrate")
+        hydrate = NGOrgConfig(
+            org_config=self.org_config,
+            project_config=self.project_config,
+            task_config=TaskConfig({"class_path": "qbrix.tools.utils.qbrix_orgconfig_hydrate.NGOrgConfig"})
+        )
+        hydrate._run_task()
+        self.logger.info(" -> Org Config Hydrated!")
+
+    def run_org_checks(self):
+        """
+        Runs the read-only checks against the target org at the same time. The installed Q Brix are read once into a snapshot, which the later install checks share.
+        """
+
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            snapshot = executor.submit(get_installed_qbrix, self.org_config)
+            hydrate = executor.submit(self.hydrate_org_config) if not self.skip_hydrate else None
+
+            self.installed_qbrix = snapshot.result()
+            if hydrate:
+                # Raises any hydrate error here, before anything is changed in the org
+                hydrate.result()
+
+    def _run_phase(self, phase_name, phase):
+        start_time = time.time()
+        phase()
+        self.logger.info(f"PREFLIGHT: {phase_name} completed in {time.time() - start_time:.2f} seconds")
+
     def _run_task(self):
         self.logger.info("\nPREFLIGHT: Starting Q Brix Preflight Check")
+        start_time = time.time()
 
-        # Initial Q Brix Tasks
-        if not self.skip_hydrate:
-            self.logger.info("\nPREFLIGHT TASK: Running Org Config Hydrate")
-            hydrate = NGOrgConfig(
-                org_config=self.org_config,
-                project_config=self.project_config,
-                task_config=TaskConfig({"class_path": "qbrix.tools.utils.qbrix_orgconfig_hydrate.NGOrgConfig"})
-            )
-            hydrate._run_task()
-            self.logger.info(" -> Org Config Hydrated!")
+        # Read-only checks first, so org changes only start once they have all passed
+        self.logger.info("\nPREFLIGHT: Running Org Checks")
+        self._run_phase("Org Checks", self.run_org_checks)
 
         self.logger.info("\nPREFLIGHT: Running Shared Tasks, which apply to all Orgs")
-        self.shared_tasks()
+        self._run_phase("Shared Tasks", self.shared_tasks)
 
         # Other Tasks
         if self.scratch_org_mode:
             self.logger.info("\nPREFLIGHT: Running Scratch Org and Sandbox Related Tasks")
-            self.scratch_org_tasks()
+            self._run_phase("Scratch Org and Sandbox Tasks", self.scratch_org_tasks)
         else:
             self.logger.info("\nPREFLIGHT: Running Production Org Related Tasks")
-            self.production_org_tasks()
+            self._run_phase("Production Org Tasks", self.production_org_tasks)
 
-        self.logger.info("\nPREFLIGHT: Preflight Complete")
+        self.logger.info(f"\nPREFLIGHT: Preflight Complete in {time.time() - start_time:.2f} seconds")
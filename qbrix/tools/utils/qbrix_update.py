@@ -13,6 +13,15 @@ from qbrix.tools.shared.qbrix_project_tasks import (download_and_unzip,
                                                     replace_file_text)
 
 
+def copy_file_if_changed(src, dst):
+
+    """Copies a file only when the destination is missing or has different content, so unchanged project files are left untouched"""
+
+    if exists(dst) and filecmp.cmp(src, dst, shallow=False):
+        return dst
+    return shutil.copy2(src, dst)
+
+
 class QBrixUpdater(BaseTask, ABC):
 
     """Updates Q Brix Scripts along with any optional, custom updates"""
@@ -37,6 +46,10 @@ class QBrixUpdater(BaseTask, ABC):
         "IgnoreOptionalUpdates": {
             "description": "When set to True, will ignore updates defined as 'Optional' from the Q Branch Updates. Default is False.",
             "required": False
+        },
+        "ArchiveChecksum": {
+            "description": "Optional SHA256 checksum for the .zip file at the UpdateLocation. When set, the download is verified against it before any files are updated",
+            "required": False
         }
     }
 
@@ -45,6 +58,7 @@ class QBrixUpdater(BaseTask, ABC):
         self.ArchivePassword = self.options["ArchivePassword"] if "ArchivePassword" in self.options else None
         self.UpdateLocation = self.options["UpdateLocation"] if "UpdateLocation" in self.options else None
         self.IgnoreOptionalUpdates = self.options["IgnoreOptionalUpdates"] if "IgnoreOptionalUpdates" in self.options else False
+        self.ArchiveChecksum = self.options["ArchiveChecksum"] if "ArchiveChecksum" in self.options else None
 
     def _check_and_deploy_class(self, tasks: dict):
 
@@ -74,7 +88,7 @@ class QBrixUpdater(BaseTask, ABC):
         if exists(folder_path) and remove_existing:
                 shutil.rmtree(folder_path)
         update_path = os.path.join(update_dir, folder_path)
-        shutil.copytree(src=update_path, dst=folder_path, dirs_exist_ok=True)
+        shutil.copytree(src=update_path, dst=folder_path, dirs_exist_ok=True, copy_function=copy_file_if_changed)
         
     def _update_folder_indirect_source(self, folder_path, update_dir, remove_existing):
 
@@ -84,7 +98,7 @@ class QBrixUpdater(BaseTask, ABC):
         if exists(folder_path) and remove_existing:
                 shutil.rmtree(folder_path)
                 
-        shutil.copytree(src=update_dir, dst=folder_path, dirs_exist_ok=True)
+        shutil.copytree(src=update_dir, dst=folder_path, dirs_exist_ok=True, copy_function=copy_file_if_changed)
 
     def _ensure_required_dirs(self):
 
@@ -122,9 +136,7 @@ class QBrixUpdater(BaseTask, ABC):
             
             
 
-            # Finally Clean Up Cached Folder
-            self.logger.info(" -> Cleaning up temp files...")
-            shutil.rmtree(".qbrix/Update")
+            # The extracted update is kept in .qbrix/Update, so the next update only extracts the files which have changed
 
         self.logger.info(" -> Checking cumulusci.yml file...")
         
@@ -170,7 +182,8 @@ class QBrixUpdater(BaseTask, ABC):
             download_and_unzip(
                 self.UpdateLocation,
                 self.ArchivePassword,
-                self.IgnoreOptionalUpdates)
+                self.IgnoreOptionalUpdates,
+                checksum=self.ArchiveChecksum)
             self.logger.info(" -> Custom update complete")
 
         # Fixes for CumulusCI.yml
@@ -0,0 +1,100 @@
+import logging
+
+import pytest
+
+from qbrix.tools.utils import qbrix_batch_apex
+from qbrix.tools.utils.qbrix_batch_apex import RunAnonymousApexAndWait, wait_for_condition
+
+
+class FakeClock:
+
+    """ Stands in for the time module, so waits complete instantly and the requested delays can be checked """
+
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+class CountdownSession:
+
+    """ Simulates a count() query whose result drops by one on each poll until it reaches zero """
+
+    def __init__(self, start_count):
+        self.count = start_count
+        self.queries = []
+
+    def query(self, soql):
+        self.queries.append(soql)
+        result = {"totalSize": self.count, "records": []}
+        self.count = max(self.count - 1, 0)
+        return result
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake_clock = FakeClock()
+    monkeypatch.setattr(qbrix_batch_apex, "time", fake_clock)
+    return fake_clock
+
+
+def make_wait_task(session, waitseconds=10, maxwaithchecks=5):
+    task = RunAnonymousApexAndWait.__new__(RunAnonymousApexAndWait)
+    task.logger = logging.getLogger(__name__)
+    task.options = {}
+    task.session = session
+    task.waitseconds = waitseconds
+    task.maxwaithchecks = maxwaithchecks
+    task.waitscript = None
+    return task
+
+
+def test_wait_for_condition_backs_off_until_condition_holds(clock):
+    results = iter([False, False, False, True])
+
+    completed, waited = wait_for_condition(lambda: next(results), max_wait_seconds=100, initial_delay=2, max_delay=60)
+
+    assert completed
+    assert clock.sleeps == [2, 4, 8, 16]
+    assert waited == 30
+
+
+def test_wait_for_condition_caps_delay_and_stops_at_budget(clock):
+    polls = []
+
+    completed, waited = wait_for_condition(lambda: polls.append(1) and False, max_wait_seconds=20, initial_delay=2, max_delay=5)
+
+    assert not completed
+    assert clock.sleeps == [2, 4, 5, 5, 4]
+    assert len(polls) == 5
+    assert waited == 20
+
+
+def test_wait_for_zero_count_polls_countdown_with_backoff(clock):
+    session = CountdownSession(start_count=4)
+    task = make_wait_task(session, waitseconds=10)
+
+    completed, waited = task._wait_for_zero_count("SELECT count() FROM AsyncApexJob")
+
+    assert completed
+    assert len(session.queries) == 5
+    assert clock.sleeps == [2, 4, 8, 10, 10]
+    assert waited == 34
+
+
+def test_wait_for_zero_count_gives_up_after_max_wait_checks(clock):
+    session = CountdownSession(start_count=100)
+    task = make_wait_task(session, waitseconds=10, maxwaithchecks=1)
+
+    completed, waited = task._wait_for_zero_count("SELECT count() FROM AsyncApexJob")
+
+    assert not completed
+    assert waited == 20
+    assert clock.sleeps == [2, 4, 8, 6]
+    assert len(session.queries) == 4